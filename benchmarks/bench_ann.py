@@ -0,0 +1,92 @@
+"""
+Compares approximate search of similar developers in HNSW index with exact search over all the embeddings:
+recall@k and query latency for several widths of beam search, index build and load time.
+
+Run from the project directory:
+    python -m benchmarks.bench_ann --authors_number 20000 --queries_number 500 --ef 16 --ef 64 --ef 256
+"""
+import random
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List
+
+import click
+import numpy as np
+
+from source_code.similarity.embeddings import DeveloperIndex
+from source_code.similarity.hnsw import normalize
+
+
+def generate_authors(authors_number: int, topics_number: int = 200, seed: int = 0) -> Dict[str, Dict[str, Counter]]:
+    """
+    Generates developers who use identifiers of one or two topics, e.g. web frameworks or numeric libraries
+
+    :param authors_number: number of developers
+    :param topics_number: number of topics, each of them has its own imports and variables
+    :param seed: random seed
+    :return: dict { author : {"imports": Counter, "variables": Counter} }
+    """
+    rnd = random.Random(seed)
+    authors = {}
+    for author in range(authors_number):
+        topics = rnd.sample(range(topics_number), rnd.choice([1, 2]))
+        imports, variables = Counter(), Counter()
+        for _ in range(rnd.randint(5, 50)):
+            topic = rnd.choice(topics)
+            imports[f"lib_{topic}.module_{int(rnd.paretovariate(1.5)) % 20}"] += 1
+            variables[f"value_{topic}_{int(rnd.paretovariate(1.2)) % 100}"] += 1
+            variables[f"common_{rnd.randrange(30)}"] += 1
+        authors[f"author_{author}"] = {"imports": imports, "variables": variables}
+    return authors
+
+
+def exact_top_k(embeddings: np.ndarray, query: int, k: int) -> List[int]:
+    similarities = embeddings @ embeddings[query]
+    similarities[query] = -np.inf
+    return np.argpartition(-similarities, k)[:k].tolist()
+
+
+@click.command()
+@click.option("--authors_number", default=20000, type=int)
+@click.option("--queries_number", default=500, type=int)
+@click.option("--k", default=10, type=int)
+@click.option("--dimension", default=256, type=int)
+@click.option("--max_links", default=16, type=int)
+@click.option("--ef", default=[16, 32, 64, 128, 256], multiple=True, type=int)
+def main(authors_number: int, queries_number: int, k: int, dimension: int, max_links: int, ef: List[int]) -> None:
+    authors = generate_authors(authors_number)
+
+    index = DeveloperIndex(dimension, max_links=max_links)
+    start = time.perf_counter()
+    for author, counters in authors.items():
+        index.update(author, counters["imports"], counters["variables"])
+    print(f"build: {time.perf_counter() - start:.1f}s for {authors_number} authors")
+
+    with tempfile.TemporaryDirectory() as folder:
+        index.save(folder)
+        start = time.perf_counter()
+        index = DeveloperIndex.load(folder)
+        print(f"mmap load: {(time.perf_counter() - start) * 1e3:.1f}ms")
+
+        embeddings = np.stack([normalize(index.hnsw.vectors[node]) for node in range(len(index))])
+        queries = random.Random(1).sample(range(len(index)), queries_number)
+
+        start = time.perf_counter()
+        exact = {query: set(exact_top_k(embeddings, query, k)) for query in queries}
+        exact_latency = (time.perf_counter() - start) / queries_number
+        print(f"exact: {exact_latency * 1e3:.3f}ms per query")
+
+        for width in ef:
+            latencies, hits = [], 0
+            for query in queries:
+                start = time.perf_counter()
+                found = index.similar(index.hnsw.labels[query], k, width)
+                latencies.append(time.perf_counter() - start)
+                hits += len(exact[query] & {index.hnsw.label_ids[label] for label, _ in found})
+            print(f"ef={width}: recall@{k} {hits / (k * queries_number):.3f}, "
+                  f"mean {np.mean(latencies) * 1e3:.3f}ms, p99 {np.percentile(latencies, 99) * 1e3:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
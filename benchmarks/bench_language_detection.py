@@ -0,0 +1,75 @@
+"""
+Compares in-process language detection with enry subprocess detection.
+
+Run from the project directory:
+    python -m benchmarks.bench_language_detection --files_number 500
+"""
+import random
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import click
+
+from source_code.git_repo_extract.language_detection import BuiltinDetector, EnryDetector, LanguageDetector
+from source_code.utils import ENRY_PATH
+
+SAMPLES = {
+    "py": b"import os\n\n\ndef main():\n    print(os.getcwd())\n",
+    "java": b"package ru.hse;\n\npublic class Main {\n    public static void main(String[] args) {}\n}\n",
+    "js": b"const fs = require('fs');\nfunction main() { return fs.readFileSync('a'); }\n",
+    "h": b"#include <vector>\nnamespace hse {\nclass Parser;\n}\n",
+    "md": b"# Title\n\nSome text\n",
+    "png": b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR",
+}
+
+
+def generate_files(files_number: int, lines_number: int, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """
+    Generates files with different extensions for detectors to be run on
+
+    :param files_number: number of generated files
+    :param lines_number: approximate number of lines in each file
+    :param seed: random seed
+    :return: list of (file_path, content)
+    """
+    rnd = random.Random(seed)
+    files = []
+    for i in range(files_number):
+        extension = rnd.choice(list(SAMPLES.keys()))
+        content = SAMPLES[extension] * max(1, lines_number // SAMPLES[extension].count(b"\n"))
+        files.append((f"src/module_{i}/file_{i}.{extension}", content))
+    return files
+
+
+def run_detector(detector: LanguageDetector, files: List[Tuple[str, bytes]]) -> float:
+    """
+    :return: number of seconds spent on detection of all files
+    """
+    start = time.perf_counter()
+    for file_path, content in files:
+        detector.detect(file_path, content)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--files_number", default=500, type=int)
+@click.option("--lines_number", default=200, type=int)
+@click.option("--enry_path", default=ENRY_PATH, type=click.Path())
+def main(files_number: int, lines_number: int, enry_path: Path) -> None:
+    files = generate_files(files_number, lines_number)
+
+    builtin_time = run_detector(BuiltinDetector(), files)
+    print(f"builtin: {builtin_time:.3f}s total, {builtin_time / files_number * 1e6:.1f}us per file")
+
+    if not Path(enry_path).exists():
+        print(f"enry: skipped, no executable at {enry_path}")
+        return
+
+    enry_time = run_detector(EnryDetector(str(enry_path)), files)
+    print(f"enry: {enry_time:.3f}s total, {enry_time / files_number * 1e6:.1f}us per file")
+    print(f"speedup: {enry_time / builtin_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
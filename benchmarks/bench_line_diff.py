@@ -0,0 +1,79 @@
+"""
+Compares line counter based on difflib.unified_diff with Myers based line_diff.count_changed_lines.
+
+Run from the project directory:
+    python -m benchmarks.bench_line_diff --lines_number 50000 --edits_number 200
+"""
+import difflib
+import random
+import time
+from typing import Callable, List, Tuple
+
+import click
+
+from source_code.git_repo_extract.line_diff import count_changed_lines
+
+
+def difflib_changed_lines(old_content: str, new_content: str) -> Tuple[int, int]:
+    """
+    Previous implementation of commits_info.get_diffs_num
+    """
+    added = 0
+    deleted = 0
+    for line in difflib.unified_diff(old_content.splitlines(), new_content.splitlines()):
+        if line.startswith("+") and not line.startswith("++"):
+            added += 1
+        if line.startswith("-") and not line.startswith("--"):
+            deleted += 1
+    return added, deleted
+
+
+def generate_versions(lines_number: int, edits_number: int, seed: int = 0) -> Tuple[str, str]:
+    """
+    Generates file with code-like repeating lines and its edited version
+
+    :param lines_number: number of lines in old version
+    :param edits_number: number of inserted, deleted or replaced lines
+    :param seed: random seed
+    :return: (old content, new content)
+    """
+    rnd = random.Random(seed)
+    old_lines: List[str] = [rnd.choice(["", "}", "    return result", f"    value_{i} = compute({i})"])
+                            for i in range(lines_number)]
+    new_lines = list(old_lines)
+    for i in range(edits_number):
+        position = rnd.randrange(len(new_lines))
+        action = rnd.choice(["insert", "delete", "replace"])
+        if action == "insert":
+            new_lines.insert(position, f"    inserted_{i} = {i}")
+        elif action == "delete":
+            del new_lines[position]
+        else:
+            new_lines[position] = f"    replaced_{i} = {i}"
+    return "\n".join(old_lines), "\n".join(new_lines)
+
+
+def measure(function: Callable[[str, str], Tuple[int, int]], old: str, new: str) -> Tuple[float, Tuple[int, int]]:
+    start = time.perf_counter()
+    result = function(old, new)
+    return time.perf_counter() - start, result
+
+
+@click.command()
+@click.option("--lines_number", default=50000, type=int)
+@click.option("--edits_number", default=200, type=int)
+def main(lines_number: int, edits_number: int) -> None:
+    old, new = generate_versions(lines_number, edits_number)
+
+    difflib_time, difflib_result = measure(difflib_changed_lines, old, new)
+    myers_time, myers_result = measure(count_changed_lines, old, new)
+    identical_time, _ = measure(count_changed_lines, old, old)
+
+    print(f"difflib: {difflib_time:.3f}s, (added, deleted) = {difflib_result}")
+    print(f"myers: {myers_time:.3f}s, (added, deleted) = {myers_result}")
+    print(f"identical blobs: {identical_time * 1e6:.1f}us")
+    print(f"speedup: {difflib_time / myers_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
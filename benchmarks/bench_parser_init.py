@@ -0,0 +1,55 @@
+"""
+Compares preparing tree-sitter parsers for every repository with keeping them warm in a worker process.
+
+Run from the project directory:
+    python -m benchmarks.bench_parser_init --repos_number 50 --languages python --languages java
+"""
+import time
+from pathlib import Path
+from typing import List
+
+import click
+
+from source_code.code_parsing.repo_parser import RepoParser
+from source_code.utils import TREE_SITTER_GRAMMARS_FOLDER, TREE_SITTER_QUERIES_FOLDER
+
+
+def measure_init(languages: List[str], path_to_grammars: Path, repos_number: int, warm: bool) -> float:
+    """
+    :param languages: languages of parsers
+    :param path_to_grammars: path to folder with tree-sitter grammar repos
+    :param repos_number: number of simulated repositories
+    :param warm: keep parsers between repositories
+    :return: seconds spent on parsers preparation
+    """
+    library = path_to_grammars / "lang_lib.so"
+    RepoParser.parsers = {}
+    start = time.perf_counter()
+    for _ in range(repos_number):
+        if not warm:
+            RepoParser.parsers = {}
+        RepoParser.load_parsers(languages, path_to_grammars, library, TREE_SITTER_QUERIES_FOLDER)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--repos_number", default=50, type=int)
+@click.option("--languages", default=["python", "java", "javascript"], multiple=True)
+@click.option("--path_to_grammars", default=TREE_SITTER_GRAMMARS_FOLDER, type=click.Path(path_type=Path))
+def main(repos_number: int, languages: List[str], path_to_grammars: Path) -> None:
+    languages = list(languages)
+    missing = [lang for lang in languages if not (path_to_grammars / f"tree-sitter_tree-sitter-{lang}").exists()]
+    if missing:
+        print(f"Grammars of {', '.join(missing)} are not found in {path_to_grammars}, skipping")
+        return
+
+    cold_time = measure_init(languages, path_to_grammars, repos_number, warm=False)
+    warm_time = measure_init(languages, path_to_grammars, repos_number, warm=True)
+
+    print(f"cold parsers: {cold_time:.3f}s, {cold_time / repos_number * 1e3:.2f}ms per repo")
+    print(f"warm parsers: {warm_time:.3f}s, {warm_time / repos_number * 1e3:.2f}ms per repo")
+    print(f"speedup: {cold_time / warm_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Times the stages of the pipeline on generated repositories: get_commits_info_floored, RepoParser.parse_files,
+parallelize_extraction and the end-to-end cli commands. Runs offline, repositories are cloned with file:// urls.
+Results are written as JSON with configuration and environment, so runs of different commits can be compared.
+
+Run from the project directory:
+    python -m benchmarks.bench_pipeline --repos_number 2 --commits_number 200 --files_number 50 \
+        --language python=0.5 --language java=0.3 --language javascript=0.2 --output results.json
+    python -m benchmarks.bench_pipeline --baseline results.json --output new_results.json
+"""
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Union
+
+import click
+
+# caches and outputs of the benchmark are kept in its own folder, as caches are deleted between runs.
+# It is created inside SIMILAR_DEV_DATA_DIR if the variable is set, so collected data there is never touched.
+# Must be set before source_code imports
+if os.environ.get("SIMILAR_DEV_DATA_DIR"):
+    os.makedirs(os.environ["SIMILAR_DEV_DATA_DIR"], exist_ok=True)
+CREATED_DATA_DIR = os.environ["SIMILAR_DEV_DATA_DIR"] = tempfile.mkdtemp(prefix="similar_dev_bench_",
+                                                                         dir=os.environ.get("SIMILAR_DEV_DATA_DIR"))
+
+from benchmarks.synthetic_repos import create_synthetic_repo, GENERATORS, parse_language_mix  # noqa: E402
+from source_code.code_parsing.code_handle import parallelize_extraction  # noqa: E402
+from source_code.code_parsing.repo_parser import RepoParser  # noqa: E402
+from source_code.git_repo_extract.commits_info import get_commits_info_floored  # noqa: E402
+from source_code.git_repo_extract.repo_ops import get_repo_from_url  # noqa: E402
+from source_code.utils import CLONED_REPOS_FOLDER, PROJECT_DIRECTORY, read_records, SOURCE_CODE_FOLDER, \
+    TREE_SITTER_GRAMMARS_FOLDER  # noqa: E402
+
+FORMAT_VERSION = 1
+STAGES = ["commits_info", "parse_files", "parallelize_extraction",
+          "cli_write_repo_commits", "cli_write_imports_variables", "cli_write_commits_imports_variables"]
+PARSING_STAGES = {"parse_files", "parallelize_extraction",
+                  "cli_write_imports_variables", "cli_write_commits_imports_variables"}
+
+
+def reset_caches() -> None:
+    """
+    Removes languages, parse and checkpoints caches, so every run of a stage starts cold.
+    Only the folder created by the benchmark is cleaned
+    """
+    if CLONED_REPOS_FOLDER != Path(CREATED_DATA_DIR):
+        raise RuntimeError(f"{CLONED_REPOS_FOLDER} is not created by the benchmark, its caches are kept")
+    for path in CLONED_REPOS_FOLDER.glob("*.sqlite*"):
+        path.unlink()
+
+
+def run_cli(*args: str) -> None:
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIRECTORY))
+    subprocess.run([sys.executable, "run.py", *args], cwd=str(SOURCE_CODE_FOLDER), env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def measure(stage: Callable[[], int], repeat: int) -> Dict[str, Any]:
+    """
+    :param stage: function that runs stage and returns number of produced records
+    :param repeat: number of runs
+    :return: dict with durations of runs and throughput of the median run
+    """
+    runs, items = [], 0
+    for _ in range(repeat):
+        reset_caches()
+        start = time.perf_counter()
+        items = stage()
+        runs.append(time.perf_counter() - start)
+    median = statistics.median(runs)
+    return {"runs_s": [round(run, 6) for run in runs],
+            "median_s": round(median, 6),
+            "min_s": round(min(runs), 6),
+            "items": items,
+            "items_per_s": round(items / median, 3) if median else None}
+
+
+def get_environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=str(PROJECT_DIRECTORY), check=True,
+                                capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_slowdown: float) -> List[str]:
+    """
+    Prints ratios of median durations to baseline ones
+
+    :param results: results of this run
+    :param baseline: results of previous run
+    :param max_slowdown: ratio above which stage is reported as regression
+    :return: names of regressed stages
+    """
+    if results["config"] != baseline["config"]:
+        print("Warning: configurations of runs differ, durations are not comparable")
+
+    regressions = []
+    for stage, result in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+        ratio = result["median_s"] / baseline["stages"][stage]["median_s"]
+        regressed = ratio > max_slowdown
+        print(f"{stage}: {baseline['stages'][stage]['median_s']:.3f}s -> {result['median_s']:.3f}s "
+              f"({ratio:.2f}x){' REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(stage)
+    return regressions
+
+
+@click.command()
+@click.option("--repos_number", default=2, type=int)
+@click.option("--commits_number", default=100, type=int)
+@click.option("--files_number", default=50, type=int)
+@click.option("--file_lines", default=100, type=int)
+@click.option("--edit_lines", default=5, type=int)
+@click.option("--files_per_commit", default=3, type=int)
+@click.option("--authors_number", default=5, type=int)
+@click.option("--language", default=["python=0.5", "java=0.3", "javascript=0.2"], multiple=True,
+              help=f"language=weight, languages: {', '.join(GENERATORS)}")
+@click.option("--seed", default=0, type=int)
+@click.option("--stage", default=STAGES, multiple=True, type=click.Choice(STAGES))
+@click.option("--repeat", default=3, type=int)
+@click.option("--n_jobs", default=2, type=int)
+@click.option("--output", default=None, type=click.Path(path_type=Path))
+@click.option("--baseline", default=None, type=click.Path(exists=True, path_type=Path))
+@click.option("--max_slowdown", default=1.2, type=float)
+def main(repos_number: int, commits_number: int, files_number: int, file_lines: int, edit_lines: int,
+         files_per_commit: int, authors_number: int, language: List[str], seed: int, stage: List[str], repeat: int,
+         n_jobs: int, output: Union[Path, None], baseline: Union[Path, None], max_slowdown: float) -> None:
+    languages = parse_language_mix(list(language))
+    config = {"repos_number": repos_number, "commits_number": commits_number, "files_number": files_number,
+              "file_lines": file_lines, "edit_lines": edit_lines, "files_per_commit": files_per_commit,
+              "authors_number": authors_number, "languages": languages, "seed": seed, "repeat": repeat,
+              "n_jobs": n_jobs}
+    supported_languages = [lang for lang in languages
+                           if (TREE_SITTER_GRAMMARS_FOLDER / f"tree-sitter_tree-sitter-{lang}").exists()]
+    stages = [name for name in STAGES if name in stage]
+    if not supported_languages and PARSING_STAGES & set(stages):
+        print(f"Grammars are not found in {TREE_SITTER_GRAMMARS_FOLDER}, skipping parsing stages")
+        stages = [name for name in stages if name not in PARSING_STAGES]
+
+    work_dir = CLONED_REPOS_FOLDER / "bench_pipeline"
+    temp_repo_path = work_dir / "temp_repos"
+    temp_repo_path.mkdir(parents=True)
+
+    start = time.perf_counter()
+    origins = [create_synthetic_repo(work_dir / "origin" / f"repo_{index}.git", commits_number, files_number,
+                                     file_lines, edit_lines, files_per_commit, languages, authors_number, seed + index)
+               for index in range(repos_number)]
+    urls = [f"file://{origin}" for origin in origins]
+    clones = [get_repo_from_url(str(work_dir / "clones" / f"repo_{index}"), url) for index, url in enumerate(urls)]
+    print(f"Generated {repos_number} repositories in {time.perf_counter() - start:.1f}s")
+
+    repos_file = work_dir / "repos.txt"
+    repos_file.write_text("".join(f"{url}\n" for url in urls))
+    commits_file, fused_file = work_dir / "commits_info.txt", work_dir / "fused_commits_info.txt"
+    var_imp_file, fused_var_imp_file = work_dir / "variables_imports.txt", work_dir / "fused_variables_imports.txt"
+    parsed_lines = [list(get_commits_info_floored(repo, languages_cache_path=None)) for repo in clones]
+    with commits_file.open("w") as f:
+        for line in parsed_lines:
+            f.writelines(json.dumps(record) + "\n" for record in line)
+    languages_options = [option for lang in supported_languages for option in ["--supported_languages", lang]]
+
+    def run_parse_files() -> int:
+        parsed = 0
+        for repo in clones:
+            repo_parser = RepoParser(repo, supported_languages, languages_cache_path=None, parse_cache_path=None)
+            repo_parser.parse_files(commits_number)
+            parsed += len(repo_parser.used_files)
+        return parsed
+
+    def run_cli_output(path: Path, *args: str) -> int:
+        path.unlink(missing_ok=True)
+        run_cli(*args)
+        return sum(1 for _ in read_records(path))
+
+    runners = {
+        "commits_info": lambda: sum(sum(1 for _ in get_commits_info_floored(repo, languages_cache_path=None))
+                                    for repo in clones),
+        "parse_files": run_parse_files,
+        "parallelize_extraction": lambda: sum(len(result) for result in parallelize_extraction(
+            str(temp_repo_path), parsed_lines, supported_languages, n_jobs)),
+        "cli_write_repo_commits": lambda: run_cli_output(
+            commits_file.with_name("cli_commits_info.txt"), "write-repo-commits", "--repos_file_path", str(repos_file),
+            "--temp_repo_path", str(temp_repo_path), "--commits_info_path",
+            str(commits_file.with_name("cli_commits_info.txt")), "--commits_number", "-1", "--n_jobs", str(n_jobs)),
+        "cli_write_imports_variables": lambda: run_cli_output(
+            var_imp_file, "write-imports-variables", "--json_path", str(commits_file), "--var_imp_path",
+            str(var_imp_file), "--temp_repo_path", str(temp_repo_path), "--n_jobs", str(n_jobs), *languages_options),
+        "cli_write_commits_imports_variables": lambda: run_cli_output(
+            fused_var_imp_file, "write-commits-imports-variables", "--repos_file_path", str(repos_file),
+            "--temp_repo_path", str(temp_repo_path), "--commits_info_path", str(fused_file), "--var_imp_path",
+            str(fused_var_imp_file), "--commits_number", "-1", "--n_jobs", str(n_jobs), *languages_options),
+    }
+
+    results = {"format_version": FORMAT_VERSION,
+               "benchmark": "pipeline",
+               "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "environment": get_environment(),
+               "config": config,
+               "stages": {}}
+    for name in stages:
+        results["stages"][name] = measure(runners[name], repeat)
+        print(f"{name}: median {results['stages'][name]['median_s']:.3f}s, "
+              f"{results['stages'][name]['items_per_s']} records/s")
+
+    for repo in clones:
+        repo.close()
+    shutil.rmtree(CREATED_DATA_DIR, ignore_errors=True)
+
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        print(f"Results are written to {output}")
+
+    if baseline is not None and compare(results, json.loads(baseline.read_text()), max_slowdown):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares exact Counter of stargazer crawl lines with Space-Saving summaries: peak memory, time,
+recall of top repositories and maximum count error.
+
+Run from the project directory:
+    python -m benchmarks.bench_top_repos --lines_number 2000000 --capacity 1000 --capacity 10000
+"""
+import random
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Iterable, List, Tuple
+
+import click
+
+from source_code.git_repo_extract.heavy_hitters import SpaceSaving
+
+
+def generate_lines(lines_number: int, seed: int = 0) -> Iterable[str]:
+    """
+    Generates repositories starred by stargazers: a few popular ones and a long tail of unique repositories
+
+    :param lines_number: number of lines
+    :param seed: random seed
+    :return: Iterator of repository names
+    """
+    rnd = random.Random(seed)
+    for _ in range(lines_number):
+        if rnd.random() < 0.3:
+            yield f"user_{rnd.randrange(10 ** 9)}/dotfiles"
+        else:
+            yield f"owner_{int(rnd.paretovariate(0.8))}/repo"
+
+
+def exact_top(lines: Iterable[str], n: int) -> List[Tuple[str, int]]:
+    return Counter(lines).most_common(n)
+
+
+def measure(function: Callable[[], List[Tuple[str, int]]]) -> Tuple[float, float, List[Tuple[str, int]]]:
+    """
+    :return: (seconds, peak memory in megabytes, result)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return duration, peak, result
+
+
+@click.command()
+@click.option("--lines_number", default=2000000, type=int)
+@click.option("--n_top_repos", default=100, type=int)
+@click.option("--capacity", default=[1000, 10000], multiple=True, type=int)
+def main(lines_number: int, n_top_repos: int, capacity: List[int]) -> None:
+    exact_time, exact_memory, exact = measure(lambda: exact_top(generate_lines(lines_number), n_top_repos))
+    exact_counts = dict(exact)
+    print(f"Counter: {exact_time:.1f}s, peak {exact_memory:.1f}MB")
+
+    for summary_capacity in capacity:
+        def summarize() -> List[Tuple[str, int]]:
+            summary = SpaceSaving(summary_capacity)
+            summary.update_many(generate_lines(lines_number))
+            return summary.top(n_top_repos)
+
+        summary_time, summary_memory, top = measure(summarize)
+        found = [repo for repo, _ in top if repo in exact_counts]
+        max_error = max((count - exact_counts[repo] for repo, count in top if repo in exact_counts), default=0)
+        print(f"SpaceSaving({summary_capacity}): {summary_time:.1f}s, peak {summary_memory:.1f}MB, "
+              f"recall@{n_top_repos} {len(found) / n_top_repos:.3f}, max error {max_error} "
+              f"(bound {lines_number / summary_capacity:.0f})")
+
+
+if __name__ == "__main__":
+    main()
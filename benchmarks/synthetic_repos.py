@@ -0,0 +1,148 @@
+"""
+Generates local git repositories of configurable size for benchmarks: number of commits and files,
+file sizes and mix of languages. Objects are written with dulwich with fixed timestamps,
+so the same parameters always give the same commit ids. Repositories are bare and can be cloned with file:// urls.
+"""
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+from dulwich.index import commit_tree
+from dulwich.objects import Blob, Commit
+from dulwich.repo import Repo
+
+FILE_MODE = 0o100644
+START_TIME = 1600000000
+WORDS = ["data", "path", "user", "count", "item", "value", "result", "config", "index", "name", "buffer", "node"]
+MODULES = ["os", "sys", "json", "numpy", "requests", "utils", "models", "parser", "io", "core"]
+
+
+def identifier(rnd: random.Random) -> str:
+    """
+    Identifiers follow Zipf-like distribution, so developers share popular names and differ in rare ones
+    """
+    return f"{rnd.choice(WORDS)}_{int(rnd.paretovariate(1.2))}"
+
+
+def python_lines(rnd: random.Random, lines_number: int) -> Tuple[List[str], List[str]]:
+    header = [f"import {rnd.choice(MODULES)}", f"from {rnd.choice(MODULES)} import {identifier(rnd)}", ""]
+    body = []
+    while len(body) < lines_number:
+        name, argument = identifier(rnd), identifier(rnd)
+        body += [f"def {name}({argument}):", f"    {identifier(rnd)} = {argument} + {rnd.randrange(100)}",
+                 f"    return {argument}", ""]
+    return header, body[:lines_number]
+
+
+def java_lines(rnd: random.Random, lines_number: int) -> Tuple[List[str], List[str]]:
+    header = [f"import java.util.{rnd.choice(['List', 'Map', 'Set'])};", "", "public class Main {"]
+    body = []
+    while len(body) < lines_number:
+        body += [f"    int {identifier(rnd)} = {rnd.randrange(100)};",
+                 f"    void {identifier(rnd)}() {{ int {identifier(rnd)} = {rnd.randrange(100)}; }}"]
+    return header, body[:lines_number] + ["}"]
+
+
+def javascript_lines(rnd: random.Random, lines_number: int) -> Tuple[List[str], List[str]]:
+    header = [f"const {identifier(rnd)} = require('{rnd.choice(MODULES)}');", ""]
+    body = []
+    while len(body) < lines_number:
+        argument = identifier(rnd)
+        body += [f"let {identifier(rnd)} = {rnd.randrange(100)};",
+                 f"function {identifier(rnd)}({argument}) {{ return {argument} + 1; }}"]
+    return header, body[:lines_number]
+
+
+def text_lines(rnd: random.Random, lines_number: int) -> Tuple[List[str], List[str]]:
+    return ["# Notes", ""], [" ".join(rnd.choice(WORDS) for _ in range(8)) for _ in range(lines_number)]
+
+
+GENERATORS: Dict[str, Tuple[str, Callable[[random.Random, int], Tuple[List[str], List[str]]]]] = {
+    "python": ("py", python_lines),
+    "java": ("java", java_lines),
+    "javascript": ("js", javascript_lines),
+    "text": ("md", text_lines),
+}
+
+
+def parse_language_mix(values: List[str]) -> Dict[str, float]:
+    """
+    :param values: strings in format "language=weight", e.g. ["python=0.6", "java=0.4"]
+    :return: dict {language: weight}
+    """
+    mix = {}
+    for value in values:
+        language, _, weight = value.partition("=")
+        if language not in GENERATORS:
+            raise ValueError(f"{language} is not a generated language.\nChoose one of {', '.join(GENERATORS)}")
+        mix[language] = float(weight or 1)
+    return mix
+
+
+def create_synthetic_repo(path: Union[str, Path],
+                          commits_number: int = 100,
+                          files_number: int = 50,
+                          file_lines: int = 100,
+                          edit_lines: int = 5,
+                          files_per_commit: int = 3,
+                          languages: Union[Dict[str, float], None] = None,
+                          authors_number: int = 5,
+                          seed: int = 0) -> Path:
+    """
+    Creates bare repository. Files are added until there are files_number of them,
+    then commits edit random blocks of existing files
+
+    :param path: path of repository folder, should not exist
+    :param commits_number: number of commits
+    :param files_number: number of files in the last commit
+    :param file_lines: number of lines in each file
+    :param edit_lines: number of lines replaced by edit of a file
+    :param files_per_commit: number of files added or edited by each commit
+    :param languages: dict {language: weight} of languages from GENERATORS, python only if None
+    :param authors_number: number of commit authors
+    :param seed: random seed, the same parameters and seed give the same repository
+    :return: path to repository
+    """
+    rnd = random.Random(seed)
+    languages = languages or {"python": 1.0}
+    names, weights = list(languages.keys()), list(languages.values())
+
+    path = Path(path)
+    path.mkdir(parents=True)
+    repo = Repo.init_bare(str(path))
+    files: Dict[bytes, Tuple[str, List[str], List[str]]] = {}  # path -> (language, header, body)
+    blobs: Dict[bytes, bytes] = {}
+    parents = []
+    for index in range(commits_number):
+        for _ in range(min(files_per_commit, files_number)):
+            if len(files) < files_number:
+                language = rnd.choices(names, weights)[0]
+                extension, generator = GENERATORS[language]
+                file_path = f"module_{len(files) % 10}/file_{len(files)}.{extension}".encode()
+                files[file_path] = (language, *generator(rnd, file_lines))
+            else:
+                file_path = rnd.choice(sorted(files))
+                language, header, body = files[file_path]
+                start = rnd.randrange(max(len(body) - edit_lines, 0) + 1)
+                body[start:start + edit_lines] = GENERATORS[language][1](rnd, edit_lines)[1]
+
+            _, header, body = files[file_path]
+            blob = Blob.from_string("\n".join(header + body).encode() + b"\n")
+            repo.object_store.add_object(blob)
+            blobs[file_path] = blob.id
+
+        author = f"Developer {index % authors_number} <developer_{index % authors_number}@mail.com>".encode()
+        commit = Commit()
+        commit.tree = commit_tree(repo.object_store, [(file_path, blob_id, FILE_MODE)
+                                                      for file_path, blob_id in blobs.items()])
+        commit.parents = parents
+        commit.author = commit.committer = author
+        commit.author_time = commit.commit_time = START_TIME + index * 60
+        commit.author_timezone = commit.commit_timezone = 0
+        commit.message = f"commit {index}".encode()
+        repo.object_store.add_object(commit)
+        parents = [commit.id]
+
+    repo.refs[b"refs/heads/master"] = parents[0]
+    repo.close()
+    return path
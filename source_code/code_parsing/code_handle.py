@@ -1,53 +1,78 @@
-from typing import Dict, Iterable, List
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
 
+from dulwich.diff_tree import RENAME_THRESHOLD
 from dulwich.repo import Repo
-from joblib import delayed, parallel_backend, Parallel
 from tqdm import tqdm
 
 from .repo_parser import RepoParser
-from source_code.git_repo_extract.repo_ops import operate_temporary_repo
+from source_code.git_repo_extract.commits_info import get_commits_info_floored
+from source_code.git_repo_extract.mirror_store import get_repo_operator, GIGABYTE
+from source_code.scheduling import WorkerPool
+from source_code.utils import Checkpoint, LANGUAGES_CACHE_FILE, StreamSink
+
+# fields of commits_info records used by extract_repo_variables_imports
+PARSE_COLUMNS = ["author_name", "file_path", "programming_language", "blob_id", "commit_id"]
 
 
 def parallelize_extraction(temp_repo_path: str,
                            parsed_lines: Iterable,
                            supported_languages: List[str],
-                           commits_limit: int,
-                           n_jobs: int = -1):
+                           n_jobs: int = -1,
+                           clone_strategy: str = "full",
+                           clone_depth: Union[int, None] = None,
+                           mirror_path: Union[str, None] = None,
+                           disk_budget: int = 50 * GIGABYTE,
+                           pool: Union[WorkerPool, None] = None,
+                           diff_scoped: bool = False) -> Iterator[List[Dict]]:
     """
-    Method decomposes extract_from_json function
+    Method decomposes extract_from_json function. Repositories are parsed in WorkerPool processes
+    that load tree-sitter parsers once on start, so parsers stay warm between repositories.
+    Results are given as soon as repositories are parsed, so they can be written without keeping all of them
 
     :param n_jobs: number of processes to parse
-    :param commits_limit: maximum number of commits that should be parsed inside of repo
     :param temp_repo_path: path to folder, where temporaryDirectories for repositories should be created
     :param parsed_lines: lines of different repos commit_info data
     :param supported_languages: which programming languages should be overviewed
-    :return:
+    :param clone_strategy: how to clone repositories, one of repo_ops.CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
+    :param mirror_path: path to folder with repositories mirrors, None to use temporary clones
+    :param disk_budget: maximum size of all mirrors in bytes
+    :param pool: already started pool to reuse between calls, new one is created if None
+    :param diff_scoped: take only identifiers from lines changed by commits, see RepoParser
+    :return: Iterator of results for each repository in order of completion, failed repositories are skipped
     """
-    with parallel_backend(backend="multiprocessing"):
-        parallel = Parallel(n_jobs=n_jobs, verbose=100)
-        funcs = (delayed(operate_temporary_repo)(temp_repo_path=temp_repo_path,
-                                                 url=line[0]["repo_url"],
-                                                 operation=extract_repo_variables_imports,
-                                                 arguments=(line, supported_languages, commits_limit))
-                 for line in parsed_lines if line)
-        return parallel(funcs)
+    repo_operator = get_repo_operator(temp_repo_path, mirror_path, disk_budget, clone_strategy, clone_depth)
+    tasks = ((line[0]["repo_url"], {"url": line[0]["repo_url"],
+                                    "operation": extract_repo_variables_imports,
+                                    "arguments": (line, supported_languages, diff_scoped)})
+             for line in parsed_lines if line)
+
+    if pool is not None:
+        yield from (result.value for result in pool.run(repo_operator, tasks) if not result.failed)
+        return
+
+    with WorkerPool(n_jobs, initializer=RepoParser.load_parsers, initargs=(supported_languages,)) as pool:
+        yield from (result.value for result in pool.run(repo_operator, tasks) if not result.failed)
 
 
 def extract_repo_variables_imports(repo: Repo,
                                    commits_info_list: List[Dict],
                                    supported_languages: List[str],
-                                   commits_limit: int = 1000):
+                                   diff_scoped: bool = False):
     """
-    Method that parses given repository and gets variables and imports data for given commit_infos
+    Method that parses given repository and gets variables and imports data for given commit_infos.
+    Only blobs referenced by commit_infos are parsed, each author gets identifiers of their own file version
 
-    :param commits_limit: maximum number of commits that should be parsed inside of repo
     :param supported_languages: list of programming languages that should be parsed
+    :param diff_scoped: take only identifiers from lines changed by commits, see RepoParser
     :param repo: repo object to being parsed
     :param commits_info_list: list of commits_info objects for current repo
     :return: Iterator of dicts with author file data
     """
-    repo_parser = RepoParser(repo, supported_languages=supported_languages)
-    repo_parser.parse_files(commits_limit)
+    repo_parser = RepoParser(repo, supported_languages=supported_languages, diff_scoped=diff_scoped)
 
     for entity in tqdm(commits_info_list, desc="Checking entities"):
 
@@ -65,3 +90,98 @@ def extract_repo_variables_imports(repo: Repo,
         result["variables"] = list(variables)  # make it suitable for json
 
         yield result
+
+    repo_parser.flush()
+
+
+def extract_repo_commits_variables(repo: Repo,
+                                   commits_limit: int,
+                                   supported_languages: List[str],
+                                   detector: Union[str, None] = None,
+                                   languages_cache_path: Union[Path, None] = LANGUAGES_CACHE_FILE,
+                                   checkpoints_path: Union[Path, None] = None,
+                                   diff_scoped: bool = False,
+                                   merge_policy: str = "combined",
+                                   rename_threshold: int = RENAME_THRESHOLD,
+                                   find_copies: bool = False,
+                                   change_filter: Union[str, Path, Dict, None] = None,
+                                   yield_checkpoint: bool = False) -> Iterator[Union[Dict, Checkpoint]]:
+    """
+    Walks repository once: each changed blob is loaded, language-defined, diff-counted and parsed
+    with tree-sitter in the same visit. Combines get_commits_info_floored and extract_repo_variables_imports
+
+    :param repo: repo object to being parsed
+    :param commits_limit: maximum number of commits_info entities that should be extracted
+    :param supported_languages: list of programming languages that should be parsed
+    :param detector: language detector name, None for the default one
+    :param languages_cache_path: path to file with languages of already seen blobs
+    :param checkpoints_path: path to file with last processed commits, see get_commits_info_floored
+    :param diff_scoped: take only identifiers from lines changed by commits, see RepoParser
+    :param merge_policy: which changes of merge commits are taken, see get_commits_info_floored
+    :param rename_threshold: similarity in percents of renamed files, negative to disable rename detection
+    :param find_copies: look for sources of copied files among unchanged files too, see get_commits_info_floored
+    :param change_filter: commits and files skipped before their blobs are read, see get_commits_info_floored
+    :param yield_checkpoint: give checkpoint as the last item instead of saving it, see get_commits_info_floored
+    :return: Iterator of commits_info dicts, dicts of parsed files also have "imports" and "variables" lists
+    """
+    repo_parser = RepoParser(repo, supported_languages=supported_languages, languages_cache_path=languages_cache_path,
+                             diff_scoped=diff_scoped)
+    try:
+        yield from get_commits_info_floored(repo, commits_limit, detector, languages_cache_path, checkpoints_path,
+                                            blob_handler=repo_parser.parse_record, merge_policy=merge_policy,
+                                            rename_threshold=rename_threshold, find_copies=find_copies,
+                                            change_filter=change_filter, yield_checkpoint=yield_checkpoint)
+    finally:
+        repo_parser.flush()
+
+
+def split_fused_record(record: Union[Dict, Checkpoint],
+                       commits_sink: Callable[[Dict], Any],
+                       variables_sink: Callable[[Union[Dict, Checkpoint]], Any]) -> None:
+    """
+    Gives commits_info part of extract_repo_commits_variables record to commits_sink and author file data
+    in format of extract_repo_variables_imports to variables_sink.
+    Checkpoints go to variables_sink, its writer passes them to commits writer, see utils.StreamWriter
+
+    :param record: record of fused walk or checkpoint
+    :param commits_sink: receives commits_info dict
+    :param variables_sink: receives dict {"author", "path", "imports", "variables"} or checkpoint
+    :return: None
+    """
+    if isinstance(record, Checkpoint):
+        variables_sink(record)
+        return
+
+    imports = record.pop("imports", None)
+    variables = record.pop("variables", None)
+    commits_sink(record)
+
+    if imports and variables:  # the same condition as in extract_repo_variables_imports
+        variables_sink({"author": record["author_name"], "path": record["file_path"],
+                        "imports": imports, "variables": variables})
+
+
+class FusedSink(object):
+    """
+    Picklable sink for extract_repo_commits_variables records of commits info and variables imports writers,
+    records are split with split_fused_record. See repo_ops.operate_existing_repo
+    """
+
+    def __init__(self, commits_sink: StreamSink, variables_sink: StreamSink):
+        """
+        :param commits_sink: sink of commits info StreamWriter
+        :param variables_sink: sink of variables imports StreamWriter, its writer passes checkpoints to commits writer
+        """
+        self.commits_sink = commits_sink
+        self.variables_sink = variables_sink
+
+    @contextmanager
+    def part(self) -> Iterator[Callable[[Union[Dict, Checkpoint]], None]]:
+        """
+        Parts of both writers for one task attempt, see utils.StreamSink.part. Commits part is committed first,
+        so checkpoint that variables writer passes to commits writer comes after the commits records
+
+        :return: context manager with function that takes record of fused walk or checkpoint
+        """
+        with self.variables_sink.part() as variables_write, self.commits_sink.part() as commits_write:
+            yield partial(split_fused_record, commits_sink=commits_write, variables_sink=variables_write)
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Union
+
+from dulwich.repo import Repo
+from tree_sitter import Language
+
+from source_code.git_repo_extract.repo_ops import try_find_repo
+from source_code.utils import FileLock, TREE_SITTER_GRAMMARS_FOLDER
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+
+def grammar_folder(path_to_grammars: Path, language: str) -> Path:
+    """
+    :param path_to_grammars: path to folder with tree-sitter grammar repos
+    :param language: programming language of grammar
+    :return: path to grammar repo, as it is named by repo_ops.try_find_repo
+    """
+    return path_to_grammars / f"tree-sitter_tree-sitter-{language}"
+
+
+def get_grammar_commits(supported_languages: List[str],
+                        path_to_grammars: Path = TREE_SITTER_GRAMMARS_FOLDER,
+                        download: bool = False) -> Union[Dict[str, str], None]:
+    """
+    Reads HEAD commits of grammar repos
+
+    :param supported_languages: languages of grammars
+    :param path_to_grammars: path to folder with tree-sitter grammar repos
+    :param download: download grammar repos that don't exist
+    :return: dict {language : commit id} or None if some grammar is absent
+    """
+    commits = {}
+    for language in supported_languages:
+        folder = grammar_folder(path_to_grammars, language)
+        if folder.exists():
+            repo = Repo(str(folder))
+        elif download:
+            repo = try_find_repo(str(path_to_grammars), f"tree-sitter/tree-sitter-{language}", download=True)
+        else:
+            return None
+        commits[language] = repo.head().decode()
+        repo.close()
+    return commits
+
+
+def get_library_key(grammar_commits: Dict[str, str]) -> str:
+    """
+    Key of library built from the given grammars. It doesn't depend on order of languages
+
+    :param grammar_commits: dict {language : commit id}
+    :return: short hex digest
+    """
+    description = "\n".join(f"{language}:{commit}" for language, commit in sorted(grammar_commits.items()))
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def get_library_path(path_to_library: Path, languages: List[str], key: str) -> Path:
+    """
+    :param path_to_library: path to tree-sitter library file given by user, e.g. "lang_lib.so"
+    :param languages: sorted languages of grammars in library
+    :param key: key of library, see get_library_key
+    :return: path to library with the languages and the key in its name, e.g. "lang_lib_java+python_{key}.so"
+    """
+    return path_to_library.with_name(f"{get_library_prefix(path_to_library, languages)}{key}{path_to_library.suffix}")
+
+
+def get_library_prefix(path_to_library: Path, languages: List[str]) -> str:
+    """
+    :return: beginning of names of libraries of the languages, they differ only by key of grammar commits
+    """
+    return f"{path_to_library.stem}_{'+'.join(languages)}_"
+
+
+def build_grammars_library(supported_languages: List[str],
+                           path_to_grammars: Path = TREE_SITTER_GRAMMARS_FOLDER,
+                           path_to_library: Path = TREE_SITTER_GRAMMARS_FOLDER / "lang_lib.so") -> Path:
+    """
+    Gives tree-sitter library with grammars of the given languages. The library is compiled only
+    if there is no library built from the same grammar commits and language set yet.
+
+    Compilation is done under lock file near the library and into temporary file that is renamed
+    to its final name afterwards, so concurrent workers never load partially written library.
+    Libraries of the same languages built from older grammar commits are deleted once the new one is in place
+
+    :param supported_languages: programming languages of grammars
+    :param path_to_grammars: path to folder with tree-sitter grammar repos
+    :param path_to_library: path to tree-sitter library file, its name is used as template for keyed libraries
+    :return: path to up to date library
+    """
+    languages = sorted({language.strip().lower() for language in supported_languages})
+    path_to_grammars.mkdir(parents=True, exist_ok=True)
+
+    commits = get_grammar_commits(languages, path_to_grammars)
+    if commits is not None:
+        library = get_library_path(path_to_library, languages, get_library_key(commits))
+        if library.exists():  # hot path, no lock and no compilation
+            return library
+
+    path_to_library.parent.mkdir(parents=True, exist_ok=True)
+    with FileLock(path_to_library.with_name(f".{path_to_library.name}.lock")):
+        commits = get_grammar_commits(languages, path_to_grammars, download=True)
+        library = get_library_path(path_to_library, languages, get_library_key(commits))
+        if library.exists():  # built by another worker while we were waiting
+            return library
+
+        logger.log(2, f"\tBuilding tree-sitter library {library.name} for {', '.join(languages)}")
+        temp_library = library.with_name(f".{library.stem}.{os.getpid()}.tmp{library.suffix}")
+        try:
+            Language.build_library(str(temp_library),
+                                   [str(grammar_folder(path_to_grammars, language)) for language in languages])
+            os.replace(temp_library, library)
+        finally:
+            if temp_library.exists():
+                temp_library.unlink()
+        remove_old_libraries(path_to_library, languages, library)
+
+    return library
+
+
+def remove_old_libraries(path_to_library: Path, languages: List[str], library: Path) -> None:
+    """
+    Deletes libraries of the same languages other than the given one, they are left by previous grammar commits.
+    Libraries of other language sets are kept, so runs with different languages don't rebuild each other's.
+    Processes that already loaded them keep working, library that can't be deleted (e.g. loaded on Windows)
+    is left until the next build
+
+    :param path_to_library: path to tree-sitter library file given by user, e.g. "lang_lib.so"
+    :param languages: sorted languages of grammars in library
+    :param library: path to library that is kept
+    :return: None
+    """
+    prefix = get_library_prefix(path_to_library, languages)
+    for path in path_to_library.parent.glob(f"{prefix}*{path_to_library.suffix}"):
+        key = path.name[len(prefix):len(path.name) - len(path_to_library.suffix)]
+        if path == library or len(key) != 16 or any(char not in "0123456789abcdef" for char in key):
+            continue
+        try:
+            path.unlink()
+            logger.log(2, f"\tRemoved old tree-sitter library {path.name}")
+        except OSError as e:
+            logger.log(2, f"\tOld tree-sitter library {path.name} is not removed: {e}")
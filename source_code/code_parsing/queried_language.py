@@ -1,3 +1,4 @@
+import hashlib
 import json
 from pathlib import Path
 
@@ -23,16 +24,22 @@ class QueriedLanguage(Language):
         with (queries_path / f"{name}_queries.json").open("r") as fr:
             queries = json.load(fr)
         self.query_types = {q_type: self.query(q_text) for q_type, q_text in queries.items()}
+        # parse results depend on queries, so results of changed queries are not taken from cache
+        self.queries_hash = hashlib.sha1(json.dumps(queries, sort_keys=True).encode()).hexdigest()[:16]
 
-    def capture_query(self, query_type, root_node):
+    def capture_query(self, query_type, root_node, start_byte: int = None, end_byte: int = None):
         """
         Executes one of prepared query for the root_node of the given tree
         :param query_type: which query to use (check which is available in class)
         :param root_node: root node of parsed code tree
+        :param start_byte: if given with end_byte, only matches intersecting [start_byte, end_byte) are searched
+        :param end_byte: end of searched byte range
         :return: list of all captures for the query
         """
         if query_type not in self.query_types:
             raise ValueError(f"{query_type} not in prepared queries."
                              f"\nChoose one of {', '.join(self.query_types.keys())}")
 
+        if start_byte is not None and end_byte is not None:
+            return self.query_types[query_type].captures(root_node, start_byte=start_byte, end_byte=end_byte)
         return self.query_types[query_type].captures(root_node)
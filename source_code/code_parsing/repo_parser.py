@@ -1,20 +1,28 @@
 import logging
-from collections import Counter
+from collections import Counter, OrderedDict
 from pathlib import Path
-from typing import Dict, List, Set, Union
+from typing import Dict, List, Set, Tuple, Union
 
 from dulwich.diff_tree import TreeChange
+from dulwich.object_store import tree_lookup_path
 from dulwich.repo import Repo
-from tree_sitter import Language, Parser
+from tree_sitter import Parser, Tree
 from tqdm import tqdm
 
+from source_code.code_parsing.grammar_build import build_grammars_library
 from source_code.code_parsing.queried_language import QueriedLanguage
-from source_code.git_repo_extract.commits_info import define_file_language
-from source_code.git_repo_extract.repo_ops import get_repos_url, try_find_repo
-from source_code.utils import TREE_SITTER_GRAMMARS_FOLDER, TREE_SITTER_QUERIES_FOLDER
+from source_code.git_repo_extract.commits_info import define_file_language, get_language_key, get_languages_cache
+from source_code.git_repo_extract.line_diff import changed_line_blocks
+from source_code.git_repo_extract.repo_ops import get_repos_url
+from source_code.persistent_cache import get_cache, PersistentCache
+from source_code.profiling import span
+from source_code.utils import LANGUAGES_CACHE_FILE, PARSE_CACHE_FILE, TREE_SITTER_GRAMMARS_FOLDER, \
+    TREE_SITTER_QUERIES_FOLDER
 
 logger = logging.getLogger(__name__)
 
+LAST_TREES_SIZE = 256  # number of files whose last parsed trees are kept for incremental parsing
+
 
 class RepoParser(object):
     """
@@ -27,7 +35,10 @@ class RepoParser(object):
                  supported_languages: List[str],
                  path_to_grammars: Path = TREE_SITTER_GRAMMARS_FOLDER,
                  path_to_library: Path = TREE_SITTER_GRAMMARS_FOLDER / "lang_lib.so",
-                 path_to_queries: Path = TREE_SITTER_QUERIES_FOLDER):
+                 path_to_queries: Path = TREE_SITTER_QUERIES_FOLDER,
+                 languages_cache_path: Union[Path, None] = LANGUAGES_CACHE_FILE,
+                 parse_cache_path: Union[Path, None] = PARSE_CACHE_FILE,
+                 diff_scoped: bool = False):
         """
         Creates class that will parse a repository and extract imports and variable names for files in it
 
@@ -35,32 +46,59 @@ class RepoParser(object):
         :param supported_languages: programming languages should be parsed
         :param path_to_grammars: path to folder with tree-sitter grammar repos
         :param path_to_library: path to tree-sitter generated library file
+        :param path_to_queries: path to folder with tree-sitter queries
+        :param languages_cache_path: path to file with languages of already seen blobs,
+                None to keep them in memory only for this instance
+        :param parse_cache_path: path to file with parse results of already seen blobs, shared by all repositories,
+                runs and processes. None to keep them in memory only for this instance
+        :param diff_scoped: attribute to commit author only identifiers located in lines changed by commit
+                instead of all identifiers of file
         """
         self.is_parsed = False
         self.imports = Counter()
         self.variables = Counter()
         self.repo = repo
         self.used_files: Dict[str, Dict[str, Set]] = {}  # saves  { filepath : { "imports": set(), "variables": set()} }
+        self.parsed_blobs: Dict[str, Union[Dict[str, Set], None]] = {}  # saves { blob_id : result of parse_blob }
         self.repo_url = get_repos_url(self.repo)
         self.supported_languages = set([x.strip().lower() for x in supported_languages])
-        self.languages_holder = dict()
+        self.languages_holder = dict() if languages_cache_path is None else get_languages_cache(languages_cache_path)
+        self.parse_cache = dict() if parse_cache_path is None else get_parse_cache(parse_cache_path)
+        self.diff_scoped = diff_scoped
+        # (language, file path) : (blob id, code, tree) of the last parsed version of file
+        self.last_trees: Dict[Tuple[str, str], Tuple[str, bytes, Tree]] = OrderedDict()
+
+        RepoParser.load_parsers(supported_languages, path_to_grammars, path_to_library, path_to_queries)
+
+    @classmethod
+    def load_parsers(cls,
+                     supported_languages: List[str],
+                     path_to_grammars: Path = TREE_SITTER_GRAMMARS_FOLDER,
+                     path_to_library: Path = TREE_SITTER_GRAMMARS_FOLDER / "lang_lib.so",
+                     path_to_queries: Path = TREE_SITTER_QUERIES_FOLDER) -> None:
+        """
+        Fills class variable with parsers and compiled queries of the given languages.
+        Parsers are kept for the whole life of process, so a worker that parses many repositories
+        builds library and compiles queries only once. Can be used as WorkerPool initializer
 
-        for lang in supported_languages:  # download repos if not exist
-            try_find_repo(str(path_to_grammars), f"tree-sitter/tree-sitter-{lang}", True)
+        :param supported_languages: programming languages should be parsed
+        :param path_to_grammars: path to folder with tree-sitter grammar repos
+        :param path_to_library: path to tree-sitter generated library file, libraries of different grammar
+                versions are saved near it (see grammar_build.build_grammars_library)
+        :param path_to_queries: path to folder with tree-sitter queries
+        :return: None
+        """
+        missing = [lang for lang in supported_languages if lang not in cls.parsers]
+        if not missing:  # parsers are warm
+            return
 
-        Language.build_library(
-            str(path_to_library),
-            [str(path_to_grammars / f"tree-sitter_tree-sitter-{lang}") for lang in supported_languages]
-        )
+        library = build_grammars_library(supported_languages, path_to_grammars, path_to_library)
 
-        # probably, due to multiprocessing it won't work
-        if not RepoParser.parsers:  # fill class variable to avoid repeated action in different instances
-            RepoParser.parsers = {}
-            for language in supported_languages:
-                lang = QueriedLanguage(str(path_to_library), language, path_to_queries)
-                RepoParser.parsers[language] = {"parser": Parser(),
-                                                "language": lang}
-                RepoParser.parsers[language]["parser"].set_language(lang)
+        for language in missing:
+            lang = QueriedLanguage(str(library), language, path_to_queries)
+            cls.parsers[language] = {"parser": Parser(),
+                                     "language": lang}
+            cls.parsers[language]["parser"].set_language(lang)
 
     def parse_files(self, limit_of_commits: int = 1000) -> None:
         """
@@ -100,39 +138,199 @@ class RepoParser(object):
 
                     self.used_files[file_path] = result
 
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes down pending entities of persistent caches and logs their hit rates
+
+        :return: None
+        """
+        for name, cache in [("languages", self.languages_holder), ("parse", self.parse_cache)]:
+            if isinstance(cache, PersistentCache):
+                cache.flush()
+                logger.log(2, f"\t{self.repo_url} {name} cache {cache.stats()}")
+
     def parse_change(self, change: TreeChange, file_path: str) -> Union[Dict, None]:
         """
-        Method parses single change in commit, looks through its blob and takes arguments and imports from it
+        Method parses single change in commit, looks through its blob and takes arguments and imports from it.
+        Blob is not loaded if both its language and parse result are already cached
 
         :param change: tree change to parse
         :param file_path: path to the file to parse
         :return: dict {"variables" : set(), "imports" : set()}
         """
-        code = self.repo.get_object(change.new.sha).as_pretty_string()  # in bytes
-        language = define_file_language(file_path, code, self.languages_holder)
-
-        if language is None or language not in self.supported_languages:
+        blob_id = change.new.sha.decode()
+        code = None
+        language = self.languages_holder.get(get_language_key(file_path, blob_id), None)
+        if language is None:
+            with span("blob_load"):
+                code = self.repo.get_object(change.new.sha).as_pretty_string()  # in bytes
+            language = define_file_language(file_path, code, self.languages_holder, blob_id=blob_id)
+
+        if not language or language not in self.supported_languages:
             return None
 
-        return self.process_queries(RepoParser.parsers[language]["language"],
-                                    code,
-                                    RepoParser.parsers[language]["parser"])
+        return self.parse_blob(blob_id, language, code)
 
-    def process_queries(self, queried_language: QueriedLanguage, code: bytes, parser: Parser) -> Dict:
+    def parse_blob(self, blob_id: str, language: str, code: Union[bytes, None] = None) -> Dict[str, Set]:
+        """
+        Gives parse result of blob from cache or parses it. Cache key is (blob id, language, queries hash),
+        so the same file in forks and copies is parsed only once
+
+        :param blob_id: sha of blob
+        :param language: programming language of blob, one of supported languages
+        :param code: content of blob, loaded from repository if not given and result is not cached
+        :return: dict {"variables" : set(), "imports" : set()}
+        """
+        queried_language = RepoParser.parsers[language]["language"]
+        key = f"{blob_id}:{language}:{queried_language.queries_hash}"
+
+        cached = self.parse_cache.get(key, None)
+        if cached is not None:
+            return {q_type: set(values) for q_type, values in cached.items()}
+
+        if code is None:
+            code = self.load_blob(blob_id)
+        with span("parse"):
+            result = self.process_queries(queried_language, code, RepoParser.parsers[language]["parser"])
+        self.parse_cache[key] = {q_type: sorted(values) for q_type, values in result.items()}
+        return result
+
+    def parse_blob_diff(self,
+                        old_blob_id: str,
+                        blob_id: str,
+                        language: str,
+                        old_code: Union[bytes, None] = None,
+                        code: Union[bytes, None] = None,
+                        file_path: Union[str, None] = None) -> Dict[str, Set]:
+        """
+        Gives identifiers of the new blob that are located in lines changed since the old blob.
+        New blob is parsed once, incrementally if another version of the same file was parsed before,
+        see get_tree. Queries are run only over changed byte ranges
+
+        :param old_blob_id: sha of old version of file
+        :param blob_id: sha of new version of file
+        :param language: programming language of blob, one of supported languages
+        :param old_code: content of old blob, loaded from repository if not given and result is not cached
+        :param code: content of new blob, loaded from repository if not given and result is not cached
+        :param file_path: path of file, allows to reuse tree of its previously parsed version
+        :return: dict {"variables" : set(), "imports" : set()}
+        """
+        queried_language = RepoParser.parsers[language]["language"]
+        key = f"{old_blob_id}..{blob_id}:{language}:{queried_language.queries_hash}"
+
+        cached = self.parse_cache.get(key, None)
+        if cached is not None:
+            return {q_type: set(values) for q_type, values in cached.items()}
+
+        old_code = self.load_blob(old_blob_id) if old_code is None else old_code
+        code = self.load_blob(blob_id) if code is None else code
+
+        with span("diff"):
+            blocks = changed_line_blocks(old_code, code)
+        new_offsets = get_line_offsets(code)
+
+        with span("parse"):
+            tree = self.get_tree(language, blob_id, code, file_path)
+            byte_ranges = [(new_offsets[new_start], new_offsets[new_end])
+                           for _, _, new_start, new_end in blocks if new_end > new_start]
+            result = self.process_queries(queried_language, code, RepoParser.parsers[language]["parser"], tree,
+                                          byte_ranges)
+        self.parse_cache[key] = {q_type: sorted(values) for q_type, values in result.items()}
+        return result
+
+    def get_tree(self, language: str, blob_id: str, code: bytes, file_path: Union[str, None] = None) -> Tree:
+        """
+        Parses code. The last tree of the same file is edited to the code and reused by incremental parse,
+        so history of file walked in any direction is parsed from scratch only once
+
+        :param language: programming language of code, one of supported languages
+        :param blob_id: sha of code
+        :param code: content of blob
+        :param file_path: path of file, None to parse without reusing trees
+        :return: tree-sitter Tree of code
+        """
+        parser = RepoParser.parsers[language]["parser"]
+        if file_path is None:
+            return parser.parse(code)
+
+        last = self.last_trees.pop((language, file_path), None)
+        if last is None:
+            tree = parser.parse(code)
+        elif last[0] == blob_id:
+            tree = last[2]
+        else:
+            _, last_code, last_tree = last
+            edit_tree(last_tree, last_code, code)
+            tree = parser.parse(code, last_tree)
+
+        self.last_trees[(language, file_path)] = (blob_id, code, tree)
+        if len(self.last_trees) > LAST_TREES_SIZE:
+            self.last_trees.popitem(last=False)
+        return tree
+
+    def load_blob(self, blob_id: str) -> bytes:
+        with span("blob_load"):
+            return self.repo.get_object(blob_id.encode()).as_pretty_string()
+
+    def parse_record(self,
+                     commit_info: Dict,
+                     code: bytes,
+                     old_code: Union[bytes, None] = None,
+                     old_blob_id: Union[str, None] = None) -> Union[Dict, None]:
+        """
+        Parses blob of commit_info that is already loaded and language-defined by commits walk,
+        see commits_info.get_commits_info_floored blob_handler
+
+        :param commit_info: commit_info dict of changed file
+        :param code: content of changed file
+        :param old_code: content of previous version of file, None for added files
+        :param old_blob_id: sha of previous version of file, None for added files
+        :return: dict {"variables" : list, "imports" : list} or None if language is not supported
+        """
+        language = commit_info["programming_language"]
+        if language not in self.supported_languages:
+            return None
+
+        if self.diff_scoped and old_code is not None:
+            result = self.parse_blob_diff(old_blob_id, commit_info["blob_id"], language, old_code, code,
+                                          commit_info["file_path"])
+        else:
+            result = self.parse_blob(commit_info["blob_id"], language, code)
+        self.variables.update(result["variables"])
+        self.imports.update(result["imports"])
+        return {q_type: list(values) for q_type, values in result.items()}
+
+    def process_queries(self,
+                        queried_language: QueriedLanguage,
+                        code: bytes,
+                        parser: Parser,
+                        tree: Union[Tree, None] = None,
+                        byte_ranges: Union[List[Tuple[int, int]], None] = None) -> Dict:
         """
         Method parses given code using tree-sitter utilities. QueriedLanguage object contains parsing queries
 
         :param parser: parser object in order to... parse?
         :param queried_language: QueriedLanguage object that contains parsing queries
         :param code: Code to being parsed
+        :param tree: already parsed tree of code, code is parsed if not given
+        :param byte_ranges: list of [start, end) byte ranges, only captures intersecting them are taken.
+                None for the whole code
         :return: dict {"variables" : set(), "imports" : set()}
         """
-        tree = parser.parse(code)
+        if tree is None:
+            tree = parser.parse(code)
 
         result = {}
         for q_type, query in queried_language.query_types.items():
-            result[q_type] = {code[x[0].start_byte:x[0].end_byte].decode("latin-1")
-                              for x in queried_language.capture_query(q_type, tree.root_node)}
+            if byte_ranges is None:
+                captures = queried_language.capture_query(q_type, tree.root_node)
+            else:
+                captures = [x for start, end in byte_ranges
+                            for x in queried_language.capture_query(q_type, tree.root_node, start, end)
+                            if x[0].start_byte < end and x[0].end_byte > start]
+            result[q_type] = {code[x[0].start_byte:x[0].end_byte].decode("latin-1") for x in captures}
         return result
 
     def handle_author_imports(self, commit_info) -> Union[Set, None]:
@@ -142,9 +340,8 @@ class RepoParser(object):
         :param commit_info: commit_info object to get info about file
         :return: set of imports
         """
-        if commit_info["programming_language"].lower() not in self.supported_languages:
-            return None
-        return self.used_files[commit_info["file_path"]]["imports"]
+        result = self.get_blob_result(commit_info)
+        return None if result is None else result["imports"]
 
     def handle_author_variables(self, commit_info) -> Union[Set, None]:
         """
@@ -153,6 +350,92 @@ class RepoParser(object):
         :param commit_info: commit_info object to get info about file
         :return set of variables
         """
-        if commit_info["programming_language"].lower() not in self.supported_languages:
+        result = self.get_blob_result(commit_info)
+        return None if result is None else result["variables"]
+
+    def get_blob_result(self, commit_info: Dict) -> Union[Dict[str, Set], None]:
+        """
+        Gives parse result of the file version written in commit_info, so each author gets identifiers
+        of their own version of file. Blob is parsed only when it is requested for the first time
+
+        :param commit_info: commit_info object with blob_id and programming_language
+        :return: dict {"variables" : set(), "imports" : set()} or None if language is not supported
+                or blob is absent in repository
+        """
+        language = commit_info["programming_language"].lower()
+        if language not in self.supported_languages:
             return None
-        return self.used_files[commit_info["file_path"]]["variables"]
+
+        blob_id = commit_info["blob_id"]
+        old_blob_id = self.get_parent_blob_id(commit_info) if self.diff_scoped else None
+        key = blob_id if old_blob_id is None else f"{old_blob_id}..{blob_id}"
+        if key not in self.parsed_blobs:
+            try:
+                if old_blob_id is None:
+                    self.parsed_blobs[key] = self.parse_blob(blob_id, language)
+                else:
+                    self.parsed_blobs[key] = self.parse_blob_diff(old_blob_id, blob_id, language,
+                                                                  file_path=commit_info["file_path"])
+            except KeyError:
+                logger.log(2, f"\t{self.repo_url} doesn't contain blob {blob_id}")
+                self.parsed_blobs[key] = None
+        return self.parsed_blobs[key]
+
+    def get_parent_blob_id(self, commit_info: Dict) -> Union[str, None]:
+        """
+        Finds version of commit_info file in the first parent of its commit
+
+        :param commit_info: commit_info object with commit_id and file_path
+        :return: sha of blob or None if file was added by commit or commit is absent
+        """
+        try:
+            commit = self.repo.get_object(commit_info["commit_id"].encode())
+            if not commit.parents:
+                return None
+            parent = self.repo.get_object(commit.parents[0])
+            _, sha = tree_lookup_path(self.repo.get_object, parent.tree, commit_info["file_path"].encode())
+        except KeyError:
+            return None
+        return sha.decode()
+
+
+def get_parse_cache(path: Union[str, Path] = PARSE_CACHE_FILE) -> PersistentCache:
+    """
+    Returns parse results cache of the current process
+
+    :param path: path to SQLite file with cache
+    :return: PersistentCache
+    """
+    return get_cache(path, table="parses", memory_size=20000)
+
+
+def get_line_offsets(code: bytes) -> List[int]:
+    """
+    :param code: content of file
+    :return: byte offsets of lines starts, the last element is length of code
+    """
+    offsets = [0]
+    for line in code.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def edit_tree(tree: Tree, old_code: bytes, code: bytes) -> None:
+    """
+    Applies changed line blocks between old_code and code to the tree of old_code,
+    so it can be passed to incremental parse of code
+
+    :param tree: tree of old_code, it is changed in place
+    :param old_code: content the tree was parsed from
+    :param code: new content
+    :return: None
+    """
+    old_offsets, new_offsets = get_line_offsets(old_code), get_line_offsets(code)
+    for old_start, old_end, new_start, new_end in reversed(changed_line_blocks(old_code, code)):
+        start_byte = old_offsets[old_start]  # blocks are applied from the end, so earlier positions stay valid
+        tree.edit(start_byte=start_byte,
+                  old_end_byte=old_offsets[old_end],
+                  new_end_byte=start_byte + new_offsets[new_end] - new_offsets[new_start],
+                  start_point=(old_start, 0),
+                  old_end_point=(old_end, 0),
+                  new_end_point=(old_start + new_end - new_start, 0))
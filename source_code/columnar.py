@@ -0,0 +1,206 @@
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # columnar output is optional, jsonl works without pyarrow
+    pa = None
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# schema name : [(column, type)], "dictionary" columns have few distinct values and are dictionary-encoded
+SCHEMAS = {
+    "commits_info": [("repo_url", "dictionary"),
+                     ("author_name", "dictionary"),
+                     ("author_email", "dictionary"),
+                     ("commit_id", "string"),
+                     ("programming_language", "dictionary"),
+                     ("file_path", "dictionary"),
+                     ("blob_id", "string"),
+                     ("added_lines_num", "int64"),
+                     ("deleted_lines_num", "int64")],
+    "variables_imports": [("author", "dictionary"),
+                          ("path", "dictionary"),
+                          ("imports", "list"),
+                          ("variables", "list")],
+}
+
+
+def check_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Columnar formats require pyarrow, install it with `pip install pyarrow`")
+
+
+def get_schema(schema_name: str) -> "pa.Schema":
+    """
+    :param schema_name: one of SCHEMAS keys
+    :return: arrow schema of records
+    """
+    check_pyarrow()
+    types = {"dictionary": pa.dictionary(pa.int32(), pa.string()),
+             "string": pa.string(),
+             "int64": pa.int64(),
+             "list": pa.list_(pa.string())}
+    return pa.schema([(column, types[column_type]) for column, column_type in SCHEMAS[schema_name]])
+
+
+def get_dataset_path(path: Path, output_format: str) -> Path:
+    """
+    Columnar dataset is a folder of part files, it is named after the given file with format suffix,
+    e.g. "commits_info.txt" becomes "commits_info.parquet"
+
+    :param path: path given for output file
+    :param output_format: one of COLUMNAR_FORMATS
+    :return: path to dataset folder
+    """
+    return Path(path).with_suffix(COLUMNAR_FORMATS[output_format])
+
+
+def get_dataset_format(path: Path) -> Union[str, None]:
+    """
+    :param path: path to file or folder
+    :return: format of columnar dataset in the folder or None if path is not a columnar dataset
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return None
+    for output_format, suffix in COLUMNAR_FORMATS.items():
+        if any(path.glob(f"*{suffix}")):
+            return output_format
+    return None
+
+
+class ColumnarWriter(object):
+    """
+    Writes records into partitioned columnar dataset: each writer creates its own part file in dataset folder,
+    so several runs and processes don't conflict. Part file is a sequence of row groups (record batches for Arrow)
+    of row_group_size records, readers can stream them one by one. Parquet row groups get their own dictionaries.
+    Arrow IPC file can't replace dictionaries, so there they only grow inside of one part file and are stored
+    as deltas
+    """
+
+    def __init__(self, path: Path, schema_name: str, output_format: str = "parquet", row_group_size: int = 10000):
+        """
+        :param path: path to dataset folder, see get_dataset_path
+        :param schema_name: one of SCHEMAS keys, fields of records that are absent in schema are not written
+        :param output_format: one of COLUMNAR_FORMATS
+        :param row_group_size: number of records in one row group
+        """
+        check_pyarrow()
+        if output_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"{output_format} is not a columnar format."
+                             f"\nChoose one of {', '.join(COLUMNAR_FORMATS.keys())}")
+
+        self.path = Path(path)
+        self.schema = get_schema(schema_name)
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.written = 0
+
+        self._buffer: List[Dict] = []
+        self._dictionaries: Dict[str, Dict[str, int]] = {}  # column : {value: index} for Arrow IPC
+        self._dictionaries_arrays: Dict[str, "pa.Array"] = {}
+        if output_format == "arrow":
+            for field in self.schema:
+                if pa.types.is_dictionary(field.type):
+                    self._dictionaries[field.name] = {}
+                    self._dictionaries_arrays[field.name] = pa.array([], pa.string())
+        self._writer = None
+
+    def __enter__(self) -> "ColumnarWriter":
+        self.path.mkdir(parents=True, exist_ok=True)
+        part_name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        part_path = str(self.path / f"{part_name}{COLUMNAR_FORMATS[self.output_format]}")
+
+        if self.output_format == "parquet":
+            self._writer = pq.ParquetWriter(part_path, self.schema, compression="zstd")
+        else:
+            self._writer = ipc.new_file(part_path, self.schema,
+                                        options=ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def write(self, record: Dict) -> None:
+        self._buffer.append(record)
+        if len(self._buffer) >= self.row_group_size:
+            self.write_row_group()
+
+    def write_row_group(self) -> None:
+        """
+        Writes buffered records as one row group
+
+        :return: None
+        """
+        if not self._buffer:
+            return
+
+        arrays = []
+        for field in self.schema:
+            values = [record.get(field.name) for record in self._buffer]
+            if field.name in self._dictionaries:
+                arrays.append(self.encode_growing(field.name, values))
+            elif pa.types.is_dictionary(field.type):
+                arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.written += len(self._buffer)
+        self._buffer = []
+
+    def encode_growing(self, column: str, values: List[Union[str, None]]) -> "pa.DictionaryArray":
+        """
+        Encodes values with the dictionary of the column extended by their new values,
+        only the new values are converted to arrow
+
+        :param column: name of dictionary-encoded column
+        :param values: values of the column in buffered records
+        :return: DictionaryArray
+        """
+        dictionary = self._dictionaries[column]
+        indices, new_values = [], []
+        for value in values:
+            index = None if value is None else dictionary.get(value)
+            if index is None and value is not None:
+                index = dictionary[value] = len(dictionary)
+                new_values.append(value)
+            indices.append(index)
+
+        if new_values:
+            self._dictionaries_arrays[column] = pa.concat_arrays([self._dictionaries_arrays[column],
+                                                                  pa.array(new_values, pa.string())])
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), self._dictionaries_arrays[column])
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+        self.write_row_group()
+        self._writer.close()
+        self._writer = None
+
+
+def read_columnar(path: Path, columns: Union[List[str], None] = None, batch_size: int = 10000) -> Iterator[Dict]:
+    """
+    Streams records of columnar dataset batch by batch, only the requested columns are read
+
+    :param path: path to dataset folder
+    :param columns: names of columns to read, None for all of them
+    :param batch_size: maximum number of records read at once
+    :return: Iterator of dicts
+    """
+    check_pyarrow()
+    output_format = get_dataset_format(path)
+    dataset = ds.dataset(str(path), format="parquet" if output_format == "parquet" else "ipc")
+    if columns is not None:
+        columns = [column for column in columns if column in dataset.schema.names]
+
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        yield from batch.to_pylist()
@@ -0,0 +1,325 @@
+import fnmatch
+import inspect
+import json
+import os
+import re
+import stat
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Pattern, Tuple, Union
+
+from dulwich.diff_tree import TreeChange
+from dulwich.objects import Commit, TreeEntry
+from dulwich.repo import Repo
+
+from source_code.git_repo_extract.language_detection import EXTENSIONS, FILENAMES, IMAGE_EXTENSIONS, is_vendored
+
+MEGABYTE = 2 ** 20
+
+BINARY_EXTENSIONS = IMAGE_EXTENSIONS | {
+    ".7z", ".a", ".bin", ".class", ".dll", ".dylib", ".eot", ".exe", ".gz", ".h5", ".jar", ".mp3", ".mp4",
+    ".npy", ".npz", ".o", ".otf", ".pdf", ".pkl", ".pyc", ".so", ".tar", ".ttf", ".war", ".wav", ".whl",
+    ".woff", ".woff2", ".xz", ".zip",
+}
+
+LOCKFILES = ["*.lock", "*package-lock.json", "*npm-shrinkwrap.json", "*pnpm-lock.yaml", "*go.sum"]
+
+# "[[]" is escaped bracket, "[bot]" alone is a class of characters
+BOT_AUTHORS = ["*[[]bot]*", "*dependabot*", "*renovate*", "*github-actions*", "*greenkeeper*", "*-bot <*",
+               "*pre-commit-ci*"]
+
+# filter of cli commands, changes of these files are never attributed to developers
+DEFAULT_FILTER_CONFIG: Dict[str, Any] = {
+    "exclude_paths": LOCKFILES,
+    "exclude_vendored": True,
+    "exclude_binaries": True,
+    "max_blob_size": MEGABYTE,
+    "exclude_bots": True,
+}
+
+PACK_OFS_DELTA, PACK_REF_DELTA = 6, 7
+
+
+def compile_globs(patterns: Union[List[str], None]) -> Union[Pattern, None]:
+    """
+    :param patterns: fnmatch patterns, "*" matches "/" too
+    :return: one case-insensitive regular expression matching any of patterns, None if there are no patterns
+    """
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns), re.IGNORECASE)
+
+
+def to_timestamp(date: Union[str, datetime, float, None]) -> Union[float, None]:
+    """
+    :param date: ISO date string, datetime or unix timestamp. Dates without timezone are taken as UTC
+    :return: unix timestamp
+    """
+    if date is None or isinstance(date, (int, float)):
+        return date
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def get_language_extensions(languages: List[str]) -> List[str]:
+    """
+    :param languages: names of languages, case-insensitive
+    :return: extensions and file names that language_detection maps to the languages
+    """
+    languages = {language.lower() for language in languages}
+    names = []
+    for name, candidates in list(EXTENSIONS.items()) + list(FILENAMES.items()):
+        candidates = [candidates] if isinstance(candidates, str) else candidates
+        if any(candidate.lower() in languages for candidate in candidates):
+            names.append(name)
+    return names
+
+
+class ChangeFilter(object):
+    """
+    Declarative filter of commits and changed files that is evaluated before any blob is read:
+    commits are checked by author and date, changes by file mode, path and blob size taken from object header.
+    Parameters can be kept in JSON file, see from_dict
+    """
+
+    def __init__(self,
+                 include_paths: Union[List[str], None] = None,
+                 exclude_paths: Union[List[str], None] = None,
+                 languages: Union[List[str], None] = None,
+                 exclude_vendored: bool = False,
+                 exclude_binaries: bool = False,
+                 max_blob_size: Union[int, None] = None,
+                 authors: Union[List[str], None] = None,
+                 exclude_authors: Union[List[str], None] = None,
+                 exclude_bots: bool = False,
+                 since: Union[str, datetime, float, None] = None,
+                 until: Union[str, datetime, float, None] = None):
+        """
+        :param include_paths: globs of file paths to take, all paths if None
+        :param exclude_paths: globs of file paths to skip
+        :param languages: take only files with extensions or names of these languages, e.g. ["python", "java"].
+                Extensionless files recognized by shebang are skipped then
+        :param exclude_vendored: skip third party code, see language_detection.is_vendored
+        :param exclude_binaries: skip images, archives, compiled files and other binaries by extension
+        :param max_blob_size: skip blobs larger than this number of bytes
+        :param authors: globs of "Name <email>" of commit authors to take, all authors if None
+        :param exclude_authors: globs of "Name <email>" of commit authors to skip
+        :param exclude_bots: skip commits of dependabot, renovate, github-actions and other bots
+        :param since: skip commits authored before this date (ISO string, datetime or timestamp)
+        :param until: skip commits authored after this date
+        """
+        self.include_paths = compile_globs(include_paths)
+        self.exclude_paths = compile_globs(exclude_paths)
+        self.extensions = None if languages is None else set(get_language_extensions(languages))
+        self.exclude_vendored = exclude_vendored
+        self.exclude_binaries = exclude_binaries
+        self.max_blob_size = max_blob_size
+        self.authors = compile_globs(authors)
+        self.exclude_authors = compile_globs((exclude_authors or []) + (BOT_AUTHORS if exclude_bots else []))
+        self.since = to_timestamp(since)
+        self.until = to_timestamp(until)
+        self._paths: Dict[bytes, bool] = {}  # the same paths are changed by many commits
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "ChangeFilter":
+        """
+        :param config: dict of constructor parameters, e.g. {"exclude_paths": ["docs/*"], "max_blob_size": 100000}
+        :return: ChangeFilter
+        """
+        unknown = set(config) - set(inspect.signature(cls).parameters)
+        if unknown:
+            raise ValueError(f"Unknown filter parameters: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "ChangeFilter":
+        with Path(path).open("r") as f:
+            return cls.from_dict(json.load(f))
+
+    def allow_commit(self, commit: Commit) -> bool:
+        """
+        :param commit: commit object, its trees and blobs are not read
+        :return: False if commit should be skipped
+        """
+        if self.since is not None and commit.author_time < self.since:
+            return False
+        if self.until is not None and commit.author_time > self.until:
+            return False
+        if self.authors is None and self.exclude_authors is None:
+            return True
+
+        author = commit.author.decode("utf-8", "replace")
+        if self.authors is not None and not self.authors.match(author):
+            return False
+        return self.exclude_authors is None or not self.exclude_authors.match(author)
+
+    def allow_path(self, path: bytes) -> bool:
+        allowed = self._paths.get(path)
+        if allowed is None:
+            allowed = self._paths[path] = self._check_path(path.decode("utf-8", "replace"))
+        return allowed
+
+    def allow_change(self, change: TreeChange, sizes: Union["BlobSizes", None] = None) -> bool:
+        """
+        :param change: change of file, only its modes, paths and shas are used
+        :param sizes: reader of blob sizes, size isn't checked if None
+        :return: False if change should be skipped
+        """
+        return self.allow_entry(change.new, sizes)
+
+    def allow_entry(self, entry: TreeEntry, sizes: Union["BlobSizes", None] = None) -> bool:
+        """
+        :param entry: one side of change, e.g. change.old of deletion
+        :param sizes: reader of blob sizes, size isn't checked if None
+        :return: False if blob of entry shouldn't be read
+        """
+        if entry.sha is None or not stat.S_ISREG(entry.mode):  # deletions, symlinks and submodules
+            return False
+        if not self.allow_path(entry.path):
+            return False
+        if self.max_blob_size is not None and sizes is not None:
+            size = sizes.get(entry.sha)
+            return size is None or size <= self.max_blob_size
+        return True
+
+    def _check_path(self, path: str) -> bool:
+        if self.include_paths is not None and not self.include_paths.match(path):
+            return False
+        if self.exclude_paths is not None and self.exclude_paths.match(path):
+            return False
+
+        file_name = path.rsplit("/", 1)[-1]
+        extension = os.path.splitext(file_name)[1].lower()
+        if self.extensions is not None and extension not in self.extensions and file_name not in self.extensions:
+            return False
+        if self.exclude_binaries and extension in BINARY_EXTENSIONS:
+            return False
+        return not (self.exclude_vendored and is_vendored(path))
+
+
+def get_blob_sizes(repo: Repo, change_filter: Union[ChangeFilter, None]) -> Union["BlobSizes", None]:
+    """
+    :return: BlobSizes of repo if change_filter checks sizes of blobs, None otherwise
+    """
+    if change_filter is None or change_filter.max_blob_size is None:
+        return None
+    return BlobSizes(repo)
+
+
+def get_change_filter(config: Union[str, Path, Dict, ChangeFilter, None] = None) -> Union[ChangeFilter, None]:
+    """
+    :param config: path to JSON file with filter parameters, dict of them, ChangeFilter instance or None
+    :return: ChangeFilter or None if nothing should be filtered
+    """
+    if config is None or isinstance(config, ChangeFilter):
+        return config
+    if isinstance(config, dict):
+        return ChangeFilter.from_dict(config)
+    return ChangeFilter.from_file(config)
+
+
+class BlobSizes(object):
+    """
+    Reads sizes of blobs from headers of git objects, so blobs are not inflated: loose object header
+    is in the first bytes of its zlib stream, packed object has size in pack entry header and delta
+    has size of result in the first bytes of its zlib stream. Sizes of objects missing in partial clones are unknown
+    """
+
+    def __init__(self, repo: Repo):
+        self.repo = repo
+        self._packs = None
+        self._files: Dict[str, BinaryIO] = {}
+
+    def get(self, sha: bytes) -> Union[int, None]:
+        """
+        :param sha: hex sha of blob
+        :return: size in bytes or None if object isn't found
+        """
+        store = self.repo.object_store
+        if self._packs is None:  # listing of packs folder is read once, repository doesn't change during walk
+            self._packs = list(getattr(store, "packs", []))
+        for pack in self._packs:
+            try:
+                offset = pack.index.object_offset(sha)
+            except KeyError:
+                continue
+            return self._packed_size(pack.data.path, offset)
+
+        path = os.path.join(getattr(store, "path", ""), sha[:2].decode(), sha[2:].decode())
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                header = inflate_prefix(f, 64)
+            return int(header[header.index(b" ") + 1:header.index(b"\0")])
+        return None
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def _packed_size(self, pack_path: str, offset: int) -> int:
+        f = self._files.get(pack_path)
+        if f is None:
+            f = self._files[pack_path] = open(pack_path, "rb")
+        f.seek(offset)
+        data = f.read(32)  # type, size and offset of delta base take at most 20 bytes
+
+        byte = data[0]
+        object_type, size, shift, position = (byte >> 4) & 7, byte & 15, 4, 1
+        while byte & 0x80:
+            byte = data[position]
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            position += 1
+        if object_type not in (PACK_OFS_DELTA, PACK_REF_DELTA):
+            return size
+
+        if object_type == PACK_REF_DELTA:
+            position += 20
+        else:
+            while data[position] & 0x80:
+                position += 1
+            position += 1
+        f.seek(offset + position)
+        delta_header = inflate_prefix(f, 20)
+        _, position = read_varint(delta_header, 0)  # size of base object
+        return read_varint(delta_header, position)[0]
+
+
+def inflate_prefix(f: BinaryIO, length: int, chunk_size: int = 256) -> bytes:
+    """
+    Inflates only the beginning of zlib stream
+
+    :param f: file positioned at the start of zlib stream
+    :param length: number of bytes needed
+    :param chunk_size: number of compressed bytes read at once
+    :return: at least length first bytes of inflated data, less if data is shorter
+    """
+    decompressor = zlib.decompressobj()
+    result = b""
+    while len(result) < length and not decompressor.eof:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        result += decompressor.decompress(chunk, length - len(result))
+        while len(result) < length and decompressor.unconsumed_tail:
+            result += decompressor.decompress(decompressor.unconsumed_tail, length - len(result))
+    return result
+
+
+def read_varint(data: bytes, position: int) -> Tuple[int, int]:
+    """
+    :return: (value of little-endian base-128 number used in delta headers, position after it)
+    """
+    value, shift = 0, 0
+    while True:
+        byte = data[position]
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        position += 1
+        if not byte & 0x80:
+            return value, position
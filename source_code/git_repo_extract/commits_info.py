@@ -1,24 +1,45 @@
-import difflib
-import json
 import logging
-import os
-import subprocess
 import sys
-import tempfile
-from typing import Any, Dict, Iterator, Tuple, Union
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
-from dulwich.diff_tree import TreeChange
+from dulwich.diff_tree import CHANGE_ADD, CHANGE_MODIFY, RENAME_THRESHOLD, RenameDetector, tree_changes, \
+    tree_changes_for_merge, TreeChange
+from dulwich.objects import Commit, ShaFile
 from dulwich.repo import Repo
 from tqdm import tqdm
 
-from source_code.git_repo_extract.repo_ops import get_repos_url
-from source_code.utils import ENRY_PATH
+from source_code.git_repo_extract.change_filter import BlobSizes, ChangeFilter, get_blob_sizes, get_change_filter
+from source_code.git_repo_extract.language_detection import FILENAMES, get_detector, get_detector_name, \
+    is_vendored, LanguageDetector
+from source_code.git_repo_extract.line_diff import count_changed_lines
+from source_code.git_repo_extract.repo_ops import get_repos_url, PartialCloneRepo
+from source_code.persistent_cache import get_cache, PersistentCache
+from source_code.profiling import profiled, span, timed_iterator
+from source_code.utils import Checkpoint, CHECKPOINTS_FILE, LANGUAGES_CACHE_FILE
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler(sys.stdout))
 
-
-def get_commits_info_floored(repo: Repo, limit: int = -1) -> Iterator[Dict[str, Any]]:
+MERGE_POLICIES = ["skip", "first_parent", "combined"]
+CHECKPOINTS_TABLE = "checkpoints"
+
+# (commit_info, content of blob, content of previous version of blob, sha of previous version) -> dict to add
+BlobHandler = Callable[[Dict, bytes, Union[bytes, None], Union[str, None]], Union[Dict, None]]
+
+
+def get_commits_info_floored(repo: Repo,
+                             limit: int = -1,
+                             detector: Union[str, LanguageDetector, None] = None,
+                             languages_cache_path: Union[str, Path, None] = LANGUAGES_CACHE_FILE,
+                             checkpoints_path: Union[str, Path, None] = None,
+                             blob_handler: Union[BlobHandler, None] = None,
+                             merge_policy: str = "combined",
+                             rename_threshold: int = RENAME_THRESHOLD,
+                             find_copies: bool = False,
+                             change_filter: Union[str, Path, Dict, ChangeFilter, None] = None,
+                             yield_checkpoint: bool = False
+                             ) -> Iterator[Union[Dict[str, Any], Checkpoint]]:
     """
       A method returns Dictionaries with info about authors commits on given repo
 
@@ -38,29 +59,122 @@ def get_commits_info_floored(repo: Repo, limit: int = -1) -> Iterator[Dict[str,
       Args:
         :param repo: source repository
         :param limit: limit of entities to check. Useful for pipeline check
+        :param detector: language detector name or instance, None for the default one
+        :param languages_cache_path: path to file with languages of already seen blobs,
+                None to keep them in memory only during this call
+        :param checkpoints_path: path to file with last processed commits of repositories. If given,
+                only commits that appeared after previous call are walked and the newest commit is saved there
+                when the whole history is walked, i.e. limit isn't reached
+        :param blob_handler: function called with each dict, content of its blob, content and sha of previous
+                version of blob (None for added files), returned dict is added to the dict.
+                Allows to process blob in the same walk without loading it again
+        :param merge_policy: which changes of merge commits are taken, one of MERGE_POLICIES, see get_commit_changes
+        :param rename_threshold: similarity in percents above which deleted and added files are taken as renamed,
+                so only changed lines are counted and old blob is given to blob_handler. Negative value disables
+                rename detection
+        :param find_copies: also look for sources of copied files among unchanged files, slow on large trees
+        :param change_filter: commits and files to skip before their blobs are read: ChangeFilter, dict of its
+                parameters or path to JSON file with them, None to take everything
+        :param yield_checkpoint: give utils.Checkpoint as the last item instead of saving it, so it is saved
+                after the records are written, see utils.StreamWriter
 
       Returns:
         :return Iterator of dicts
     """
-    languages_holder = dict()
+    if merge_policy not in MERGE_POLICIES:
+        raise ValueError(f"{merge_policy} is not a merge policy.\nChoose one of {', '.join(MERGE_POLICIES)}")
+
+    languages_holder = dict() if languages_cache_path is None else get_languages_cache(languages_cache_path)
     repo_url = get_repos_url(repo)
-    i = 0
-    for walk in tqdm(repo.get_walker(), desc=f"{repo_url} processing"):
-        name = walk.commit.author.decode()
-        mail = name[name.find("<") + 1:-1]
-        name = name[:name.find("<")].strip()
+    change_filter = get_change_filter(change_filter)
+    sizes = get_blob_sizes(repo, change_filter)
+    rename_detector = get_rename_detector(repo, rename_threshold, find_copies, change_filter, sizes)
+    checkpoints = None if checkpoints_path is None else get_checkpoints(checkpoints_path)
+    exclude = [] if checkpoints is None else get_processed_commits(repo, checkpoints.get(repo_url, []))
+    try:
+        for i, content in enumerate(walk_commits_info(repo, repo_url, languages_holder, detector, exclude,
+                                                      blob_handler, merge_policy, rename_detector,
+                                                      change_filter, sizes)):
+            if limit != -1 and i >= limit:
+                break
+            yield content
+        else:
+            if checkpoints_path is not None:  # history is fully walked only when limit isn't reached
+                checkpoint = Checkpoint(checkpoints_path, repo_url, [repo.head().decode()], CHECKPOINTS_TABLE)
+                if yield_checkpoint:
+                    yield checkpoint
+                else:
+                    checkpoint.save()
+    finally:
+        if sizes is not None:
+            sizes.close()
+        if isinstance(languages_holder, PersistentCache):
+            languages_holder.flush()
+            logger.log(2, f"\t{repo_url} languages cache {languages_holder.stats()}")
+
+
+def walk_commits_info(repo: Repo,
+                      repo_url: str,
+                      languages_holder: Dict,
+                      detector: Union[str, LanguageDetector, None] = None,
+                      exclude: List[bytes] = None,
+                      blob_handler: Union[BlobHandler, None] = None,
+                      merge_policy: str = "combined",
+                      rename_detector: Union[RenameDetector, None] = None,
+                      change_filter: Union[ChangeFilter, None] = None,
+                      sizes: Union[BlobSizes, None] = None
+                      ) -> Iterator[Dict[str, Any]]:
+    """
+    Walks repository history from HEAD and gives commits_info dict for each suitable change
 
-        for changes in walk.changes():
-            if not isinstance(changes, list):
-                changes = [changes]
+    :param repo: source repository
+    :param repo_url: url of repository written to each dict
+    :param languages_holder: holder for already investigated files
+    :param detector: language detector name or instance, None for the default one
+    :param exclude: commits which (and their ancestors) should not be walked
+    :param blob_handler: function called with each dict and content of its blob, see get_commits_info_floored
+    :param merge_policy: which changes of merge commits are taken, one of MERGE_POLICIES
+    :param rename_detector: detector of renamed and copied files, None to take them as deleted and added
+    :param change_filter: filter of commits and changes applied before blobs are read, None to take everything.
+            Rename detector should be created with the same filter, see get_rename_detector
+    :param sizes: reader of blob sizes for change_filter, created and closed by this call if None
+    :return: Iterator of dicts
+    """
+    own_sizes = sizes is None
+    if own_sizes:
+        sizes = get_blob_sizes(repo, change_filter)
+    skipped_commits, skipped_changes = 0, 0
+    try:
+        for walk in tqdm(timed_iterator(repo.get_walker(exclude=exclude), "walk"), desc=f"{repo_url} processing"):
+            if change_filter is not None and not change_filter.allow_commit(walk.commit):
+                skipped_commits += 1
+                continue
+
+            name = walk.commit.author.decode()
+            mail = name[name.find("<") + 1:-1]
+            name = name[:name.find("<")].strip()
+
+            with span("walk"):
+                changes = get_commit_changes(repo, walk.commit, merge_policy, rename_detector)
+                if change_filter is not None:
+                    allowed = [change for change in changes if change_filter.allow_change(change, sizes)]
+                    skipped_changes += len(changes) - len(allowed)
+                    changes = allowed
+            if isinstance(repo, PartialCloneRepo):  # blobs of the commit are downloaded with one request
+                repo.prefetch([sha for change in changes if change.new.sha is not None
+                               for sha in (change.new.sha, change.old.sha)])
 
             for change in changes:
                 try:
-                    content = process_change(change,
-                                             repo,
-                                             languages_holder)
+                    content, blob_content, old_blob_content = read_change(change,
+                                                                          repo,
+                                                                          languages_holder,
+                                                                          detector=detector)
                     if content is None:
                         continue
+                    if blob_handler is not None:
+                        old_blob_id = None if old_blob_content is None else change.old.sha.decode()
+                        content.update(blob_handler(content, blob_content, old_blob_content, old_blob_id) or {})
                 except RuntimeError as e:
                     logger.exception(f"Runtime error {e}")
                     continue
@@ -69,14 +183,135 @@ def get_commits_info_floored(repo: Repo, limit: int = -1) -> Iterator[Dict[str,
                 content["author_name"] = name
                 content["author_email"] = mail
                 content["commit_id"] = walk.commit.id.decode()
-
-                if limit != -1 and i >= limit:
-                    return
-                i += 1
                 yield content
+    finally:
+        if own_sizes and sizes is not None:
+            sizes.close()
+        logger.log(2, f"\t{repo_url} filter skipped {skipped_commits} commits and {skipped_changes} changes")
+
+
+class _RepoObjects(object):
+    """
+    Object store view that reads objects with Repo.get_object, so rename detector can compare contents of blobs
+    that are missing in partial clones
+    """
+
+    def __init__(self, repo: Repo):
+        self.repo = repo
+
+    def __getitem__(self, sha: bytes) -> ShaFile:
+        return self.repo.get_object(sha)
+
+    def prefetch(self, shas: Iterable[bytes]) -> None:
+        if isinstance(self.repo, PartialCloneRepo):
+            self.repo.prefetch(shas)
+
+
+class _PrefetchingRenameDetector(RenameDetector):
+    """
+    Rename detector that requests blobs of added and deleted files of partial clones with one fetch
+    before their contents are compared
+    """
+
+    def _find_content_rename_candidates(self) -> None:
+        if self._should_find_content_renames():
+            self._store.prefetch([delete.old.sha for delete in self._deletes] + [add.new.sha for add in self._adds])
+        super()._find_content_rename_candidates()
 
 
-def get_diffs_num(old_content: str, new_content: str) -> Tuple[int, int]:
+class _FilteredRenameDetector(_PrefetchingRenameDetector):
+    """
+    Rename detector that drops changes rejected by ChangeFilter before their blobs are compared,
+    so contents of filtered lockfiles, vendored files and binaries are never read for similarity scores
+    """
+
+    def __init__(self, store: _RepoObjects, change_filter: ChangeFilter, sizes: Union[BlobSizes, None], **kwargs):
+        super().__init__(store, **kwargs)
+        self.change_filter = change_filter
+        self.sizes = sizes
+
+    def _add_change(self, change: TreeChange) -> None:
+        # added and modified files are taken by their new version, deleted and unchanged ones are sources of renames
+        entry = change.new if change.type in (CHANGE_ADD, CHANGE_MODIFY) else change.old
+        if self.change_filter.allow_entry(entry, self.sizes):
+            super()._add_change(change)
+
+
+def get_rename_detector(repo: Repo,
+                        rename_threshold: int = RENAME_THRESHOLD,
+                        find_copies: bool = False,
+                        change_filter: Union[ChangeFilter, None] = None,
+                        sizes: Union[BlobSizes, None] = None) -> Union[RenameDetector, None]:
+    """
+    :param repo: source repository
+    :param rename_threshold: similarity in percents above which files are taken as renamed or copied,
+            negative value disables detection
+    :param find_copies: look for sources of copies among unchanged files too
+    :param change_filter: changes rejected by the filter are dropped before detection, None to keep all of them
+    :param sizes: reader of blob sizes for change_filter
+    :return: RenameDetector or None if detection is disabled
+    """
+    if rename_threshold < 0:
+        return None
+    if change_filter is not None:
+        return _FilteredRenameDetector(_RepoObjects(repo), change_filter, sizes,
+                                       rename_threshold=rename_threshold, find_copies_harder=find_copies)
+    return _PrefetchingRenameDetector(_RepoObjects(repo), rename_threshold=rename_threshold,
+                                      find_copies_harder=find_copies)
+
+
+def get_commit_changes(repo: Repo,
+                       commit: Commit,
+                       merge_policy: str = "combined",
+                       rename_detector: Union[RenameDetector, None] = None) -> List[TreeChange]:
+    """
+    Gives changes of commit, each changed path once. Changes of merge commits depend on merge policy:
+    skip - no changes, work of merged branches is taken from their own commits;
+    first_parent - changes relative to the first parent, so the whole merged branch is attributed to the merge;
+    combined - only paths whose content differs from all the parents, i.e. conflict resolutions (git log --cc)
+
+    :param repo: source repository
+    :param commit: commit object
+    :param merge_policy: one of MERGE_POLICIES
+    :param rename_detector: detector of renamed and copied files, None to take them as deleted and added
+    :return: list of TreeChange
+    """
+    parents = repo.get_parents(commit.id, commit)  # shallow commits have no parents
+    if len(parents) > 1 and merge_policy == "skip":
+        return []
+    if len(parents) > 1 and merge_policy == "combined":
+        parent_trees = [repo[parent].tree for parent in parents]
+        return [next(change for change in changes if change is not None)
+                for changes in tree_changes_for_merge(repo.object_store, parent_trees, commit.tree, rename_detector)]
+
+    parent_tree = repo[parents[0]].tree if parents else None
+    return list(tree_changes(repo.object_store, parent_tree, commit.tree, rename_detector=rename_detector))
+
+
+def get_processed_commits(repo: Repo, commit_ids: List[str]) -> List[bytes]:
+    """
+    Filters saved commits, so only those that are still present in repository are excluded from walk.
+    Commits disappear after force push, in this case the whole history is walked again
+
+    :param repo: source repository
+    :param commit_ids: ids of commits saved in checkpoints
+    :return: list of commit ids that can be passed to walker exclude
+    """
+    return [commit_id.encode() for commit_id in commit_ids if commit_id.encode() in repo.object_store]
+
+
+def get_checkpoints(path: Union[str, Path] = CHECKPOINTS_FILE) -> PersistentCache:
+    """
+    Returns storage of {repo_url : [ids of the newest processed commits]} of the current process
+
+    :param path: path to SQLite file with checkpoints
+    :return: PersistentCache
+    """
+    return get_cache(path, table=CHECKPOINTS_TABLE)
+
+
+@profiled("diff")
+def get_diffs_num(old_content: Union[str, bytes], new_content: Union[str, bytes]) -> Tuple[int, int]:
     """
     A method that gives blob differences
 
@@ -84,25 +319,14 @@ def get_diffs_num(old_content: str, new_content: str) -> Tuple[int, int]:
     :param new_content: content of new version
     :return (Added, Deleted)
     """
-    old_content = old_content.splitlines()
-    new_content = new_content.splitlines()
-
-    differences = difflib.unified_diff(old_content, new_content)
-
-    added = 0
-    deleted = 0
-    for line in differences:
-        if line.startswith("+") and not line.startswith("++"):
-            added += 1
-        if line.startswith("-") and not line.startswith("--"):
-            deleted += 1
-    return added, deleted
+    return count_changed_lines(old_content, new_content)
 
 
 def process_change(ch: TreeChange,
                    repo: Repo,
                    languages_holder: Dict,
-                   max_line_restriction: int = -1) -> [Dict, None]:
+                   max_line_restriction: int = -1,
+                   detector: Union[str, LanguageDetector, None] = None) -> [Dict, None]:
     """
     Method for parsing blob change info into dict
 
@@ -111,94 +335,137 @@ def process_change(ch: TreeChange,
     :param languages_holder: accumulates information about repository files languages
     :param max_line_restriction: file analysis will be skipped if there added more than 'max_line_restriction'
             lines and None value will be returned. Negative value will make all files be counted
+    :param detector: language detector name or instance, None for the default one
     :return: dictionary with necessary elements or None if filetype doesn't suits language analysis
               or its added too many lines
     """
+    return read_change(ch, repo, languages_holder, max_line_restriction, detector)[0]
+
+
+def read_change(ch: TreeChange,
+                repo: Repo,
+                languages_holder: Dict,
+                max_line_restriction: int = -1,
+                detector: Union[str, LanguageDetector, None] = None
+                ) -> Tuple[Union[Dict, None], Union[bytes, None], Union[bytes, None]]:
+    """
+    Same as process_change, but also gives contents of blobs, so they can be reused by caller
+
+    :return: (dictionary or None, content of new blob, content of old blob).
+            Contents are None if they weren't loaded or file was added
+    """
     if ch.new.sha is None:
-        return None
+        return None, None, None
 
     content = {"file_path": ch.new.path.decode(),
                "blob_id": ch.new.sha.decode()}
 
-    text_to_define = repo.get_object(ch.new.sha).as_pretty_string().decode(encoding="latin-1")
+    with span("blob_load"):
+        text_to_define = repo.get_object(ch.new.sha).as_raw_string()
+    old_content = None
 
     if ch.old.sha is None:
         content["added_lines_num"] = len(text_to_define.splitlines())
         content["deleted_lines_num"] = 0
 
+    elif ch.old.sha == ch.new.sha:  # only file mode was changed
+        old_content = text_to_define
+        content["added_lines_num"] = 0
+        content["deleted_lines_num"] = 0
+
     else:
-        old_content = repo.get_object(ch.old.sha).as_pretty_string().decode(encoding="latin-1")
+        with span("blob_load"):
+            old_content = repo.get_object(ch.old.sha).as_raw_string()
 
         diffs = get_diffs_num(old_content, text_to_define)
         content["added_lines_num"] = diffs[0]
         content["deleted_lines_num"] = diffs[1]
 
-    if max_line_restriction >= 0 and content["added_lines_num"] < max_line_restriction:
-        return None
+    if max_line_restriction >= 0 and content["added_lines_num"] > max_line_restriction:
+        return None, text_to_define, old_content
 
-    language = define_file_language(content["file_path"], text_to_define, languages_holder)
+    language = define_file_language(content["file_path"], text_to_define, languages_holder, detector,
+                                    blob_id=content["blob_id"])
 
     if language is None:
-        return None
+        return None, text_to_define, old_content
 
     content["programming_language"] = language
-    return content
+    return content, text_to_define, old_content
 
 
-def define_file_language(file_name: str, file_content: str, languages_holder: Dict) -> Union[str, None]:
+def define_file_language(file_name: str,
+                         file_content: Union[str, bytes],
+                         languages_holder: Dict,
+                         detector: Union[str, LanguageDetector, None] = None,
+                         blob_id: Union[str, None] = None) -> Union[str, None]:
     """
-    Checks file on file_name and its content with Enry and returns its Programming language
+    Checks file on file_name and its content with language detector and returns its Programming language
 
     :param file_name: name of investigated file with its repository dir
     :param file_content: inner content of investigated file
-    :param languages_holder: holder for already investigated files
+    :param languages_holder: holder for already investigated files, either dict or PersistentCache
+    :param detector: language detector name or instance, None for the default one (see language_detection)
+    :param blob_id: sha of file blob. If given, files are remembered by content instead of file_name
     :return: str: language of file,  None: if file cannot be defined by language
     """
-    lang = languages_holder.get(file_name, None)
+    key = get_language_key(file_name, blob_id, detector)
+    lang = languages_holder.get(key, None)
     if lang is not None:
-        return lang
+        return lang or None  # empty string means that language can't be defined
 
-    entity = eliminate_language(file_name, file_content)
+    entity = eliminate_language(file_name, file_content, detector)
 
     if entity["type"] != "Text" or\
             entity["vendored"] or\
             entity["language"] == "":
+        languages_holder[key] = ""
         return None
 
-    return entity["language"].lower()
+    lang = entity["language"].lower()
+    languages_holder[key] = lang
+    return lang
 
 
-def eliminate_language(file_path: str, file_content: Union[str, bytes]) -> Dict:
+def get_language_key(file_name: str,
+                     blob_id: Union[str, None] = None,
+                     detector: Union[str, LanguageDetector, None] = None) -> str:
     """
-    Creates file with given content on given path. Extracts file language and deletes file
+    Key of file in languages holder. Blob content alone is not enough: detection also depends on extension,
+    on file name (Makefile, Dockerfile and other files without extension) and on vendored path
+
+    :param file_name: name of investigated file with its repository dir
+    :param blob_id: sha of file blob
+    :param detector: language detector name or instance, None for the default one
+    :return: "{blob_id}:{detector}:{extension or file name}:{vendored flag}" or file_name if blob_id is not given
+    """
+    if blob_id is None:
+        return file_name
+    path = Path(file_name)
+    name = path.name if not path.suffix or path.name in FILENAMES else path.suffix.lower()
+    return f"{blob_id}:{get_detector_name(detector)}:{name}:{int(is_vendored(file_name))}"
+
 
-    :param file_path: Path for file creation
+def get_languages_cache(path: Union[str, Path] = LANGUAGES_CACHE_FILE) -> PersistentCache:
+    """
+    Returns languages cache of the current process
+
+    :param path: path to SQLite file with cache
+    :return: PersistentCache
+    """
+    return get_cache(path, table="languages")
+
+
+@profiled("language")
+def eliminate_language(file_path: str,
+                       file_content: Union[str, bytes],
+                       detector: Union[str, LanguageDetector, None] = None) -> Dict:
+    """
+    Defines language of the given file with the chosen language detector
+
+    :param file_path: path of the file inside of its repository
     :param file_content: Inner file data
-    :return: File Language
-    """
-    file_name = file_path.split("/")[-1]
-    path = ENRY_PATH
-
-    splitted_f_name = file_name.split(".")
-    file_suffix = ""
-    if len(splitted_f_name) != 0:
-        file_suffix = splitted_f_name[-1]
-
-    with tempfile.NamedTemporaryFile(mode="w+b",
-                                     suffix="." + file_suffix,
-                                     prefix=splitted_f_name[0] + "_",
-                                     dir=str(path.parent),
-                                     delete=False) as fp:
-        try:
-            if isinstance(file_content, str):
-                fp.write(bytes(file_content, encoding="utf-8"))
-            else:
-                fp.write(file_content)
-            fp.close()
-
-            value = subprocess.run([str(path), "-json", fp.name], capture_output=True, text=True).stdout
-        except Exception as e:
-            logger.exception(e)
-        finally:
-            os.unlink(fp.name)
-    return json.loads(value)
+    :param detector: name of registered detector or detector instance, None for the default one
+    :return: dict {"language": str, "type": str, "vendored": bool}
+    """
+    return get_detector(detector).detect(file_path, file_content)
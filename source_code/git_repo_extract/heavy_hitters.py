@@ -0,0 +1,142 @@
+import heapq
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+
+class SpaceSaving(object):
+    """
+    Space-Saving summary of stream frequencies (Metwally et al., 2005): at most capacity items are counted,
+    a new item replaces the item with the smallest count and inherits that count as its error.
+    Every estimated count is at most total / capacity above the true one, and every item with true count
+    above total / capacity is kept. Summaries of different streams are mergeable (Agarwal et al., 2012),
+    error_bound gives the bound of merged summary
+    """
+
+    def __init__(self, capacity: int = 10000):
+        """
+        :param capacity: number of counted items, memory doesn't depend on number of distinct items
+        """
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.absent_bound = 0  # upper bound of count of items absent in merged summaries, see merge
+        self._heap: List[Tuple[int, str]] = []  # (count, item), entries with outdated counts are skipped
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def update(self, item: str, count: int = 1) -> None:
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            minimum, evicted = self._pop_minimum()
+            del self.counts[evicted], self.errors[evicted]
+            self.counts[item] = minimum + count
+            self.errors[item] = minimum
+
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def update_many(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.update(item)
+
+    def min_count(self) -> int:
+        """
+        :return: upper bound of count of any item that isn't kept, absent_bound while summary isn't full
+        """
+        if len(self.counts) < self.capacity:
+            return self.absent_bound
+        minimum, item = self._pop_minimum()
+        heapq.heappush(self._heap, (minimum, item))
+        return minimum
+
+    def error_bound(self) -> float:
+        """
+        Errors of kept items bound their overestimation and items that aren't kept have true counts
+        below the minimum, so the bound holds for merged summaries of any capacities too.
+        For a single stream it is at most total / capacity
+
+        :return: maximum overestimation of counts, items with larger true counts are kept
+        """
+        return max(max(self.errors.values(), default=0), self.min_count())
+
+    def top(self, n: int = 100) -> List[Tuple[str, int]]:
+        """
+        :param n: number of items
+        :return: list of (item, estimated count) sorted by decreasing count
+        """
+        return heapq.nlargest(n, self.counts.items(), key=lambda pair: (pair[1], pair[0]))
+
+    def guaranteed_top(self, n: int = 100) -> List[Tuple[str, int]]:
+        """
+        :param n: number of items
+        :return: items of top whose true count is surely above count of any item outside of top
+        """
+        top = self.top(n + 1)
+        outside = top[n][1] if len(top) > n else self.min_count()
+        return [(item, count) for item, count in top[:n] if count - self.errors[item] >= outside]
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """
+        Adds summary of another stream. Items absent in a full summary might have had up to its minimum count,
+        so the minimum is added to their counts and errors, and then the largest capacity items are kept.
+        Items absent in both summaries might have had up to sum of minimums, which stays their bound
+        while the merged summary isn't full, e.g. after merging a full summary of smaller capacity
+
+        :param other: summary of another stream
+        :return: None
+        """
+        own_minimum, other_minimum = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, own_minimum) + other.counts.get(item, other_minimum)
+            errors[item] = self.errors.get(item, own_minimum) + other.errors.get(item, other_minimum)
+
+        kept = heapq.nlargest(self.capacity, counts.items(), key=lambda pair: (pair[1], pair[0]))
+        self.counts = dict(kept)
+        self.errors = {item: errors[item] for item in self.counts}
+        self.total += other.total
+        self.absent_bound = own_minimum + other_minimum
+        self._rebuild_heap()
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps({"capacity": self.capacity,
+                                         "total": self.total,
+                                         "absent_bound": self.absent_bound,
+                                         "items": [[item, count, self.errors[item]]
+                                                   for item, count in self.top(len(self.counts))]}))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SpaceSaving":
+        content = json.loads(Path(path).read_text())
+        summary = cls(content["capacity"])
+        summary.total = content["total"]
+        summary.absent_bound = content.get("absent_bound", 0)
+        for item, count, error in content["items"]:
+            summary.counts[item] = count
+            summary.errors[item] = error
+        summary._rebuild_heap()
+        return summary
+
+    def _pop_minimum(self) -> Tuple[int, str]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
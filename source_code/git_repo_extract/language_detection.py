@@ -0,0 +1,351 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict, List, Pattern, Tuple, Type, Union
+
+from source_code.utils import ENRY_PATH
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+BINARY_SNIFF_LENGTH = 8000  # the same amount of bytes enry looks through to decide whether file is binary
+
+EXTENSIONS: Dict[str, Union[str, List[str]]] = {
+    # extension : language or list of candidate languages (resolved by HEURISTICS)
+    ".asm": "Assembly",
+    ".bat": "Batchfile",
+    ".c": "C",
+    ".cc": "C++",
+    ".clj": "Clojure",
+    ".cmake": "CMake",
+    ".coffee": "CoffeeScript",
+    ".cpp": "C++",
+    ".cs": "C#",
+    ".css": "CSS",
+    ".csv": "CSV",
+    ".cu": "Cuda",
+    ".cxx": "C++",
+    ".dart": "Dart",
+    ".elm": "Elm",
+    ".erl": "Erlang",
+    ".ex": "Elixir",
+    ".exs": "Elixir",
+    ".f90": "Fortran",
+    ".fs": "F#",
+    ".go": "Go",
+    ".gradle": "Gradle",
+    ".groovy": "Groovy",
+    ".h": ["C", "C++", "Objective-C"],
+    ".hh": "C++",
+    ".hpp": "C++",
+    ".hs": "Haskell",
+    ".htm": "HTML",
+    ".html": "HTML",
+    ".ini": "INI",
+    ".ipynb": "Jupyter Notebook",
+    ".java": "Java",
+    ".jl": "Julia",
+    ".js": "JavaScript",
+    ".json": "JSON",
+    ".jsx": "JavaScript",
+    ".kt": "Kotlin",
+    ".kts": "Kotlin",
+    ".less": "Less",
+    ".lua": "Lua",
+    ".m": ["Objective-C", "MATLAB"],
+    ".md": "Markdown",
+    ".mjs": "JavaScript",
+    ".mm": "Objective-C++",
+    ".php": "PHP",
+    ".pl": ["Perl", "Prolog"],
+    ".pm": "Perl",
+    ".proto": "Protocol Buffer",
+    ".ps1": "PowerShell",
+    ".pxd": "Cython",
+    ".py": "Python",
+    ".pyi": "Python",
+    ".pyx": "Cython",
+    ".r": "R",
+    ".rb": "Ruby",
+    ".rs": "Rust",
+    ".rst": "reStructuredText",
+    ".sass": "Sass",
+    ".scala": "Scala",
+    ".scss": "SCSS",
+    ".sh": "Shell",
+    ".sql": "SQL",
+    ".swift": "Swift",
+    ".tex": "TeX",
+    ".toml": "TOML",
+    ".ts": ["TypeScript", "XML"],
+    ".tsx": "TSX",
+    ".txt": "Text",
+    ".vue": "Vue",
+    ".xml": "XML",
+    ".yaml": "YAML",
+    ".yml": "YAML",
+    ".zsh": "Shell",
+}
+
+FILENAMES: Dict[str, str] = {
+    ".bashrc": "Shell",
+    ".gitignore": "Ignore List",
+    "CMakeLists.txt": "CMake",
+    "Dockerfile": "Dockerfile",
+    "Gemfile": "Ruby",
+    "GNUmakefile": "Makefile",
+    "Jenkinsfile": "Groovy",
+    "Makefile": "Makefile",
+    "Pipfile": "TOML",
+    "Rakefile": "Ruby",
+    "makefile": "Makefile",
+    "requirements.txt": "Pip Requirements",
+}
+
+INTERPRETERS: Dict[str, str] = {
+    "bash": "Shell",
+    "node": "JavaScript",
+    "nodejs": "JavaScript",
+    "perl": "Perl",
+    "php": "PHP",
+    "python": "Python",
+    "ruby": "Ruby",
+    "sh": "Shell",
+    "zsh": "Shell",
+}
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".tiff", ".webp", ".psd"}
+
+VENDORED_PATHS: List[Pattern] = [re.compile(pattern) for pattern in (
+    r"(^|/)node_modules/",
+    r"(^|/)bower_components/",
+    r"(^|/)vendors?/",
+    r"(^|/)third[-_]?party/",
+    r"(^|/)extern(al)?/",
+    r"(^|/)\.git/",
+    r"(^|/)\.venv/",
+    r"(^|/)site-packages/",
+    r"(^|/)dist/",
+    r"(^|/)Godeps/",
+    r"\.min\.(js|css)$",
+    r"(^|/)jquery[^/]*\.js$",
+    r"(^|/)bootstrap[^/]*\.(js|css)$",
+    r"(^|/)gradlew(\.bat)?$",
+    r"(^|/)configure$",
+)]
+
+HEURISTICS: Dict[str, List[Tuple[str, Pattern]]] = {
+    # extension : [(language, pattern that should be found in content)], first match wins,
+    # first candidate language from EXTENSIONS is used if nothing matched
+    ".h": [("Objective-C", re.compile(r"^\s*(@interface|@end|@property|#import)\b", re.MULTILINE)),
+           ("C++", re.compile(r"^\s*(class\s+\w+|namespace\s+\w+|template\s*<|#include\s*<(iostream|string|vector|memory)>)",
+                              re.MULTILINE))],
+    ".m": [("Objective-C", re.compile(r"^\s*(@interface|@implementation|@end|#import)\b", re.MULTILINE)),
+           ("MATLAB", re.compile(r"^\s*(function\b|%)", re.MULTILINE))],
+    ".pl": [("Perl", re.compile(r"\buse\s+(strict|warnings)\b|^\s*my\s+[$@%]", re.MULTILINE)),
+            ("Prolog", re.compile(r"^[^#]*:-", re.MULTILINE))],
+    ".ts": [("XML", re.compile(r"<TS\b"))],
+}
+
+
+class LanguageDetector(ABC):
+    """
+    Base class for programming language detectors. Detectors return dictionaries of the same shape
+    enry returns with its "-json" flag: {"language": str, "type": str, "vendored": bool}
+    """
+
+    @abstractmethod
+    def detect(self, file_path: str, file_content: Union[str, bytes]) -> Dict:
+        """
+        Defines language of the given file
+
+        :param file_path: path of the file inside of its repository
+        :param file_content: inner content of the file
+        :return: dict {"language": str, "type": str, "vendored": bool}
+        """
+
+
+class EnryDetector(LanguageDetector):
+    """
+    Detector that writes file content to temporary file and runs enry executable over it
+    """
+
+    def __init__(self, enry_path: str = str(ENRY_PATH)):
+        """
+        :param enry_path: path to the enry executable
+        """
+        self.enry_path = enry_path
+
+    def detect(self, file_path: str, file_content: Union[str, bytes]) -> Dict:
+        """
+        Creates file with given content near enry executable. Extracts file language and deletes file
+
+        :param file_path: path of the file inside of its repository
+        :param file_content: inner content of the file
+        :return: dict {"language": str, "type": str, "vendored": bool}
+        """
+        file_name = file_path.split("/")[-1]
+
+        splitted_f_name = file_name.split(".")
+        file_suffix = ""
+        if len(splitted_f_name) != 0:
+            file_suffix = splitted_f_name[-1]
+
+        value = '{"language": "", "type": "", "vendored": false}'
+        with tempfile.NamedTemporaryFile(mode="w+b",
+                                         suffix="." + file_suffix,
+                                         prefix=splitted_f_name[0] + "_",
+                                         dir=os.path.dirname(self.enry_path),
+                                         delete=False) as fp:
+            try:
+                fp.write(to_bytes(file_content))
+                fp.close()
+
+                value = subprocess.run([self.enry_path, "-json", fp.name], capture_output=True, text=True).stdout
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                os.unlink(fp.name)
+        return json.loads(value)
+
+
+class BuiltinDetector(LanguageDetector):
+    """
+    In-process detector. Uses the same strategies as enry does, but with reduced set of languages:
+    vendored path, file name, shebang, extension and content heuristics for ambiguous extensions
+    """
+
+    def detect(self, file_path: str, file_content: Union[str, bytes]) -> Dict:
+        """
+        Defines language of the given file without any filesystem or subprocess operations
+
+        :param file_path: path of the file inside of its repository
+        :param file_content: inner content of the file
+        :return: dict {"language": str, "type": str, "vendored": bool}
+        """
+        content = to_bytes(file_content)
+        file_name = file_path.replace("\\", "/").split("/")[-1]
+        extension = os.path.splitext(file_name)[1].lower()
+
+        entity = {"language": "",
+                  "type": "Text",
+                  "vendored": is_vendored(file_path)}
+
+        if extension in IMAGE_EXTENSIONS:
+            entity["type"] = "Image"
+            return entity
+        if b"\0" in content[:BINARY_SNIFF_LENGTH]:
+            entity["type"] = "Binary"
+            return entity
+
+        for strategy in (self.by_filename, self.by_shebang, self.by_extension):
+            language = strategy(file_name, extension, content)
+            if language:
+                entity["language"] = language
+                break
+        return entity
+
+    @staticmethod
+    def by_filename(file_name: str, extension: str, content: bytes) -> str:
+        return FILENAMES.get(file_name, "")
+
+    @staticmethod
+    def by_shebang(file_name: str, extension: str, content: bytes) -> str:
+        if not content.startswith(b"#!"):
+            return ""
+
+        shebang = content[2:content.find(b"\n")].decode("latin-1").split()
+        if not shebang:
+            return ""
+        interpreter = shebang[0].split("/")[-1]
+        if interpreter == "env" and len(shebang) > 1:
+            interpreter = shebang[1]
+        interpreter = re.sub(r"[\d.]+$", "", interpreter)  # python3.8 -> python
+        return INTERPRETERS.get(interpreter, "")
+
+    @staticmethod
+    def by_extension(file_name: str, extension: str, content: bytes) -> str:
+        candidates = EXTENSIONS.get(extension, "")
+        if isinstance(candidates, str):
+            return candidates
+
+        text = content.decode("latin-1")
+        for language, pattern in HEURISTICS.get(extension, []):
+            if pattern.search(text):
+                return language
+        return candidates[0]
+
+
+DETECTORS: Dict[str, Type[LanguageDetector]] = {
+    "builtin": BuiltinDetector,
+    "enry": EnryDetector,
+}
+DEFAULT_DETECTOR = "builtin"
+
+_detectors_instances: Dict[str, LanguageDetector] = {}
+
+
+def register_detector(name: str, detector_class: Type[LanguageDetector]) -> None:
+    """
+    Makes detector available by its name in get_detector
+
+    :param name: name of detector
+    :param detector_class: LanguageDetector subclass, should be constructable without arguments
+    :return: None
+    """
+    DETECTORS[name] = detector_class
+    _detectors_instances.pop(name, None)
+
+
+def get_detector(detector: Union[str, LanguageDetector, None] = None) -> LanguageDetector:
+    """
+    Returns detector instance by its name. Instances are created once per process
+
+    :param detector: name of registered detector, detector instance or None for the default one
+    :return: LanguageDetector instance
+    """
+    if isinstance(detector, LanguageDetector):
+        return detector
+    if detector is None:
+        detector = DEFAULT_DETECTOR
+    if detector not in DETECTORS:
+        raise ValueError(f"{detector} is not registered detector."
+                         f"\nChoose one of {', '.join(DETECTORS.keys())}")
+
+    if detector not in _detectors_instances:
+        _detectors_instances[detector] = DETECTORS[detector]()
+    return _detectors_instances[detector]
+
+
+def get_detector_name(detector: Union[str, LanguageDetector, None] = None) -> str:
+    """
+    :param detector: name of registered detector, detector instance or None for the default one
+    :return: name of detector, class name for instances
+    """
+    if detector is None:
+        return DEFAULT_DETECTOR
+    if isinstance(detector, LanguageDetector):
+        return type(detector).__name__
+    return detector
+
+
+def is_vendored(file_path: str) -> bool:
+    """
+    Checks whether file path belongs to vendored (third party) code
+
+    :param file_path: path of the file inside of its repository
+    :return: True if file is vendored
+    """
+    file_path = file_path.replace("\\", "/")
+    return any(pattern.search(file_path) for pattern in VENDORED_PATHS)
+
+
+def to_bytes(file_content: Union[str, bytes]) -> bytes:
+    if isinstance(file_content, str):
+        return bytes(file_content, encoding="utf-8")
+    return file_content
@@ -0,0 +1,223 @@
+from typing import Dict, List, Sequence, Tuple, Union
+
+Text = Union[str, bytes]
+
+
+def count_changed_lines(old_content: Text, new_content: Text) -> Tuple[int, int]:
+    """
+    Counts lines added and deleted between two versions of file. Works as git diff does:
+    number of changes is minimal, so lines moved inside of file are counted only once.
+    Lines are compared with their line breaks, so adding final newline changes the last line
+
+    :param old_content: content of old version of file
+    :param new_content: content of new version of file
+    :return: (Added, Deleted)
+    """
+    if old_content == new_content:
+        return 0, 0
+
+    old_lines, new_lines = hash_lines(old_content.splitlines(True), new_content.splitlines(True))
+    old_lines, new_lines = trim_common_lines(old_lines, new_lines)
+
+    if not old_lines or not new_lines:
+        return len(new_lines), len(old_lines)
+
+    common = lcs_length(*discard_unique_lines(old_lines, new_lines))
+    return len(new_lines) - common, len(old_lines) - common
+
+
+def changed_line_blocks(old_content: Text, new_content: Text) -> List[Tuple[int, int, int, int]]:
+    """
+    Blocks of lines that differ between two versions of file. Common prefix and suffix are skipped cheaply,
+    the rest is matched with Myers algorithm, so blocks are the same minimal changes count_changed_lines counts
+
+    :param old_content: content of old version of file
+    :param new_content: content of new version of file
+    :return: list of (old_start, old_end, new_start, new_end): old lines [old_start, old_end) were replaced
+            with new lines [new_start, new_end). Blocks are sorted and don't intersect
+    """
+    if old_content == new_content:
+        return []
+
+    old_lines, new_lines = hash_lines(old_content.splitlines(True), new_content.splitlines(True))
+    prefix, suffix = common_affixes(old_lines, new_lines)
+    old_end, new_end = len(old_lines) - suffix, len(new_lines) - suffix
+    pairs = matching_lines(old_lines[prefix:old_end], new_lines[prefix:new_end])
+
+    blocks = []
+    old_start, new_start = prefix, prefix
+    for old_index, new_index in [(i + prefix, j + prefix) for i, j in pairs] + [(old_end, new_end)]:
+        if old_index > old_start or new_index > new_start:
+            blocks.append((old_start, old_index, new_start, new_index))
+        old_start, new_start = old_index + 1, new_index + 1
+    return blocks
+
+
+def hash_lines(old_lines: Sequence[Text], new_lines: Sequence[Text]) -> Tuple[List[int], List[int]]:
+    """
+    Replaces lines with integer ids, so equal lines get equal ids and comparison of lines is cheap
+
+    :param old_lines: lines of old version of file
+    :param new_lines: lines of new version of file
+    :return: (old ids, new ids)
+    """
+    ids: Dict[Text, int] = {}
+    old_ids = [ids.setdefault(line, len(ids)) for line in old_lines]
+    new_ids = [ids.setdefault(line, len(ids)) for line in new_lines]
+    return old_ids, new_ids
+
+
+def trim_common_lines(old_lines: List[int], new_lines: List[int]) -> Tuple[List[int], List[int]]:
+    """
+    Removes common prefix and suffix of both sequences, they never take part in diff
+
+    :return: (old lines, new lines) without common prefix and suffix
+    """
+    prefix, suffix = common_affixes(old_lines, new_lines)
+    return old_lines[prefix:len(old_lines) - suffix], new_lines[prefix:len(new_lines) - suffix]
+
+
+def common_affixes(old_lines: List[int], new_lines: List[int]) -> Tuple[int, int]:
+    """
+    :return: (length of common prefix, length of common suffix), they don't overlap
+    """
+    prefix = 0
+    max_prefix = min(len(old_lines), len(new_lines))
+    while prefix < max_prefix and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+
+    return prefix, suffix
+
+
+def discard_unique_lines(old_lines: List[int], new_lines: List[int]) -> Tuple[List[int], List[int]]:
+    """
+    Removes lines that are present only in one of sequences. Such lines can't be matched,
+    so longest common subsequence stays the same, but it is searched on shorter sequences
+
+    :return: (old lines, new lines) that have a pair in the other sequence
+    """
+    old_set = set(old_lines)
+    new_set = set(new_lines)
+    return [x for x in old_lines if x in new_set], [x for x in new_lines if x in old_set]
+
+
+def lcs_length(old_lines: List[int], new_lines: List[int]) -> int:
+    """
+    Length of the longest common subsequence found with Myers greedy algorithm.
+    Takes O((N + M) * D) time and O(N + M) memory, where D is the number of changed lines
+
+    :return: number of common lines
+    """
+    n, m = len(old_lines), len(new_lines)
+    if n == 0 or m == 0:
+        return 0
+
+    offset = n + m + 1
+    furthest = [0] * (2 * offset + 1)  # furthest x reached on each diagonal k = x - y, shifted by offset
+    for d in range(n + m + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and furthest[offset + k - 1] < furthest[offset + k + 1]):
+                x = furthest[offset + k + 1]
+            else:
+                x = furthest[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and old_lines[x] == new_lines[y]:
+                x += 1
+                y += 1
+            furthest[offset + k] = x
+            if x >= n and y >= m:
+                return (n + m - d) // 2
+    return 0
+
+
+def matching_lines(old_lines: List[int], new_lines: List[int]) -> List[Tuple[int, int]]:
+    """
+    Pairs of lines of the longest common subsequence found with linear space version of Myers algorithm.
+    Lines present only in one of sequences are discarded beforehand, see discard_unique_lines
+
+    :return: sorted list of (old index, new index) of equal lines
+    """
+    new_set, old_set = set(new_lines), set(old_lines)
+    old_indices = [i for i, x in enumerate(old_lines) if x in new_set]
+    new_indices = [j for j, x in enumerate(new_lines) if x in old_set]
+
+    pairs: List[Tuple[int, int]] = []
+    match_lines([old_lines[i] for i in old_indices], 0, len(old_indices),
+                [new_lines[j] for j in new_indices], 0, len(new_indices), pairs)
+    return [(old_indices[i], new_indices[j]) for i, j in pairs]
+
+
+def match_lines(old_lines: List[int], old_lo: int, old_hi: int,
+                new_lines: List[int], new_lo: int, new_hi: int,
+                pairs: List[Tuple[int, int]]) -> None:
+    """
+    Appends pairs of common lines of old_lines[old_lo:old_hi] and new_lines[new_lo:new_hi] to pairs.
+    Sequences are split by middle snake and both halves are matched recursively
+
+    :return: None
+    """
+    while old_lo < old_hi and new_lo < new_hi and old_lines[old_lo] == new_lines[new_lo]:
+        pairs.append((old_lo, new_lo))
+        old_lo, new_lo = old_lo + 1, new_lo + 1
+    suffix = 0
+    while old_lo < old_hi - suffix and new_lo < new_hi - suffix and \
+            old_lines[old_hi - 1 - suffix] == new_lines[new_hi - 1 - suffix]:
+        suffix += 1
+
+    if old_lo < old_hi - suffix and new_lo < new_hi - suffix:
+        x, y, u, v = middle_snake(old_lines, old_lo, old_hi - suffix, new_lines, new_lo, new_hi - suffix)
+        match_lines(old_lines, old_lo, old_lo + x, new_lines, new_lo, new_lo + y, pairs)
+        pairs.extend((old_lo + x + i, new_lo + y + i) for i in range(u - x))
+        match_lines(old_lines, old_lo + u, old_hi - suffix, new_lines, new_lo + v, new_hi - suffix, pairs)
+
+    pairs.extend((old_hi - suffix + i, new_hi - suffix + i) for i in range(suffix))
+
+
+def middle_snake(old_lines: List[int], old_lo: int, old_hi: int,
+                 new_lines: List[int], new_lo: int, new_hi: int) -> Tuple[int, int, int, int]:
+    """
+    Runs Myers greedy search from both ends of sequences until paths meet. Takes O((N + M) * D) time
+    and O(N + M) memory, where D is the number of changed lines
+
+    :return: (x, y, u, v): the middle snake goes from (x, y) to (u, v), coordinates are relative to lows
+    """
+    n, m = old_hi - old_lo, new_hi - new_lo
+    delta = n - m
+    odd = delta % 2 != 0
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    forward = [0] * (2 * offset + 1)  # furthest x reached on each diagonal k = x - y, shifted by offset
+    backward = [0] * (2 * offset + 1)  # the same for reversed sequences, its diagonal k is delta - k forward
+
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and old_lines[old_lo + x] == new_lines[new_lo + y]:
+                x, y = x + 1, y + 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return start_x, start_y, x, y
+
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            start_x, start_y = x, y
+            while x < n and y < m and old_lines[old_hi - 1 - x] == new_lines[new_hi - 1 - y]:
+                x, y = x + 1, y + 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return n - x, m - y, n - start_x, m - start_y
+    return 0, 0, 0, 0
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from dulwich.repo import Repo
+from git.repo import Repo as GRepo
+
+from source_code.git_repo_extract.repo_ops import check_clone_strategy, folder_size, get_repo_name, known_repo_size, \
+    operate_existing_repo, operate_temporary_repo, try_find_repo
+from source_code.profiling import repo_context, span
+from source_code.utils import FileLock, MIRRORS_FOLDER, StreamSink
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+GIGABYTE = 2 ** 30
+SIZES_FILE = ".sizes.json"
+
+
+class MirrorStore(object):
+    """
+    Folder with bare mirrors of repositories. Mirrors are cloned once, updated with fetch when reused
+    and removed in least recently used order when their total size exceeds disk budget.
+
+    Each mirror has "{name}.lock" file near it: processes hold shared lock while reading mirror
+    and exclusive lock while cloning, fetching or removing it. Sizes of mirrors are kept in SIZES_FILE,
+    mirror is measured only after it is cloned or fetched, so eviction doesn't walk the whole store
+    """
+
+    def __init__(self,
+                 root: Union[str, Path] = MIRRORS_FOLDER,
+                 disk_budget: int = 50 * GIGABYTE,
+                 refresh_interval: int = 3600):
+        """
+        :param root: folder with mirrors
+        :param disk_budget: maximum size of all mirrors in bytes
+        :param refresh_interval: number of seconds during which mirror is considered up to date after fetch
+        """
+        self.root = Path(root)
+        self.disk_budget = disk_budget
+        self.refresh_interval = refresh_interval
+
+    @contextmanager
+    def open(self, url: str) -> Iterator[Repo]:
+        """
+        Gives up to date mirror of repository, clones it if it is absent
+
+        :param url: link to repository or its name in format "user/repo"
+        :return: context manager with dulwich Repo object
+        """
+        name = self.mirror_name(url)
+        lock = FileLock(self.root / f"{name}.lock")
+
+        lock.acquire(shared=False)
+        try:
+            repo = self.update(url)
+            lock.acquire(shared=True)  # other processes can read mirror, but not fetch or remove it
+            try:
+                yield repo
+            finally:
+                repo.close()
+        finally:
+            lock.release()
+
+        self.evict()
+
+    def update(self, url: str) -> Repo:
+        """
+        Clones mirror or fetches new commits to it. Should be called under exclusive lock
+
+        :param url: link to repository or its name in format "user/repo"
+        :return: dulwich Repo object
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        stamp = self.root / f"{self.mirror_name(url)}.fetched"
+
+        repo = try_find_repo(str(self.root), get_repo_name(url))
+        changed = True
+        if repo is None:
+            logger.log(2, f"\tCloning mirror of {url}")
+            repo = try_find_repo(str(self.root), url, download=True, clone_strategy="mirror")
+        elif not stamp.exists() or time.time() - stamp.stat().st_mtime > self.refresh_interval:
+            logger.log(2, f"\tFetching mirror of {url}")
+            with span("fetch"):
+                GRepo(repo.path).git.fetch("--prune", "origin")
+        else:
+            changed = False
+        stamp.touch()
+        if changed:
+            self.record_size(self.mirror_name(url))
+        return repo
+
+    def evict(self) -> List[str]:
+        """
+        Removes least recently used mirrors until their total size fits disk budget.
+        Mirrors used by other processes are skipped
+
+        :return: names of removed mirrors
+        """
+        removed = []
+        with FileLock(self.root / ".store.lock"):
+            mirrors = [entry for entry in self.root.iterdir() if entry.is_dir()]
+            recorded = self.sizes()
+            sizes = {mirror.name: recorded[mirror.name] if mirror.name in recorded else folder_size(mirror)
+                     for mirror in mirrors}
+            total = sum(sizes.values())
+
+            mirrors.sort(key=lambda mirror: self.last_access(mirror.name))
+            for mirror in mirrors:
+                if total <= self.disk_budget:
+                    break
+
+                lock = FileLock(self.root / f"{mirror.name}.lock")
+                if not lock.acquire(shared=False, blocking=False):
+                    continue
+                try:
+                    shutil.rmtree(mirror)
+                    (self.root / f"{mirror.name}.fetched").unlink(missing_ok=True)
+                finally:
+                    lock.release()
+                total -= sizes.pop(mirror.name)
+                removed.append(mirror.name)
+                logger.log(2, f"\tEvicted mirror {mirror.name}")
+
+            if sizes != recorded:
+                self.write_sizes(sizes)
+        return removed
+
+    def sizes(self) -> Dict[str, int]:
+        """
+        :return: dict {mirror name: size in bytes} of measured mirrors
+        """
+        try:
+            return json.loads((self.root / SIZES_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def record_size(self, name: str) -> None:
+        """
+        Measures mirror after it is changed and saves its size
+
+        :param name: name of mirror folder
+        :return: None
+        """
+        size = folder_size(self.root / name)
+        with FileLock(self.root / ".store.lock"):
+            sizes = self.sizes()
+            sizes[name] = size
+            self.write_sizes(sizes)
+
+    def write_sizes(self, sizes: Dict[str, int]) -> None:
+        """
+        Replaces sizes file atomically, so it can be read without lock. Should be called under store lock
+        """
+        temp_path = self.root / f"{SIZES_FILE}.{os.getpid()}.tmp"
+        temp_path.write_text(json.dumps(sizes))
+        os.replace(temp_path, self.root / SIZES_FILE)
+
+    def repo_size(self, url: str) -> int:
+        """
+        Size of repository mirror, useful to estimate how long repository will be processed
+
+        :param url: link to repository or its name in format "user/repo"
+        :return: size in bytes, 0 if there is no mirror yet
+        """
+        name = self.mirror_name(url)
+        size = self.sizes().get(name)
+        if size is not None:
+            return size
+        path = self.root / name
+        return folder_size(path) if path.exists() else 0
+
+    def last_access(self, name: str) -> float:
+        stamp = self.root / f"{name}.fetched"
+        return stamp.stat().st_mtime if stamp.exists() else 0.0
+
+    @staticmethod
+    def mirror_name(url: str) -> str:
+        return get_repo_name(url).replace("/", "_")
+
+
+def operate_mirrored_repo(mirror_path: str,
+                          url: str,
+                          operation: Callable[[Repo, Any], Iterator],
+                          arguments: Tuple,
+                          disk_budget: int = 50 * GIGABYTE,
+                          sink: Union[StreamSink, None] = None) -> List:
+    """
+    Method for repo operation such as commits_info_extraction or inner content parse,
+    using mirror that is kept between runs instead of temporary clone
+
+    :param mirror_path: path to folder with mirrors
+    :param url: name of user and repo in format "user/repo"
+    :param operation: operation with repo itself
+    :param arguments: arguments to operation method
+    :param disk_budget: maximum size of all mirrors in bytes
+    :param sink: sink that takes entities instead of returned list, see operate_existing_repo
+    :return: List of parsed objects
+    """
+    logger.log(1, f"\tStarted operating {url}")
+
+    result = []
+    try:
+        with repo_context(url), MirrorStore(mirror_path, disk_budget).open(url) as repo:
+            result = operate_existing_repo(repo, url, operation, arguments, sink)
+    except RuntimeError as e:
+        logger.exception(f"Runtime Exception {e}")
+    except IOError as e:
+        logger.exception(f"IO Exception {e}")
+
+    logger.log(1, f"\t{url} exited mirror")
+    return result
+
+
+def get_repo_operator(temp_repo_path: str,
+                      mirror_path: Union[str, None] = None,
+                      disk_budget: int = 50 * GIGABYTE,
+                      clone_strategy: str = "full",
+                      clone_depth: Union[int, None] = None,
+                      sink: Union[StreamSink, None] = None,
+                      sizes_path: Union[str, Path, None] = None) -> Callable[..., List]:
+    """
+    Chooses how repositories are obtained: temporary clones or mirrors kept between runs
+
+    :param temp_repo_path: path where to create temporary folders
+    :param mirror_path: path to folder with mirrors, None to use temporary clones
+    :param disk_budget: maximum size of all mirrors in bytes
+    :param clone_strategy: how to clone temporary repos, one of repo_ops.CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
+    :param sink: sink that takes entities instead of returned list, see repo_ops.operate_existing_repo
+    :param sizes_path: path to SQLite file where sizes of temporary clones are recorded, see repo_ops.known_repo_size
+    :return: function with (url, operation, arguments) parameters
+    """
+    if mirror_path is None:
+        check_clone_strategy(clone_strategy, clone_depth)  # fails before repositories are given to workers
+        return partial(operate_temporary_repo, temp_repo_path,
+                       clone_strategy=clone_strategy, clone_depth=clone_depth, sink=sink, sizes_path=sizes_path)
+    return partial(operate_mirrored_repo, mirror_path, disk_budget=disk_budget, sink=sink)
+
+
+def get_repo_size_estimator(mirror_path: Union[str, Path, None] = None,
+                            sizes_path: Union[str, Path, None] = None) -> Callable[[str], int]:
+    """
+    Chooses how sizes of repositories are estimated before they are operated, so the largest ones can go first
+    and don't delay the end of the run: sizes of mirrors or sizes of temporary clones recorded by earlier runs
+
+    :param mirror_path: path to folder with mirrors, None if temporary clones are used
+    :param sizes_path: path to SQLite file with sizes of temporary clones, see get_repo_operator
+    :return: function that gives size of repository by its url, 0 if it isn't known
+    """
+    if mirror_path is not None:
+        return MirrorStore(mirror_path).repo_size
+    if sizes_path is not None:
+        return partial(known_repo_size, sizes_path)
+    return lambda url: 0
@@ -1,23 +1,89 @@
 import logging
 import os
+import shutil
+import subprocess
 import sys
 import tempfile
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Callable, Iterator, List, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
+from dulwich.errors import NotGitRepository
+from dulwich.objects import Blob, ShaFile
 from dulwich.repo import Repo
 from git.repo import Repo as GRepo
 
+from source_code.persistent_cache import get_cache
+from source_code.profiling import repo_context, span
+from source_code.utils import StreamSink
 from .clone_progress import CloneProgress
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler(sys.stdout))
 
+CLONE_STRATEGIES: Dict[str, Dict[str, Any]] = {
+    # strategy : git clone options. Repos are only read with dulwich, so working tree is not checked out
+    "full": {},
+    "single_branch": {"single_branch": True, "no_checkout": True},
+    "shallow": {"single_branch": True, "no_checkout": True},  # depth is taken from clone_depth, it is required
+    "blobless": {"single_branch": True, "no_checkout": True, "filter": "blob:none"},
+    "mirror": {"mirror": True},  # bare repo with all the refs, can be updated with fetch
+}
+REPO_SIZES_TABLE = "repo_sizes"
+
+
+class PartialCloneRepo(Repo):
+    """
+    dulwich Repo for repositories cloned with --filter option. dulwich can't fetch objects
+    from promisor remote, so missing blobs are requested through git itself only when they are read.
+    Blobs that are going to be read can be requested at once with prefetch
+    """
+
+    def get_object(self, sha: bytes) -> ShaFile:
+        try:
+            return super().get_object(sha)
+        except KeyError:
+            return self.fetch_missing_blob(sha)
+
+    def fetch_missing_blob(self, sha: bytes) -> Blob:
+        """
+        Lazily downloads blob from promisor remote
+
+        :param sha: id of blob
+        :return: Blob object
+        """
+        process = subprocess.run(["git", "-C", self.path, "cat-file", "blob", sha.decode()], capture_output=True)
+        if process.returncode != 0:
+            raise KeyError(sha)
+        return Blob.from_string(process.stdout)
+
+    def prefetch(self, shas: Iterable[bytes]) -> None:
+        """
+        Downloads missing objects from promisor remote with one fetch, as git itself does for batches of objects,
+        so they are read without a request per blob. Objects that fail to download are fetched lazily later
+
+        :param shas: ids of objects, present and repeated ones are skipped
+        :return: None
+        """
+        missing = {sha for sha in shas if sha is not None and sha not in self.object_store}
+        if not missing:
+            return
+        with span("blob_prefetch"):
+            process = subprocess.run(["git", "-C", self.path, "-c", "fetch.negotiationAlgorithm=noop", "fetch", "-q",
+                                      "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no",
+                                      "--filter=blob:none", "--stdin", "origin"],
+                                     input=b"".join(sha + b"\n" for sha in sorted(missing)), capture_output=True)
+        if process.returncode != 0:
+            logger.log(2, f"\tPrefetch of {len(missing)} objects failed: {process.stderr.decode(errors='replace')}")
+
 
 def operate_repo(repo_path: str,
                  url: str,
                  operation: Callable[[Repo, Any], Iterator],
-                 arguments: Tuple) -> List:
+                 arguments: Tuple,
+                 clone_strategy: str = "full",
+                 clone_depth: Union[int, None] = None,
+                 sink: Union[StreamSink, None] = None) -> List:
     """
     Method for given repo parsing using given operation
 
@@ -25,19 +91,28 @@ def operate_repo(repo_path: str,
     :param repo_path: path where to create temporary folder
     :param url: name of user and repo in format "user/repo"
     :param operation: operation with repo itself
+    :param clone_strategy: how to clone repo if it is not found, one of CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
+    :param sink: sink that takes entities instead of returned list, see operate_existing_repo
     :return:
     """
     repo = try_find_repo(repo_path, url)
     if repo is None:
-        return operate_temporary_repo(temp_repo_path=repo_path, url=url, operation=operation, arguments=arguments)
+        return operate_temporary_repo(temp_repo_path=repo_path, url=url, operation=operation, arguments=arguments,
+                                      clone_strategy=clone_strategy, clone_depth=clone_depth, sink=sink)
     else:
-        return operate_existing_repo(repo=repo, url=url, operation=operation, arguments=arguments)
+        with repo_context(url):
+            return operate_existing_repo(repo=repo, url=url, operation=operation, arguments=arguments, sink=sink)
 
 
 def operate_temporary_repo(temp_repo_path: str,
                            url: str,
                            operation: Callable[[Repo, Any], Iterator],
-                           arguments: Tuple) -> List:
+                           arguments: Tuple,
+                           clone_strategy: str = "full",
+                           clone_depth: Union[int, None] = None,
+                           sink: Union[StreamSink, None] = None,
+                           sizes_path: Union[str, Path, None] = None) -> List:
     """
     Method for temporary repo operation such as commits_info_extraction or inner content parse,
     when there is no need to create constant folder for repo
@@ -46,24 +121,26 @@ def operate_temporary_repo(temp_repo_path: str,
     :param temp_repo_path: path where to create temporary folder
     :param url: name of user and repo in format "user/repo"
     :param operation: operation with repo itself
+    :param clone_strategy: how to clone repo, one of CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
+    :param sink: sink that takes entities instead of returned list, see operate_existing_repo
+    :param sizes_path: path to SQLite file where size of clone is recorded for the next runs, see known_repo_size
     :return: List of parsed objects
     """
     logger.log(1, f"\tStarted operating {url}")
 
-    prefix = url
-    if url.startswith("https://"):
-        prefix = "/".join(url.split("/")[-2:])
-    prefix = prefix.replace("/", "_")
+    prefix = get_repo_name(url).replace("/", "_")
 
     result = []
     try:
-        with tempfile.TemporaryDirectory(prefix=f"{prefix}_",
-                                         dir=temp_repo_path) as td:
-            repo = get_repo_from_url(td, get_repo_url(url))
+        with repo_context(url), tempfile.TemporaryDirectory(prefix=f"{prefix}_", dir=temp_repo_path) as td:
+            repo = get_repo_from_url(td, get_repo_url(url), clone_strategy, clone_depth)
 
             logger.log(2, f"\tInstalled {url} in {td}")
+            if sizes_path is not None:
+                record_repo_size(sizes_path, url, repo)
 
-            result = operate_existing_repo(repo, url, operation, arguments)
+            result = operate_existing_repo(repo, url, operation, arguments, sink)
 
             logger.log(2, f"\t{url} repo closed")
     except RuntimeError as e:
@@ -75,7 +152,11 @@ def operate_temporary_repo(temp_repo_path: str,
     return result
 
 
-def operate_existing_repo(repo: Repo, url: str, operation: Callable[[Repo, Any], Iterator], arguments: Tuple) -> List:
+def operate_existing_repo(repo: Repo,
+                          url: str,
+                          operation: Callable[[Repo, Any], Iterator],
+                          arguments: Tuple,
+                          sink: Union[StreamSink, None] = None) -> List:
     """
     Method for constant repo operation such as commits_info_extraction or inner content parse,
     when there is already an existing repo
@@ -84,39 +165,123 @@ def operate_existing_repo(repo: Repo, url: str, operation: Callable[[Repo, Any],
     :param operation: operation with repo itself
     :param arguments: arguments to operation method
     :param url: name of user and repo in format "user/repo"
+    :param sink: StreamSink or other object with the same part method, e.g. code_handle.FusedSink.
+            Entities are written into part of the sink one by one, so memory doesn't grow with their number,
+            and empty list is returned. Part of operation that raised or was killed on timeout is discarded,
+            so retried repository isn't written twice
     :return:
     """
     result = []
-    try:
-        for entity in operation(repo, *arguments):
-            try:
-                result.append(entity)
-            except RuntimeError as e:
-                logger.exception(f"Operation error {e}")
-    except KeyError as e:
-        logger.exception(f"Key error {e}")
+    with sink.part() if sink is not None else nullcontext(result.append) as write:
+        try:
+            for entity in operation(repo, *arguments):
+                try:
+                    write(entity)
+                except RuntimeError as e:
+                    logger.exception(f"Operation error {e}")
+        except KeyError as e:
+            logger.exception(f"Key error {e}")
+        finally:
+            repo.close()
 
     logger.log(2, f"\t{url} finished operations")
-    repo.close()
-
     return result
 
 
-def get_repo_from_url(path: str, url: str = None) -> Repo:
+def record_repo_size(sizes_path: Union[str, Path], url: str, repo: Repo) -> None:
+    """
+    Saves size of objects of cloned repository, so the next runs can start the largest repositories first
+
+    :param sizes_path: path to SQLite file with sizes
+    :param url: link to repository or its name in format "user/repo"
+    :param repo: dulwich Repo object of the clone
+    :return: None
+    """
+    sizes = get_cache(sizes_path, table=REPO_SIZES_TABLE)
+    sizes[get_repo_name(url)] = folder_size(Path(repo.controldir()) / "objects")
+    sizes.flush()
+
+
+def known_repo_size(sizes_path: Union[str, Path], url: str) -> int:
+    """
+    Size of repository recorded by record_repo_size, useful to estimate how long repository will be processed
+
+    :param sizes_path: path to SQLite file with sizes
+    :param url: link to repository or its name in format "user/repo"
+    :return: size in bytes, 0 if repository wasn't cloned before
+    """
+    return get_cache(sizes_path, table=REPO_SIZES_TABLE).get(get_repo_name(url), 0)
+
+
+def folder_size(path: Path) -> int:
+    """
+    :param path: path to folder
+    :return: total size of files inside of folder in bytes
+    """
+    size = 0
+    for directory, _, files in os.walk(path):
+        for file in files:
+            size += os.path.getsize(os.path.join(directory, file))
+    return size
+
+
+def get_repo_from_url(path: str,
+                      url: str = None,
+                      clone_strategy: str = "full",
+                      clone_depth: Union[int, None] = None) -> Repo:
     """
     Return Repo object from a given folder
     If the url param is given will download repo to url folder and then return object
 
     :param path: path to the folder with repository (with .git folder) / or where to save repo
     :param url: link to git repository
+    :param clone_strategy: how to clone repo, one of CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
 
     :return: dulwich.Repo object of given repo
     """
     if url is not None:
-        GRepo.clone_from(url, path, progress=CloneProgress(f"{url} downloading"))
-    repo = Repo(path)
+        check_clone_strategy(clone_strategy, clone_depth)
+        options = dict(CLONE_STRATEGIES[clone_strategy])
+        if clone_strategy == "shallow":
+            options["depth"] = clone_depth
+        with span("clone"):
+            GRepo.clone_from(url, path, progress=CloneProgress(f"{url} downloading"), **options)
+
+    if is_partial_clone(path):
+        return PartialCloneRepo(path)
+    return Repo(path)
 
-    return repo
+
+def check_clone_strategy(clone_strategy: str, clone_depth: Union[int, None] = None) -> None:
+    """
+    Raises ValueError for unknown clone strategy or shallow strategy without positive depth,
+    otherwise shallow clone would silently take the whole history of the branch
+
+    :param clone_strategy: one of CLONE_STRATEGIES
+    :param clone_depth: number of commits to clone for "shallow" strategy
+    :return: None
+    """
+    if clone_strategy not in CLONE_STRATEGIES:
+        raise ValueError(f"{clone_strategy} is not a clone strategy."
+                         f"\nChoose one of {', '.join(CLONE_STRATEGIES.keys())}")
+    if clone_strategy == "shallow" and (clone_depth is None or clone_depth < 1):
+        raise ValueError(f"shallow clone strategy needs positive clone_depth, got {clone_depth}")
+
+
+def is_partial_clone(path: str) -> bool:
+    """
+    Checks whether repository was cloned with --filter option, so some of its objects are absent
+
+    :param path: path to the folder with repository
+    :return: True for partial clones
+    """
+    with Repo(path) as repo:
+        config = repo.get_config()
+    try:
+        return config.get((b"remote", b"origin"), b"promisor") == b"true"
+    except KeyError:
+        return False
 
 
 def get_repo_url(repo_name: str) -> str:
@@ -126,42 +291,107 @@ def get_repo_url(repo_name: str) -> str:
     :param repo_name: full repository name in format "{author}/{repository_name}"
     :return: link for the repo
     """
-    if repo_name.startswith("https://"):  # already a url
+    if "://" in repo_name:  # already a url
         return repo_name
     return f"https://github.com/{repo_name}"
 
 
-def try_find_repo(directory_path: str, repo_name: str, download: bool = False) -> Union[None, Repo]:
+def get_repo_name(url: str) -> str:
+    """
+    Get repository name from its link
+
+    :param url: link for the repo or its name
+    :return: repository name in format "{author}/{repository_name}"
+    """
+    if "://" in url:
+        return "/".join(url.rstrip("/").split("/")[-2:])
+    return url
+
+
+def try_find_repo(directory_path: str,
+                  repo_name: str,
+                  download: bool = False,
+                  clone_strategy: str = "full") -> Union[None, Repo]:
     """
-    Method tries to find given repository folder in the given path
+    Method tries to find given repository folder in the given path.
+    Temporary folders of the repository that aren't git repositories are left by killed clones and are removed
 
-    :param download: download repo if doesn't exist
+    :param download: download repo if doesn't exist. Folder named after repository that isn't a repository
+            is replaced, folder of failed clone is removed
     :param directory_path: path of the directory where to search
-    :param repo_name: name of searched repo in format {author_name}/{repository_name}
+    :param repo_name: name of searched repo in format {author_name}/{repository_name} or link to it
+    :param clone_strategy: how to clone repo if it should be downloaded, one of CLONE_STRATEGIES
     :return: Either found repo or None
     """
     repo = None
     found_repo = False
-    temp_repo_name = repo_name.replace("/", "_")  # {author_name}_{repository_name}
+    broken_folder = False  # folder named after repository that isn't a repository, e.g. left by failed clone
+    temp_repo_name = get_repo_name(repo_name).replace("/", "_")  # {author_name}_{repository_name}
 
     with os.scandir(directory_path) as it:
         for entry in it:
-            if entry.is_dir() and entry.name.startswith(temp_repo_name):
-                try:
-                    repo = get_repo_from_url(entry.path)
-                    found_repo = True
-                except RuntimeError as e:
-                    logger.exception(f"Runtime Error while reading repo in {entry.path}\n{e}")
-                    found_repo = False
+            # temporary folders are named as "{temp_repo_name}_{random suffix}", so "a/b" prefix matches "a/b_c"
+            # and "a_b/c" has the same name as "a/b_c". Remote url tells which repository it is
+            if not entry.is_dir() or not (entry.name == temp_repo_name or entry.name.startswith(temp_repo_name + "_")):
+                continue
+            try:
+                repo = get_repo_from_url(entry.path)
+            except NotGitRepository:
+                if entry.name != temp_repo_name:  # temporary folder of clone whose worker was killed
+                    logger.log(2, f"\tRemoving stale folder {entry.path}")
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                broken_folder = broken_folder or entry.name == temp_repo_name
+                continue
+            except RuntimeError as e:
+                logger.exception(f"Runtime Error while reading repo in {entry.path}\n{e}")
+                continue
+            if is_repo_of(repo, repo_name, exact_folder=entry.name == temp_repo_name):
+                found_repo = True
+                break
+            repo.close()
+            repo = None
 
     if download and not found_repo:
         repo_path = Path(directory_path) / temp_repo_name
+        if broken_folder:
+            logger.log(2, f"\tRemoving broken folder {repo_path}")
+            shutil.rmtree(repo_path)
         os.makedirs(repo_path)
-        repo = get_repo_from_url(str(repo_path), get_repo_url(repo_name))
+        try:
+            repo = get_repo_from_url(str(repo_path), get_repo_url(repo_name), clone_strategy)
+        except BaseException:  # failed or terminated clone mustn't be taken for repository by the next call
+            shutil.rmtree(repo_path, ignore_errors=True)
+            raise
 
     return repo
 
 
+def is_repo_of(repo: Repo, repo_name: str, exact_folder: bool = False) -> bool:
+    """
+    Checks whether repository was cloned from the given one
+
+    :param repo: dulwich Repo object
+    :param repo_name: name of repository in format {author_name}/{repository_name} or link to it
+    :param exact_folder: whether repository folder is named exactly after repo_name,
+            such repository is accepted if it has no remote
+    :return: True if remote url of repo points to repo_name
+    """
+    try:
+        url = repo.get_config().get((b"remote", b"origin"), b"url").decode()
+    except KeyError:
+        return exact_folder
+    return get_comparable_name(url) == get_comparable_name(repo_name)
+
+
+def get_comparable_name(url: str) -> str:
+    """
+    :param url: link for the repo or its name
+    :return: lowercase repository name without ".git" suffix
+    """
+    name = get_repo_name(url).lower()
+    return name[:-len(".git")] if name.endswith(".git") else name
+
+
 def get_repos_url(repo: Repo) -> str:
     try:
         return (repo.get_config().get((b'remote', b'origin'), b'url')).decode()
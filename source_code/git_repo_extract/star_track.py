@@ -1,89 +1,91 @@
-import calendar
 from collections import Counter
-import logging
-import time
 from pathlib import Path
-from typing import Any, Iterator, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple, Union
 
-from github import BadCredentialsException, Github, GithubException, RateLimitExceededException
-from tqdm import tqdm
-
-logger = logging.getLogger(__name__)
+from source_code.git_repo_extract.heavy_hitters import SpaceSaving
+from source_code.git_repo_extract.stargazer_crawler import CheckpointedWriter, crawl_stargazers, GitHubClient, \
+    GITHUB_API_URL, TokenBucket
+from source_code.persistent_cache import get_cache
 
 
 def get_stargazer_info(repo_name: str,
                        github_key: str,
+                       path: Path,
                        max_user_stars: int = 300,
                        per_page: int = 100,
-                       limit_stargazers: int = 1000) -> Iterator[str]:
+                       limit_stargazers: int = 1000,
+                       n_workers: int = 8,
+                       api_url: str = GITHUB_API_URL,
+                       checkpoints_path: Union[Path, None] = None,
+                       etag_cache_path: Union[Path, None] = None) -> Dict[str, int]:
     """
-    Method investigates stargazers of given repository and return the most popular
-    repositories amongst them.
+    Method investigates stargazers of given repository and writes repositories starred by them,
+    one full name per line, so the most popular ones can be taken by get_top_repos.
 
-    :param limit_stargazers: maximum number of stargazers parsed
     :param repo_name: name of repository which stargazers to investigate
     :param github_key: personal github key to get access to the github API
+    :param path: where to write repositories, lines are appended to it
     :param max_user_stars: limit of repos taken from user
     :param per_page: pagination parameter for GitHub request API
-
-    :return: Dict
-    """
-    account = Github(github_key, per_page=per_page)
-
-    repo = None
-    while repo is None:
-        try:
-            repo = account.get_repo(repo_name)
-        except RateLimitExceededException as e:
-            logger.exception(f"GitHub api limit: {e}")
-            sleep_until_unblock(account)
-        except BadCredentialsException as e:
-            raise ValueError(f"Wrong token provided - {github_key}, exception - {e}")
-
-    for index, user in enumerate(tqdm(repo.get_stargazers())):
-        try:
-            if index > limit_stargazers:
-                return
-            user_stars = user.get_starred()
-            for i, repos in enumerate(user_stars):
-                if i > max_user_stars:
-                    break
-                yield repos.full_name
-        except RateLimitExceededException as e:
-            logger.exception(f"RateLimitException {e}")
-            sleep_until_unblock(account)
-        except GithubException as e:
-            logger.exception(f"GithubException {e}")
-
-
-def sleep_until_unblock(account: Github) -> None:
-    """
-    Method to minimize source_code duplication. Forces the programme to wait until
-
-    GitHub rate_limit restarts
-    :param account: your GitHub account
-    :return: None
+    :param limit_stargazers: maximum number of stargazers parsed
+    :param n_workers: number of concurrent requests
+    :param api_url: url of GitHub API
+    :param checkpoints_path: path to file with stargazers already crawled into path, None to crawl all of them
+    :param etag_cache_path: path to file with cached responses for conditional requests, None to disable them
+    :return: dict with numbers of crawled, skipped and failed stargazers
     """
-    search_rate_limit = account.get_rate_limit().search
-    print("search remaining: {}".format(search_rate_limit.remaining))
-    reset_timestamp = calendar.timegm(search_rate_limit.reset.timetuple())
-    # add 10 seconds to be sure the rate limit has been reset
-    sleep_time = max(reset_timestamp - calendar.timegm(time.gmtime()), 0)
-    time.sleep(sleep_time + 10)
+    client = GitHubClient(github_key, api_url, TokenBucket(capacity=n_workers),
+                          None if etag_cache_path is None else get_cache(etag_cache_path, table="etags", memory_size=1000))
+    checkpoints = None if checkpoints_path is None else get_cache(checkpoints_path, table="stargazers")
+    with CheckpointedWriter(path, checkpoints) as writer:
+        stats = crawl_stargazers(repo_name, client, writer, n_workers, max_user_stars, limit_stargazers, per_page)
+    if client.etag_cache is not None:
+        client.etag_cache.flush()
+    return {**stats, "requests": client.requests, "not_modified": client.not_modified}
 
 
-def get_top_repos(path: Path, n_top_repos: int = 100) -> List[Tuple[Any, int]]:
+def get_top_repos(path: Path, n_top_repos: int = 100, capacity: Union[int, None] = None) -> List[Tuple[Any, int]]:
     """
-    Extracts all the repositories from the generated file from file_writer
+    Extracts all the repositories from the generated file from get_stargazer_info
 
     and returns Top used repositories
-    :param path: path to file with list of repositories
+    :param path: path to file with list of repositories or to summary written by write_top_repos_summary
     :param n_top_repos: limit of given number of top repos
+    :param capacity: count repositories with Space-Saving summary of this capacity instead of exact Counter,
+            memory is bounded and counts are overestimated by at most number of lines / capacity
     :return: List
     """
+    if is_summary(path):
+        return SpaceSaving.load(path).top(n_top_repos)
+
+    if capacity is not None:
+        return count_top_repos([path], capacity).top(n_top_repos)
+
     top_repos = Counter()
     with path.open("r") as rp:
         for line in rp:
             top_repos[line.rstrip("\n")] += 1
 
     return top_repos.most_common(n_top_repos)
+
+
+def is_summary(path: Path) -> bool:
+    return Path(path).suffix == ".json"
+
+
+def count_top_repos(paths: Iterable[Path], capacity: int = 10000) -> SpaceSaving:
+    """
+    Streams crawl files into one Space-Saving summary, summaries written before are merged into it
+
+    :param paths: paths to files with list of repositories or to saved summaries
+    :param capacity: capacity of summary
+    :return: SpaceSaving
+    """
+    summary = SpaceSaving(capacity)
+    for path in paths:
+        if is_summary(path):
+            summary.merge(SpaceSaving.load(path))
+            continue
+        with Path(path).open("r") as rp:
+            summary.update_many(line.rstrip("\n") for line in rp)
+    return summary
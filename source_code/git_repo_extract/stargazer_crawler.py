@@ -0,0 +1,346 @@
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Set, Tuple, Union
+
+import requests
+
+from source_code.persistent_cache import PersistentCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+GITHUB_API_URL = "https://api.github.com"
+# core API allows 5000 requests per hour for authenticated users
+DEFAULT_RATE = 5000 / 3600
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket shared by crawler workers. Its refill rate follows GitHub rate-limit headers:
+    the remaining budget is spread evenly until the reset time, and when the budget is exhausted
+    workers wait for the reset instead of hammering the API
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: int = 10):
+        """
+        :param rate: tokens per second before any headers are seen
+        :param capacity: maximum burst of requests
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._updated = time.time()
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a request is allowed
+
+        :return: None
+        """
+        with self._condition:
+            while True:
+                now = time.time()
+                if now < self.blocked_until:
+                    self._condition.wait(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self._condition.wait((1 - self.tokens) / self.rate if self.rate > 0 else 1.0)
+
+    def update(self, limit: int, remaining: int, reset: float) -> None:
+        """
+        Applies values of x-ratelimit-* headers
+
+        :param limit: requests allowed in rate-limit window
+        :param remaining: requests left in the current window
+        :param reset: epoch seconds when the window is reset
+        :return: None
+        """
+        with self._condition:
+            now = time.time()
+            self._refill(now)
+            if remaining <= 0:
+                self.block(reset)
+                self.rate = limit / 3600
+                return
+            self.tokens = min(self.tokens, remaining)
+            self.rate = remaining / max(reset - now, 1.0)
+            self._condition.notify_all()
+
+    def block(self, until: float) -> None:
+        """
+        Stops all the requests until the given time, e.g. after 403 or 429 response
+
+        :param until: epoch seconds
+        :return: None
+        """
+        with self._condition:
+            self.blocked_until = max(self.blocked_until, until)
+            self.tokens = 0.0
+            logger.log(2, f"\tGitHub rate limit is exhausted, waiting {max(until - time.time(), 0):.0f}s")
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class GitHubClient(object):
+    """
+    Minimal thread-safe client of GitHub REST API with conditional requests: responses are cached
+    with their ETags, and 304 Not Modified answers, which GitHub doesn't count against the rate limit,
+    are served from the cache
+    """
+
+    def __init__(self,
+                 github_key: Union[str, None],
+                 api_url: str = GITHUB_API_URL,
+                 bucket: Union[TokenBucket, None] = None,
+                 etag_cache: Union[PersistentCache, None] = None,
+                 retries: int = 3,
+                 timeout: float = 30.0):
+        """
+        :param github_key: personal github key, None for anonymous access
+        :param api_url: url of GitHub API, can be replaced with a local server
+        :param bucket: token bucket of core API, shared by all the threads
+        :param etag_cache: cache of responses, None to send unconditional requests
+        :param retries: number of retries of failed requests, rate-limited requests are retried until they succeed
+        :param timeout: timeout of one request in seconds
+        """
+        self.api_url = api_url.rstrip("/")
+        self.headers = {"Accept": "application/vnd.github+json"}
+        if github_key:
+            self.headers["Authorization"] = f"token {github_key}"
+        self.bucket = bucket or TokenBucket()
+        self.etag_cache = etag_cache
+        self.retries = retries
+        self.timeout = timeout
+
+        self.requests = 0
+        self.not_modified = 0
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers.update(self.headers)
+        return self._local.session
+
+    def get(self, url: str, fields: Union[List[str], None] = None) -> Tuple[Any, Union[str, None]]:
+        """
+        :param url: absolute url or path of API endpoint
+        :param fields: fields of list items to keep, other ones are dropped before caching. None to keep all
+        :return: (decoded json, url of the next page or None). (None, None) if resource doesn't exist
+        """
+        if not url.startswith("http"):
+            url = f"{self.api_url}/{url.lstrip('/')}"
+        cache_key = url if fields is None else f"{url}#{','.join(fields)}"
+        cached = self._cached(cache_key)
+
+        failures = 0
+        while True:
+            self.bucket.acquire()
+            headers = {"If-None-Match": cached["etag"]} if cached else {}
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                failures += 1
+                if failures > self.retries:
+                    raise
+                logger.log(2, f"\t{url} failed: {e}, retrying")
+                time.sleep(2 ** failures)
+                continue
+            self.requests += 1
+            self._update_bucket(response)
+
+            if response.status_code == 304 and cached:
+                self.not_modified += 1
+                return cached["body"], cached["next"]
+            if response.status_code == 200:
+                body, next_url = response.json(), response.links.get("next", {}).get("url")
+                if fields is not None and isinstance(body, list):
+                    body = [{field: item.get(field) for field in fields} for item in body]
+                if "ETag" in response.headers:
+                    self._cache(cache_key, {"etag": response.headers["ETag"], "body": body, "next": next_url})
+                return body, next_url
+            if response.status_code == 401:
+                raise ValueError(f"Wrong token provided - {response.json().get('message')}")
+            if response.status_code in (403, 429) and self._is_rate_limited(response):
+                continue  # bucket is blocked until reset
+            if response.status_code == 404:
+                return None, None
+
+            failures += 1
+            if failures > self.retries:
+                response.raise_for_status()
+            time.sleep(2 ** failures)
+
+    def get_items(self, url: str, max_items: int = -1, fields: Union[List[str], None] = None) -> Iterator[Any]:
+        """
+        Follows pagination of list endpoint
+
+        :param url: url or path of the first page
+        :param max_items: maximum number of items, -1 for all of them
+        :param fields: see get
+        :return: Iterator of items
+        """
+        given = 0
+        while url is not None:
+            page, url = self.get(url, fields)
+            for item in page or []:
+                if given == max_items:
+                    return
+                given += 1
+                yield item
+
+    def _update_bucket(self, response: requests.Response) -> None:
+        headers = response.headers
+        if headers.get("x-ratelimit-resource", "core") != "core" or "x-ratelimit-remaining" not in headers:
+            return
+        self.bucket.update(int(headers.get("x-ratelimit-limit", 5000)),
+                           int(headers["x-ratelimit-remaining"]),
+                           float(headers.get("x-ratelimit-reset", time.time() + 60)))
+
+    def _is_rate_limited(self, response: requests.Response) -> bool:
+        if "Retry-After" in response.headers:  # secondary rate limit
+            self.bucket.block(time.time() + float(response.headers["Retry-After"]))
+            return True
+        if response.headers.get("x-ratelimit-remaining") == "0":
+            # core limit has already blocked bucket in _update_bucket, limits of other resources are applied here
+            self.bucket.block(float(response.headers.get("x-ratelimit-reset", time.time() + 60)))
+            return True
+        return False
+
+    def _cached(self, url: str) -> Union[Dict, None]:
+        if self.etag_cache is None:
+            return None
+        with self._cache_lock:
+            return self.etag_cache.get(url)
+
+    def _cache(self, url: str, value: Dict) -> None:
+        if self.etag_cache is not None:
+            with self._cache_lock:
+                self.etag_cache[url] = value
+
+
+class CheckpointedWriter(object):
+    """
+    Buffers lines of crawled users and appends them to file in batches. Users are saved in checkpoints
+    only after their lines are flushed, so a resumed crawl neither loses nor duplicates lines.
+    Checkpoints keys include the output path, so crawl into another file doesn't skip users written elsewhere
+    """
+
+    def __init__(self, path: Path, checkpoints: Union[PersistentCache, None] = None, flush_every: int = 1000):
+        """
+        :param path: path to output file, lines are appended to it
+        :param checkpoints: storage of crawled users, None to disable resuming
+        :param flush_every: number of buffered lines after which they are written
+        """
+        self.path = Path(path)
+        self.checkpoints = checkpoints
+        self.flush_every = flush_every
+        self.key_prefix = f"{self.path.resolve()}:"
+        self.written = 0
+        self._lines: List[str] = []
+        self._done: List[str] = []
+        self._file = None
+
+    def __enter__(self) -> "CheckpointedWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush()
+        self._file.close()
+
+    def is_done(self, key: str) -> bool:
+        return self.checkpoints is not None and self.key_prefix + key in self.checkpoints
+
+    def write(self, key: str, lines: List[str]) -> None:
+        """
+        :param key: key of crawled unit, e.g. "{repo}:{user}"
+        :param lines: lines produced by the unit
+        :return: None
+        """
+        self._lines.extend(lines)
+        self._done.append(key)
+        if len(self._lines) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._lines:
+            self._file.write("".join(f"{line}\n" for line in self._lines))
+        self._file.flush()
+        self.written += len(self._lines)
+        if self.checkpoints is not None:
+            for key in self._done:
+                self.checkpoints[self.key_prefix + key] = True
+            self.checkpoints.flush()
+        self._lines, self._done = [], []
+
+
+def crawl_stargazers(repo_name: str,
+                     client: GitHubClient,
+                     writer: CheckpointedWriter,
+                     n_workers: int = 8,
+                     max_user_stars: int = 300,
+                     limit_stargazers: int = 1000,
+                     per_page: int = 100) -> Dict[str, int]:
+    """
+    Writes repositories starred by stargazers of the given repository, one full name per line.
+    Stargazers are listed page by page while up to n_workers threads fetch their starred repositories
+
+    :param repo_name: name of repository which stargazers to investigate, e.g. "scikit-learn/scikit-learn"
+    :param client: GitHub client
+    :param writer: output of lines, users already saved in its checkpoints are skipped
+    :param n_workers: number of concurrent requests
+    :param max_user_stars: limit of repos taken from user
+    :param limit_stargazers: maximum number of stargazers parsed
+    :param per_page: pagination parameter for GitHub request API
+    :return: dict with numbers of crawled, skipped and failed users
+    """
+    stats = {"crawled": 0, "skipped": 0, "failed": 0}
+    if client.get(f"repos/{repo_name}", ["id"])[0] is None:
+        raise ValueError(f"Repository {repo_name} is not found")
+
+    def starred(login: str) -> List[str]:
+        return [repo["full_name"] for repo in client.get_items(f"users/{login}/starred?per_page={per_page}",
+                                                               max_user_stars, ["full_name"])]
+
+    in_flight: Dict[Future, str] = {}
+
+    def collect(done: Set[Future]) -> None:
+        for future in done:
+            login = in_flight.pop(future)
+            try:
+                repos = future.result()
+            except Exception as e:
+                logger.exception(f"{login} stars failed: {e}")
+                stats["failed"] += 1
+                continue
+            stats["crawled"] += 1
+            writer.write(f"{repo_name}:{login}", repos)
+
+    stargazers = client.get_items(f"repos/{repo_name}/stargazers?per_page={per_page}", limit_stargazers, ["login"])
+    with ThreadPoolExecutor(n_workers) as executor:
+        for user in stargazers:
+            if writer.is_done(f"{repo_name}:{user['login']}"):
+                stats["skipped"] += 1
+                continue
+            if len(in_flight) >= 2 * n_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[executor.submit(starred, user["login"])] = user["login"]
+        collect(wait(in_flight)[0])
+
+    return stats
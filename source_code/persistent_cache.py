@@ -0,0 +1,152 @@
+import json
+import logging
+import sqlite3
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+_MISSING = object()
+
+
+class PersistentCache(object):
+    """
+    Key-value storage kept in SQLite file with bounded in-memory LRU in front of it.
+    File can be shared by several processes, each process opens its own connection.
+    Threads of one process may share the instance if they serialize access to it.
+    Values should be json serializable
+    """
+
+    def __init__(self, path: Union[str, Path], table: str = "cache", memory_size: int = 100000,
+                 commit_every: int = 100):
+        """
+        :param path: path to SQLite file, will be created if doesn't exist
+        :param table: name of table inside of SQLite file, allows to keep several caches in one file
+        :param memory_size: maximum number of entities held in memory
+        :param commit_every: number of writes after which they are committed to the file
+        """
+        self.path = Path(path)
+        self.table = table
+        self.memory_size = memory_size
+        self.commit_every = commit_every
+
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._connection: Union[sqlite3.Connection, None] = None
+        self._uncommitted = 0
+
+    def __getstate__(self) -> Dict:
+        """
+        Connection can't be passed to another process, so it is reopened lazily there
+        """
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_memory"] = OrderedDict()
+        state["_uncommitted"] = 0
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT)")
+            self._connection.commit()
+        return self._connection
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Looks for the key in memory and then in file
+
+        :param key: key of entity
+        :param default: value returned if key is absent
+        :return: stored value or default
+        """
+        value = self._memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return value
+
+        row = self.connection.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        try:
+            self.connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)",
+                                    (key, json.dumps(value)))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.flush()
+        except sqlite3.OperationalError as e:  # file is locked by another process for too long
+            logger.exception(f"Cache write error {e}")
+
+    def __contains__(self, key: str) -> bool:
+        """
+        Checks presence of the key without changing hits and misses statistics
+        """
+        if key in self._memory:
+            return True
+        return self.connection.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def flush(self) -> None:
+        """
+        Commits all the pending writes to the file
+
+        :return: None
+        """
+        if self._connection is not None and self._uncommitted:
+            self._connection.commit()
+            self._uncommitted = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        :return: dict {"hits": int, "misses": int, "hit_rate": float}
+        """
+        requests = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0}
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+
+_process_caches: Dict[str, PersistentCache] = {}
+
+
+def get_cache(path: Union[str, Path], table: str = "cache", memory_size: int = 100000) -> PersistentCache:
+    """
+    Returns cache instance shared inside of one process, so its memory part survives between repositories
+
+    :param path: path to SQLite file
+    :param table: name of table inside of SQLite file
+    :param memory_size: maximum number of entities held in memory
+    :return: PersistentCache
+    """
+    key = f"{Path(path).resolve()}:{table}"
+    if key not in _process_caches:
+        _process_caches[key] = PersistentCache(path, table, memory_size)
+    return _process_caches[key]
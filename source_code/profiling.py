@@ -0,0 +1,270 @@
+import cProfile
+import csv
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+# profiling is configured with environment variables, so worker processes inherit it
+PROFILE_DIR_VARIABLE = "SIMILAR_DEV_PROFILE_DIR"
+TRACE_VARIABLE = "SIMILAR_DEV_PROFILE_TRACE"
+CPROFILE_VARIABLE = "SIMILAR_DEV_PROFILE_CPROFILE"
+MAX_TRACE_EVENTS = 1000000  # in each process and in the whole trace
+
+
+class Profiler(object):
+    """
+    Collects timing spans of one process. Durations are aggregated per (repository, span name),
+    single spans are kept only for Chrome trace. Everything is appended to span file of the process
+    in profile folder when repository is finished, so spans of killed workers are lost only for one repository
+    """
+
+    def __init__(self, folder: Path, trace: bool = False, use_cprofile: bool = False):
+        """
+        :param folder: profile folder, shared by all processes of run
+        :param trace: keep single spans for Chrome trace
+        :param use_cprofile: run cProfile in this process and dump its stats into profile folder
+        """
+        self.folder = Path(folder)
+        self.trace = trace
+        self.pid = os.getpid()
+        self.repo = ""
+        self.totals: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])  # count, total, max
+        self.events: List[Dict] = []
+        self.traced = 0  # events kept by process since it started, flush doesn't reset it
+        self._lock = threading.Lock()
+        self._cprofile = None
+        if use_cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            totals = self.totals[(self.repo, name)]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] = max(totals[2], duration)
+            if self.trace and self.traced < MAX_TRACE_EVENTS:
+                self.traced += 1
+                self.events.append({"name": name, "repo": self.repo, "tid": threading.get_ident(),
+                                    "start": start, "duration": duration})
+
+    def flush(self) -> None:
+        """
+        Appends collected spans to span file of the process
+
+        :return: None
+        """
+        with self._lock:
+            totals, events = self.totals, self.events
+            self.totals, self.events = defaultdict(lambda: [0, 0.0, 0.0]), []
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with (self.folder / f"spans-{self.pid}.jsonl").open("a") as f:
+            for (repo, name), (count, total, maximum) in totals.items():
+                f.write(json.dumps({"type": "total", "pid": self.pid, "repo": repo, "name": name,
+                                    "count": count, "total": total, "max": maximum}) + "\n")
+            for event in events:
+                f.write(json.dumps({"type": "event", "pid": self.pid, **event}) + "\n")
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(str(self.folder / f"cprofile-{self.pid}.prof"))
+            self._cprofile.enable()
+
+
+_profiler: Union[Profiler, None] = None
+
+
+def get_profiler() -> Union[Profiler, None]:
+    """
+    :return: profiler of the current process or None if profiling is disabled
+    """
+    global _profiler
+    folder = os.environ.get(PROFILE_DIR_VARIABLE)
+    if folder is None:
+        return None
+    if _profiler is None or _profiler.pid != os.getpid():  # forked worker gets its own profiler
+        _profiler = Profiler(Path(folder), os.environ.get(TRACE_VARIABLE) == "1",
+                             os.environ.get(CPROFILE_VARIABLE) == "1")
+    return _profiler
+
+
+def enable_profiling(folder: Path, trace: bool = False, use_cprofile: bool = False) -> None:
+    """
+    Enables profiling in this process and in processes started after this call.
+    Span files of previous runs in the folder are removed
+
+    :param folder: where to write spans, cProfile stats and reports
+    :param trace: write Chrome trace of single spans
+    :param use_cprofile: run cProfile in every process
+    :return: None
+    """
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    for path in list(Path(folder).glob("spans-*.jsonl")) + list(Path(folder).glob("cprofile-*.prof")):
+        path.unlink()
+    os.environ[PROFILE_DIR_VARIABLE] = str(folder)
+    os.environ[TRACE_VARIABLE] = "1" if trace else "0"
+    os.environ[CPROFILE_VARIABLE] = "1" if use_cprofile else "0"
+
+
+def disable_profiling() -> None:
+    global _profiler
+    for variable in [PROFILE_DIR_VARIABLE, TRACE_VARIABLE, CPROFILE_VARIABLE]:
+        os.environ.pop(variable, None)
+    _profiler = None
+
+
+class _NullSpan(object):
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+
+
+def span(name: str) -> Union[_Span, _NullSpan]:
+    """
+    Times the block of code: `with span("parse"): ...`. Costs one environment lookup when profiling is disabled
+
+    :param name: name of span
+    :return: context manager
+    """
+    profiler = get_profiler()
+    return _NULL_SPAN if profiler is None else _Span(profiler, name)
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator that times every call of function as span
+
+    :param name: name of span
+    :return: decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iterator(iterable: Iterable, name: str) -> Iterator:
+    """
+    Times producing of every item of iterable, e.g. reading of commits by walker
+
+    :param iterable: iterable
+    :param name: name of span
+    :return: Iterator of the same items
+    """
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            item = next(iterator, _NULL_SPAN)
+        if item is _NULL_SPAN:
+            return
+        yield item
+
+
+@contextmanager
+def repo_context(url: str) -> Iterator[None]:
+    """
+    Attributes spans inside of the block to the repository and flushes them when it is finished
+
+    :param url: url or name of repository
+    :return: context manager
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        yield
+        return
+
+    previous, profiler.repo = profiler.repo, url
+    try:
+        with span("repo"):
+            yield
+    finally:
+        profiler.flush()
+        profiler.repo = previous
+
+
+def read_spans(folder: Path) -> Iterator[Dict]:
+    for path in sorted(Path(folder).glob("spans-*.jsonl")):
+        with path.open("r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def write_report(folder: Path) -> Dict[str, Any]:
+    """
+    Aggregates span files of all processes into report.json and report.csv with rows per repository
+    and per worker, and into trace.json in Chrome trace format (chrome://tracing, Perfetto) if spans were traced
+
+    :param folder: profile folder
+    :return: report dict
+    """
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.flush()
+
+    by_repo = defaultdict(lambda: [0, 0.0, 0.0])
+    by_worker = defaultdict(lambda: [0, 0.0, 0.0])
+    events = []
+    for record in read_spans(folder):
+        if record["type"] == "event":
+            if len(events) < MAX_TRACE_EVENTS:
+                events.append(record)
+            continue
+        for totals, key in [(by_repo, (record["repo"], record["name"])), (by_worker, (record["pid"], record["name"]))]:
+            totals[key][0] += record["count"]
+            totals[key][1] += record["total"]
+            totals[key][2] = max(totals[key][2], record["max"])
+
+    def rows(totals: Dict, scope: str) -> List[Dict]:
+        return [{"scope": scope, "key": key, "span": name, "count": count, "total_s": round(total, 6),
+                 "mean_ms": round(total / count * 1e3, 4) if count else 0.0, "max_ms": round(maximum * 1e3, 4)}
+                for (key, name), (count, total, maximum) in sorted(totals.items(), key=lambda item: -item[1][1])]
+
+    report = {"repos": rows(by_repo, "repo"), "workers": rows(by_worker, "worker")}
+    folder = Path(folder)
+    (folder / "report.json").write_text(json.dumps(report, indent=2))
+    with (folder / "report.csv").open("w", newline="") as f:
+        writer = csv.DictWriter(f, ["scope", "key", "span", "count", "total_s", "mean_ms", "max_ms"])
+        writer.writeheader()
+        writer.writerows(report["repos"] + report["workers"])
+
+    if events:
+        trace = [{"name": event["name"], "ph": "X", "pid": event["pid"], "tid": event["tid"],
+                  "ts": event["start"] * 1e6, "dur": event["duration"] * 1e6, "args": {"repo": event["repo"]}}
+                 for event in events]
+        (folder / "trace.json").write_text(json.dumps({"traceEvents": trace}))
+    return report
@@ -1,44 +1,117 @@
+from functools import partial
+
 import click
+from tqdm import tqdm
 
-from git_repo_extract.commits_info import get_commits_info_floored
-from git_repo_extract.star_track import get_stargazer_info, get_top_repos
-from git_repo_extract.repo_ops import operate_temporary_repo
-from code_parsing.code_handle import parallelize_extraction
-from utils import *
+from git_repo_extract.change_filter import DEFAULT_FILTER_CONFIG
+from git_repo_extract.commits_info import get_commits_info_floored, MERGE_POLICIES, RENAME_THRESHOLD
+from git_repo_extract.language_detection import DEFAULT_DETECTOR, DETECTORS
+from git_repo_extract.star_track import count_top_repos, get_stargazer_info, get_top_repos
+from git_repo_extract.stargazer_crawler import GITHUB_API_URL
+from git_repo_extract.mirror_store import get_repo_operator, get_repo_size_estimator, GIGABYTE
+from git_repo_extract.repo_ops import CLONE_STRATEGIES
+from code_parsing.code_handle import extract_repo_commits_variables, parallelize_extraction, PARSE_COLUMNS, \
+    FusedSink
+from code_parsing.repo_parser import RepoParser
+from columnar import COLUMNAR_FORMATS, ColumnarWriter, get_dataset_path
+from scheduling import WorkerPool
+from similarity.author_vectors import build_author_features, get_similar_developers, MEGABYTE
+from similarity.embeddings import DEFAULT_DIMENSION, DeveloperIndex
+from similarity.minhash import AuthorSketches, similar_pairs
+from similarity.service import collect_author_metadata, make_server, SimilarityService
+from source_code.profiling import enable_profiling, write_report  # the same module instrumented code uses
+from source_code.utils import *  # StreamWriter must recognize Checkpoint objects of source_code modules
 
 
 @click.group()
-def cli():
+@click.option("--profile_dir", default=None, type=click.Path(path_type=Path),
+              help="Write timing spans of clone, walk, blob loading, diff, language detection, parsing "
+                   "and writing per repository and per worker to this folder")
+@click.option("--chrome_trace/--no-chrome_trace", default=False, help="Also write trace.json for chrome://tracing")
+@click.option("--cprofile/--no-cprofile", default=False, help="Also dump cProfile stats of every process")
+def cli(profile_dir: Union[Path, None], chrome_trace: bool, cprofile: bool):
     """
     A group of cli methods
     """
-    pass
+    if profile_dir is not None:
+        enable_profiling(profile_dir, chrome_trace, cprofile)
+        click.get_current_context().call_on_close(lambda: write_report(profile_dir))
 
 
 @cli.command()
-@click.option("--repos_file_path", default=SELECTED_REPOS_FILE, type=click.Path())
-@click.option("--temp_repo_path", default=TEMP_REPOS_FOLDER, type=click.Path())
-@click.option("--commits_info_path", default=COMMITS_INFO_FILE, type=click.Path())
+@click.option("--repos_file_path", default=SELECTED_REPOS_FILE, type=click.Path(path_type=Path))
+@click.option("--temp_repo_path", default=TEMP_REPOS_FOLDER, type=click.Path(path_type=Path))
+@click.option("--commits_info_path", default=COMMITS_INFO_FILE, type=click.Path(path_type=Path))
 @click.option("--batch_size", default=10, type=int)
 @click.option("--start_batch", default=0, type=int)
 @click.option("--commits_number", default=100, type=int)
 @click.option("--n_jobs", default=-1, type=int)
+@click.option("--language_detector", default=DEFAULT_DETECTOR, type=click.Choice(list(DETECTORS.keys())))
+@click.option("--clone_strategy", default="full", type=click.Choice(list(CLONE_STRATEGIES.keys())))
+@click.option("--clone_depth", default=None, type=int)
+@click.option("--mirror_path", default=None, type=click.Path(path_type=Path))
+@click.option("--mirror_budget_gb", default=50.0, type=float)
+@click.option("--incremental/--no-incremental", default=False)
+@click.option("--checkpoints_path", default=CHECKPOINTS_FILE, type=click.Path(path_type=Path))
+@click.option("--repo_timeout", default=None, type=float)
+@click.option("--retries", default=1, type=int)
+@click.option("--output_format", default="jsonl", type=click.Choice(["jsonl", *COLUMNAR_FORMATS.keys()]))
+@click.option("--merge_policy", default="combined", type=click.Choice(MERGE_POLICIES))
+@click.option("--rename_threshold", default=RENAME_THRESHOLD, type=int)
+@click.option("--find_copies/--no-find_copies", default=False)
+@click.option("--filter_config", default=None, type=click.Path(exists=True, path_type=Path))
 def write_repo_commits(repos_file_path: Path,
                        temp_repo_path: Path,
                        commits_info_path: Path,
                        batch_size: int,
                        start_batch: int,
                        commits_number: int,
-                       n_jobs: int) -> None:
+                       n_jobs: int,
+                       language_detector: str,
+                       clone_strategy: str,
+                       clone_depth: int,
+                       mirror_path: Path,
+                       mirror_budget_gb: float,
+                       incremental: bool,
+                       checkpoints_path: Path,
+                       repo_timeout: float,
+                       retries: int,
+                       output_format: str,
+                       merge_policy: str,
+                       rename_threshold: int,
+                       find_copies: bool,
+                       filter_config: Path) -> None:
     """
     Opens repos_file_path file, gets top repositories from it. Then operates each repository concurrently
-    using commits_info.get_commits_info_base.
-    Writes all the commits to commits_info_path file
+    using commits_info.get_commits_info_base. Each worker takes the next repository as soon as it is free.
+    The largest repositories go first: sizes are taken from mirrors or from temporary clones of earlier runs,
+    repositories of unknown size keep the order of repos_file_path after them.
+    Writes all the commits to commits_info_path file, one commit info per line.
+    Records of repository are written only once it is fully operated, so retried repository isn't duplicated
 
     :param n_jobs: number of processes to operate the task
+    :param language_detector: name of detector used to define files languages
+    :param clone_strategy: how to clone repositories: full, single_branch, shallow or blobless
+    :param clone_depth: number of commits to clone with shallow strategy, required by it
+    :param mirror_path: Path to folder with repositories mirrors kept between runs. Temporary clones are used if not set
+    :param mirror_budget_gb: maximum size of mirrors folder in gigabytes
+    :param incremental: walk only commits that appeared after the previous incremental run. Repository is
+            marked as processed only if its history is walked within commits_number and records are written
+    :param checkpoints_path: Path to file with the newest processed commits of repositories
+    :param repo_timeout: maximum number of seconds for one repository, unlimited if not set
+    :param retries: number of additional attempts for repository that failed or timed out
+    :param output_format: jsonl or columnar format of commits_info_path (parquet or arrow dataset folder)
+    :param merge_policy: changes of merge commits to take: skip, first_parent or combined (conflict resolutions only)
+    :param rename_threshold: similarity in percents above which deleted and added files are taken as renamed,
+            negative to disable rename detection
+    :param find_copies: look for sources of copied files among unchanged files too
+    :param filter_config: JSON file with parameters of change_filter.ChangeFilter: path globs, languages,
+            max blob size, authors, bots and dates. Commits and files are skipped before their blobs are read.
+            If not set, lockfiles, vendored and binary files, blobs over 1 MB and commits of bots are skipped
     :param commits_number: max number of commits should be parsed in each repository
-    :param start_batch: number of batch from which to start (useful if previous run failed on this batch)
-    :param batch_size: number of repositories should be paralleled before their return values will be written down
+    :param start_batch: number of batch from which to start, start_batch * batch_size repositories are skipped
+            as with the former batch by batch processing
+    :param batch_size: size of batch used to compare workers utilization with batch processing
     :param repos_file_path: Path to file with repository info
     :param temp_repo_path: Path where to place temporary repositories
     :param commits_info_path: Path where to create file with commits info
@@ -46,73 +119,440 @@ def write_repo_commits(repos_file_path: Path,
     """
 
     repos = [elem[0] for elem in get_top_repos(repos_file_path, 150)]
-    batches = split_into_batches(repos, batch_size)
-
-    with commits_info_path.open("a") as f:
-        for i, batch in enumerate(batches):
-            print(f"Processing batch {i}")
-            if i < start_batch:
-                continue
-
-            result = parallel_function(operate_temporary_repo,  # function
-                                       batch,  # source
-                                       n_jobs,  # n_jobs
-                                       50,  # verbose
-                                       repo_path=str(temp_repo_path),  # kwargs
-                                       operation=get_commits_info_floored,
-                                       arguments=(commits_number,),
-                                       url=None)
-            for repo_result in result:
-                write_down_content(repo_result, f)
+    repos = repos[start_batch * batch_size:]
+
+    # the largest repositories go first, so they don't delay the end of the run
+    repos.sort(key=get_repo_size_estimator(mirror_path, REPO_SIZES_FILE), reverse=True)
+
+    with StreamWriter(commits_info_path, output_format=output_format, schema_name="commits_info") as writer, \
+            WorkerPool(n_jobs, timeout=repo_timeout, retries=retries) as pool:
+        repo_operator = get_repo_operator(str(temp_repo_path),
+                                          mirror_path if mirror_path is None else str(mirror_path),
+                                          int(mirror_budget_gb * GIGABYTE),
+                                          clone_strategy,
+                                          clone_depth,
+                                          sink=writer.sink,  # records of repository are written when it is done
+                                          sizes_path=REPO_SIZES_FILE)
+        arguments = (commits_number, language_detector, LANGUAGES_CACHE_FILE,
+                     checkpoints_path if incremental else None)
+
+        operation = partial(get_commits_info_floored, merge_policy=merge_policy, rename_threshold=rename_threshold,
+                            find_copies=find_copies, change_filter=filter_config or DEFAULT_FILTER_CONFIG,
+                            yield_checkpoint=True)  # checkpoint is saved by writer after the records
+
+        tasks = ((repo, {"url": repo, "operation": operation, "arguments": arguments}) for repo in repos)
+        for result in tqdm(pool.run(repo_operator, tasks), total=len(repos), desc="Repositories"):
+            if result.failed:
+                print(f"{result.key} failed after {result.attempts} attempts")
+
+        print(f"Workers utilization: {pool.utilization(batch_size)}")
 
 
 @cli.command()
 @click.argument("github_key", type=str)
-@click.option("--path", default=SELECTED_REPOS_FILE, type=click.Path())
+@click.option("--path", default=SELECTED_REPOS_FILE, type=click.Path(path_type=Path))
 @click.option("--url", default="scikit-learn/scikit-learn", type=str)
 @click.option("--limit_stargazers", default=1000, type=int)
-def write_stargazers_repos(github_key: str, path: Path, url: str, limit_stargazers: int) -> None:
+@click.option("--max_user_stars", default=300, type=int)
+@click.option("--n_workers", default=8, type=int)
+@click.option("--api_url", default=GITHUB_API_URL, type=str)
+@click.option("--resume/--no-resume", default=True)
+@click.option("--checkpoints_path", default=CHECKPOINTS_FILE, type=click.Path(path_type=Path))
+@click.option("--etag_cache_path", default=GITHUB_CACHE_FILE, type=click.Path(path_type=Path))
+def write_stargazers_repos(github_key: str,
+                           path: Path,
+                           url: str,
+                           limit_stargazers: int,
+                           max_user_stars: int,
+                           n_workers: int,
+                           api_url: str,
+                           resume: bool,
+                           checkpoints_path: Path,
+                           etag_cache_path: Path) -> None:
     """
     Method to look through most popular repos' stargazers' repositories
     :param limit_stargazers: maximum number of stargazers parsed
     :param path: where to write info about stargazers' repos
     :param url: url of repo from which to look through stargazers
     :param github_key: your GitHub key to get access to GitHubApi
+    :param max_user_stars: limit of repos taken from each stargazer
+    :param n_workers: number of concurrent requests to GitHub API
+    :param api_url: url of GitHub API
+    :param resume: skip stargazers crawled by previous runs into the same path with the same checkpoints file
+    :param checkpoints_path: path to file with crawled stargazers
+    :param etag_cache_path: path to file with cached GitHub responses for conditional requests
     :return:
     """
-    content = get_stargazer_info(url, github_key, limit_stargazers=limit_stargazers)
-    for line in content:
-        file_writer(line, path)
+    stats = get_stargazer_info(url, github_key, path, max_user_stars, limit_stargazers=limit_stargazers,
+                               n_workers=n_workers, api_url=api_url,
+                               checkpoints_path=checkpoints_path if resume else None,
+                               etag_cache_path=etag_cache_path)
+    print(f"Stargazers: {stats}")
 
 
 @cli.command()
-@click.option("--json_path", default=COMMITS_INFO_FILE, type=click.Path())
-@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path())
-@click.option("--temp_repo_path", default=TEMP_REPOS_FOLDER, type=click.Path())
+@click.argument("paths", nargs=-1, type=click.Path(path_type=Path))
+@click.option("--summary_path", default=TOP_REPOS_SUMMARY_FILE, type=click.Path(path_type=Path))
+@click.option("--capacity", default=10000, type=int)
+@click.option("--n_top_repos", default=20, type=int)
+@click.option("--merge/--no-merge", default=False)
+def write_top_repos_summary(paths: List[Path], summary_path: Path, capacity: int, n_top_repos: int,
+                            merge: bool) -> None:
+    """
+    Counts repositories of stargazer crawl files in bounded memory. Crawl files and summaries are merged
+    into summary_path, which can be passed as repos_file_path to the other commands
+
+    :param paths: files written by write_stargazers_repos or summaries, default is selected repos file
+    :param summary_path: where to store the summary, it is rebuilt from paths unless merge is set
+    :param capacity: number of repositories counted by the summary
+    :param n_top_repos: number of top repositories printed
+    :param merge: merge paths into existing summary, they must not be counted in it already
+    :return: None
+    """
+    paths = list(paths) or [SELECTED_REPOS_FILE]
+    if merge and summary_path.exists():
+        paths.append(summary_path)
+    summary = count_top_repos(paths, capacity)
+    summary.save(summary_path)
+
+    print(f"{summary.total} lines, counts are overestimated by at most {summary.error_bound():.1f}")
+    guaranteed = {repo for repo, _ in summary.guaranteed_top(n_top_repos)}
+    for repo, count in summary.top(n_top_repos):
+        print(f"{count}\t{repo}{'' if repo in guaranteed else ' (not guaranteed)'}")
+
+
+@cli.command()
+@click.option("--json_path", default=COMMITS_INFO_FILE, type=click.Path(path_type=Path))
+@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path(path_type=Path))
+@click.option("--temp_repo_path", default=TEMP_REPOS_FOLDER, type=click.Path(path_type=Path))
 @click.option("--supported_languages", default=["python", "java", "javascript"], multiple=True)
 @click.option("--n_jobs", default=-1, type=int)
+@click.option("--clone_strategy", default="full", type=click.Choice(list(CLONE_STRATEGIES.keys())))
+@click.option("--clone_depth", default=None, type=int)
+@click.option("--mirror_path", default=None, type=click.Path(path_type=Path))
+@click.option("--mirror_budget_gb", default=50.0, type=float)
+@click.option("--diff_scoped/--no-diff_scoped", default=False)
+@click.option("--output_format", default="jsonl", type=click.Choice(["jsonl", *COLUMNAR_FORMATS.keys()]))
 def write_imports_variables(json_path: Path,
                             var_imp_path: Path,
                             temp_repo_path: Path,
                             supported_languages: List[str],
-                            n_jobs: int):
+                            n_jobs: int,
+                            clone_strategy: str,
+                            clone_depth: int,
+                            mirror_path: Path,
+                            mirror_budget_gb: float,
+                            diff_scoped: bool,
+                            output_format: str):
     """
     Method opens path with commits dataset and parses it in order to get variables
-    and imports of each author. It writes them
+    and imports of each author. It writes them, results of each repository as soon as it is parsed
     :param n_jobs: how many processes should operate task
+    :param clone_strategy: how to clone repositories: full, single_branch, shallow or blobless
+    :param clone_depth: number of commits to clone with shallow strategy, required by it
+    :param mirror_path: Path to folder with repositories mirrors kept between runs. Temporary clones are used if not set
+    :param mirror_budget_gb: maximum size of mirrors folder in gigabytes
+    :param diff_scoped: take only identifiers located in lines changed by each commit
+    :param output_format: jsonl or columnar format of var_imp_path (parquet or arrow dataset folder)
     :param var_imp_path: Where to store parsed results
     :param supported_languages: which programming languages should be overviewed
     :param temp_repo_path: path to folder, where temporaryDirectories for repositories should be created
-    :param json_path: path to dataset with commit_info files
+    :param json_path: path to dataset with commit_info files, either jsonl file or columnar dataset folder
     :return: None
     """
-    with json_path.open("r") as rf:
-        parsed_lines = (json.loads(line) for line in rf)
-        result = parallelize_extraction(str(temp_repo_path), parsed_lines, supported_languages, 300, n_jobs)
+    parsed_lines = read_repos_records(json_path, PARSE_COLUMNS)
+    result = parallelize_extraction(str(temp_repo_path), parsed_lines, supported_languages, n_jobs,
+                                    clone_strategy, clone_depth,
+                                    mirror_path if mirror_path is None else str(mirror_path),
+                                    int(mirror_budget_gb * GIGABYTE), diff_scoped=diff_scoped)
 
-        with var_imp_path.open("a") as af:
+    if output_format != "jsonl":
+        dataset_path = get_dataset_path(var_imp_path, output_format)
+        with ColumnarWriter(dataset_path, "variables_imports", output_format) as writer:
             for repo_line_result in result:
-                write_down_content(repo_line_result, af)
+                for record in repo_line_result:
+                    writer.write(record)
+        return
+
+    with var_imp_path.open("a") as af:
+        for repo_line_result in result:
+            write_down_content(repo_line_result, af)
+
+
+@cli.command()
+@click.option("--repos_file_path", default=SELECTED_REPOS_FILE, type=click.Path(path_type=Path))
+@click.option("--temp_repo_path", default=TEMP_REPOS_FOLDER, type=click.Path(path_type=Path))
+@click.option("--commits_info_path", default=COMMITS_INFO_FILE, type=click.Path(path_type=Path))
+@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path(path_type=Path))
+@click.option("--supported_languages", default=["python", "java", "javascript"], multiple=True)
+@click.option("--start_repo", default=0, type=int)
+@click.option("--commits_number", default=100, type=int)
+@click.option("--n_jobs", default=-1, type=int)
+@click.option("--language_detector", default=DEFAULT_DETECTOR, type=click.Choice(list(DETECTORS.keys())))
+@click.option("--clone_strategy", default="full", type=click.Choice(list(CLONE_STRATEGIES.keys())))
+@click.option("--clone_depth", default=None, type=int)
+@click.option("--mirror_path", default=None, type=click.Path(path_type=Path))
+@click.option("--mirror_budget_gb", default=50.0, type=float)
+@click.option("--incremental/--no-incremental", default=False)
+@click.option("--checkpoints_path", default=CHECKPOINTS_FILE, type=click.Path(path_type=Path))
+@click.option("--repo_timeout", default=None, type=float)
+@click.option("--retries", default=1, type=int)
+@click.option("--diff_scoped/--no-diff_scoped", default=False)
+@click.option("--output_format", default="jsonl", type=click.Choice(["jsonl", *COLUMNAR_FORMATS.keys()]))
+@click.option("--merge_policy", default="combined", type=click.Choice(MERGE_POLICIES))
+@click.option("--rename_threshold", default=RENAME_THRESHOLD, type=int)
+@click.option("--find_copies/--no-find_copies", default=False)
+@click.option("--filter_config", default=None, type=click.Path(exists=True, path_type=Path))
+def write_commits_imports_variables(repos_file_path: Path,
+                                    temp_repo_path: Path,
+                                    commits_info_path: Path,
+                                    var_imp_path: Path,
+                                    supported_languages: List[str],
+                                    start_repo: int,
+                                    commits_number: int,
+                                    n_jobs: int,
+                                    language_detector: str,
+                                    clone_strategy: str,
+                                    clone_depth: int,
+                                    mirror_path: Path,
+                                    mirror_budget_gb: float,
+                                    incremental: bool,
+                                    checkpoints_path: Path,
+                                    repo_timeout: float,
+                                    retries: int,
+                                    diff_scoped: bool,
+                                    output_format: str,
+                                    merge_policy: str,
+                                    rename_threshold: int,
+                                    find_copies: bool,
+                                    filter_config: Path) -> None:
+    """
+    Single-pass version of write_repo_commits and write_imports_variables: each repository is cloned
+    and walked once, every changed blob is language-defined, diff-counted and parsed in the same visit.
+    Writes commits info to commits_info_path and variables and imports to var_imp_path.
+    Repositories order and retries are the same as in write_repo_commits
+
+    :param supported_languages: which programming languages should be parsed
+    :param start_repo: number of repositories to skip
+    :param var_imp_path: Where to store parsed results
+    :param commits_number: max number of commits info entities in each repository
+    :param diff_scoped: take only identifiers located in lines changed by each commit
+    Other parameters are the same as in write_repo_commits, start_repo replaces its start_batch and batch_size
+    :return: None
+    """
+    supported_languages = list(supported_languages)
+    repos = [elem[0] for elem in get_top_repos(repos_file_path, 150)][start_repo:]
+
+    repos.sort(key=get_repo_size_estimator(mirror_path, REPO_SIZES_FILE), reverse=True)
+
+    with StreamWriter(commits_info_path, output_format=output_format, schema_name="commits_info") as commits_writer, \
+            StreamWriter(var_imp_path, output_format=output_format, schema_name="variables_imports",
+                         next_writer=commits_writer) as variables_writer, \
+            WorkerPool(n_jobs, timeout=repo_timeout, retries=retries,
+                       initializer=RepoParser.load_parsers, initargs=(supported_languages,)) as pool:
+        sink = FusedSink(commits_writer.sink, variables_writer.sink)
+        repo_operator = get_repo_operator(str(temp_repo_path),
+                                          mirror_path if mirror_path is None else str(mirror_path),
+                                          int(mirror_budget_gb * GIGABYTE),
+                                          clone_strategy,
+                                          clone_depth,
+                                          sink=sink,
+                                          sizes_path=REPO_SIZES_FILE)
+        arguments = (commits_number, supported_languages, language_detector, LANGUAGES_CACHE_FILE,
+                     checkpoints_path if incremental else None, diff_scoped, merge_policy, rename_threshold,
+                     find_copies, filter_config or DEFAULT_FILTER_CONFIG, True)
+
+        tasks = ((repo, {"url": repo, "operation": extract_repo_commits_variables, "arguments": arguments})
+                 for repo in repos)
+        for result in tqdm(pool.run(repo_operator, tasks), total=len(repos), desc="Repositories"):
+            if result.failed:
+                print(f"{result.key} failed after {result.attempts} attempts")
+
+        print(f"Workers utilization: {pool.utilization()}")
+
+
+@cli.command()
+@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path(path_type=Path))
+@click.option("--commits_info_path", default=COMMITS_INFO_FILE, type=click.Path(path_type=Path))
+@click.option("--similar_path", default=SIMILAR_DEVELOPERS_FILE, type=click.Path(path_type=Path))
+@click.option("--top_k", default=10, type=int)
+@click.option("--language_weight", default=0.2, type=float)
+@click.option("--max_df", default=0.5, type=float)
+@click.option("--memory_budget_mb", default=512, type=int)
+def write_similar_developers(var_imp_path: Path,
+                             commits_info_path: Path,
+                             similar_path: Path,
+                             top_k: int,
+                             language_weight: float,
+                             max_df: float,
+                             memory_budget_mb: int) -> None:
+    """
+    Finds top_k most similar developers for every author by cosine similarity of TF-IDF weighted
+    imports and variables combined with shares of programming languages in changed lines
+
+    :param var_imp_path: path to variables and imports, jsonl file or columnar dataset
+    :param commits_info_path: path to commits info, languages are not used if it doesn't exist
+    :param similar_path: where to store similar developers
+    :param top_k: number of similar developers for each author
+    :param language_weight: weight of languages similarity, identifiers similarity gets the rest
+    :param max_df: identifiers used by more than this share of authors are ignored
+    :param memory_budget_mb: memory for similarities computed at once
+    :return: None
+    """
+    commits_records = read_records(commits_info_path, ["author_name", "programming_language",
+                                                       "added_lines_num", "deleted_lines_num"]) \
+        if commits_info_path.exists() else []
+    authors, features = build_author_features(read_records(var_imp_path, ["author", "imports", "variables"]),
+                                              commits_records, language_weight, max_df)
+
+    similar_path.parent.mkdir(parents=True, exist_ok=True)
+    with similar_path.open("w") as wf:
+        for record in tqdm(get_similar_developers(authors, features, top_k, memory_budget_mb * MEGABYTE),
+                           total=len(authors), desc="Authors"):
+            wf.write(json.dumps(record) + "\n")
+
+
+@cli.command()
+@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path(path_type=Path))
+@click.option("--index_path", default=DEVELOPER_INDEX_FOLDER, type=click.Path(path_type=Path))
+@click.option("--dimension", default=DEFAULT_DIMENSION, type=int)
+@click.option("--max_links", default=16, type=int)
+@click.option("--ef_construction", default=100, type=int)
+def write_developer_index(var_imp_path: Path,
+                          index_path: Path,
+                          dimension: int,
+                          max_links: int,
+                          ef_construction: int) -> None:
+    """
+    Adds developers of variables and imports file to approximate nearest neighbour index.
+    If the index already exists, it is updated: identifiers of known developers are added to their previous ones,
+    so the command can be run for every new batch of repositories
+
+    :param var_imp_path: path to variables and imports, jsonl file or columnar dataset
+    :param index_path: path to index folder
+    :param dimension: dimension of developers embeddings, used only when the index is created
+    :param max_links: number of links of HNSW graph nodes, used only when the index is created
+    :param ef_construction: width of search when developer is inserted, used only when the index is created
+    :return: None
+    """
+    if (index_path / "meta.json").exists():
+        index = DeveloperIndex.load(index_path)
+    else:
+        index = DeveloperIndex(dimension, max_links=max_links, ef_construction=ef_construction)
+
+    updated = index.update_records(read_records(var_imp_path, ["author", "imports", "variables"]))
+    index.save(index_path)
+    print(f"Updated {updated} developers, {len(index)} developers in the index")
+
+
+@cli.command()
+@click.argument("author", type=str)
+@click.option("--index_path", default=DEVELOPER_INDEX_FOLDER, type=click.Path(path_type=Path))
+@click.option("--top_k", default=10, type=int)
+@click.option("--ef_search", default=None, type=int)
+def query_similar_developers(author: str, index_path: Path, top_k: int, ef_search: int) -> None:
+    """
+    Prints developers similar to the given one, found in index written by write_developer_index
+
+    :param author: name of developer
+    :param index_path: path to index folder
+    :param top_k: number of similar developers
+    :param ef_search: width of search, higher is slower and more accurate
+    :return: None
+    """
+    index = DeveloperIndex.load(index_path)
+    if author not in index.hnsw:
+        print(f"{author} is not in the index")
+        return
+    for neighbour, similarity in index.similar(author, top_k, ef_search):
+        print(f"{similarity:.4f}\t{neighbour}")
+
+
+@cli.command()
+@click.option("--var_imp_path", default=VARIABLES_IMPORTS_FILE, type=click.Path(path_type=Path))
+@click.option("--sketches_path", default=DEVELOPER_SKETCHES_FILE, type=click.Path(path_type=Path))
+@click.option("--num_perm", default=128, type=int)
+def write_developer_sketches(var_imp_path: Path, sketches_path: Path, num_perm: int) -> None:
+    """
+    Turns identifiers of every developer into MinHash signature. If sketches file already exists,
+    new signatures are merged into it, so repositories can be sketched batch by batch
+
+    :param var_imp_path: path to variables and imports, jsonl file or columnar dataset
+    :param sketches_path: path to npz file with signatures
+    :param num_perm: length of signatures, used only when the file is created
+    :return: None
+    """
+    sketches = AuthorSketches.load(sketches_path) if sketches_path.exists() else AuthorSketches(num_perm)
+    sketches.update_records(read_records(var_imp_path, ["author", "imports", "variables"]))
+    sketches.save(sketches_path)
+    print(f"{len(sketches)} developers are sketched")
+
+
+@cli.command()
+@click.option("--sketches_path", default=DEVELOPER_SKETCHES_FILE, type=click.Path(path_type=Path))
+@click.option("--pairs_path", default=CANDIDATE_PAIRS_FILE, type=click.Path(path_type=Path))
+@click.option("--threshold", default=0.5, type=float)
+@click.option("--max_bucket_size", default=1000, type=int)
+def write_candidate_pairs(sketches_path: Path, pairs_path: Path, threshold: float, max_bucket_size: int) -> None:
+    """
+    Finds pairs of developers with similar identifier sets by LSH banding of their signatures
+
+    :param sketches_path: path to npz file written by write_developer_sketches
+    :param pairs_path: where to store pairs
+    :param threshold: minimum estimated Jaccard similarity of developers identifiers
+    :param max_bucket_size: LSH buckets with more developers are skipped
+    :return: None
+    """
+    pairs_path.parent.mkdir(parents=True, exist_ok=True)
+    with pairs_path.open("w") as wf:
+        for pair in similar_pairs(AuthorSketches.load(sketches_path), threshold, max_bucket_size):
+            wf.write(json.dumps(pair) + "\n")
+
+
+@cli.command()
+@click.option("--index_path", default=DEVELOPER_INDEX_FOLDER, type=click.Path(path_type=Path))
+@click.option("--commits_info_path", default=COMMITS_INFO_FILE, type=click.Path(path_type=Path))
+@click.option("--host", default="127.0.0.1", type=str)
+@click.option("--port", default=8000, type=int)
+@click.option("--socket_path", default=None, type=click.Path(path_type=Path))
+@click.option("--cache_size", default=10000, type=int)
+@click.option("--max_batch_size", default=64, type=int)
+@click.option("--max_wait_ms", default=2.0, type=float)
+def serve(index_path: Path,
+          commits_info_path: Path,
+          host: str,
+          port: int,
+          socket_path: Path,
+          cache_size: int,
+          max_batch_size: int,
+          max_wait_ms: float) -> None:
+    """
+    Starts local HTTP service answering similar developers queries:
+    GET /similar?author=X&k=10&language=python&repo=url and GET /stats
+
+    :param index_path: path to index folder written by write_developer_index, it is memory-mapped
+    :param commits_info_path: path to commits info used by language and repository filters,
+            filters match nothing if it doesn't exist
+    :param host: host of HTTP server
+    :param port: port of HTTP server
+    :param socket_path: path of Unix socket to listen to instead of host and port
+    :param cache_size: number of query results kept in memory
+    :param max_batch_size: maximum number of queries executed at once
+    :param max_wait_ms: time to wait for more queries of batch
+    :return: None
+    """
+    metadata = collect_author_metadata(read_records(commits_info_path,
+                                                    ["author_name", "programming_language", "repo_url"])) \
+        if commits_info_path.exists() else {}
+    service = SimilarityService(DeveloperIndex.load(index_path), metadata, cache_size, max_batch_size,
+                                max_wait_ms / 1e3)
+
+    with make_server(service, host, port, socket_path) as server:
+        print(f"Serving {len(service.index)} developers on {socket_path or f'http://{host}:{server.server_port}'}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,280 @@
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+TERMINATE_TIMEOUT = 30  # seconds given to terminated worker to clean up before it is killed
+
+
+class TaskResult(object):
+    """
+    Result of one task executed by WorkerPool
+    """
+
+    def __init__(self, key: Any, value: Any = None, error: Union[str, None] = None,
+                 attempts: int = 0, duration: float = 0.0):
+        """
+        :param key: key of task given to WorkerPool.run
+        :param value: value returned by function, None if task failed
+        :param error: traceback of exception or timeout message, None if task succeeded
+        :param attempts: number of times task was started
+        :param duration: seconds spent on the last attempt
+        """
+        self.key = key
+        self.value = value
+        self.error = error
+        self.attempts = attempts
+        self.duration = duration
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+def effective_n_jobs(n_jobs: int) -> int:
+    """
+    Number of processes in the same way as joblib counts it: -1 is all CPUs, -2 is all CPUs but one, etc.
+
+    :param n_jobs: requested number of processes
+    :return: positive number of processes
+    """
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def _worker_loop(connection: Connection, initializer: Union[Callable, None], initargs: Tuple) -> None:
+    """
+    Body of worker process: receives (task_id, function, kwargs), sends back (task_id, value, error).
+    None message stops worker. Worker terminated on timeout exits through SystemExit,
+    so context managers of the cancelled task (e.g. temporary folders of clones) are cleaned up
+    """
+    signal.signal(signal.SIGTERM, _exit_on_terminate)
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        task_id, function, kwargs = message
+        try:
+            connection.send((task_id, function(**kwargs), None))
+        except Exception:
+            connection.send((task_id, None, traceback.format_exc()))
+
+
+def _exit_on_terminate(signum: int, frame: Any) -> None:
+    raise SystemExit(f"Terminated by signal {signum}")
+
+
+class WorkerPool(object):
+    """
+    Persistent pool of processes. Each worker gets a new task as soon as it finishes the previous one,
+    so one long task doesn't keep other workers idle. Tasks that exceed timeout are cancelled by
+    restarting their worker and retried. Pool collects busy time of workers to report utilization
+    """
+
+    def __init__(self,
+                 n_jobs: int = -1,
+                 timeout: Union[float, None] = None,
+                 retries: int = 0,
+                 initializer: Union[Callable, None] = None,
+                 initargs: Tuple = ()):
+        """
+        :param n_jobs: number of worker processes, negative values are counted as in joblib
+        :param timeout: maximum number of seconds for one task attempt, None for unlimited
+        :param retries: number of additional attempts for failed or timed out task
+        :param initializer: function called once in each worker process when it starts
+        :param initargs: arguments of initializer
+        """
+        self.n_jobs = effective_n_jobs(n_jobs)
+        self.timeout = timeout
+        self.retries = retries
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self.busy_time = 0.0
+        self.wall_time = 0.0
+        self.durations: List[float] = []  # durations of finished tasks in order they were given
+        self._run_durations: Dict[int, float] = {}
+
+        self._workers: Dict[int, Tuple[multiprocessing.Process, Connection]] = {}
+        self._next_worker_id = 0
+
+    def __enter__(self) -> "WorkerPool":
+        for _ in range(self.n_jobs):
+            self._start_worker()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for worker_id in list(self._workers):
+            process, connection = self._workers.pop(worker_id)
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+
+    def run(self, function: Callable, tasks: Iterable[Tuple[Any, Dict]]) -> Iterator[TaskResult]:
+        """
+        Executes function(**kwargs) for each task in workers. Tasks are started in the given order,
+        so the largest ones should go first. Results are given in order of completion.
+        Tasks are taken from the iterable only when a worker is idle, so it can be a lazy generator
+
+        :param function: picklable function
+        :param tasks: iterable of (key, kwargs), key identifies task in results
+        :return: Iterator of TaskResult
+        """
+        if not self._workers:
+            self.__enter__()
+
+        pending = ((task_id, key, kwargs) for task_id, (key, kwargs) in enumerate(tasks))
+        queue = deque()  # retried tasks, they go before pending ones
+        attempts: Dict[int, int] = {}
+        running: Dict[int, Tuple[int, Any, Dict, float]] = {}  # worker_id : (task_id, key, kwargs, start time)
+        start = time.monotonic()
+        self._run_durations = {}
+
+        while True:
+            for worker_id in self._workers:  # idle workers take next tasks
+                if worker_id in running:
+                    continue
+                task = queue.popleft() if queue else next(pending, None)
+                if task is None:
+                    break
+                task_id, key, kwargs = task
+                attempts[task_id] = attempts.get(task_id, 0) + 1
+                self._workers[worker_id][1].send((task_id, function, kwargs))
+                running[worker_id] = (task_id, key, kwargs, time.monotonic())
+            if not running:  # all the tasks are taken and finished
+                break
+
+            connections = {self._workers[worker_id][1]: worker_id for worker_id in running}
+            for connection in wait(list(connections), timeout=self._poll_interval(running)):
+                worker_id = connections[connection]
+                task_id, key, kwargs, started = running.pop(worker_id)
+                try:
+                    _, value, error = connection.recv()
+                except (EOFError, OSError):  # worker died, e.g. killed by OOM
+                    value, error = None, "Worker process died"
+                    self._restart_worker(worker_id)
+
+                result = self._finish(task_id, key, kwargs, started, attempts[task_id], value, error, queue)
+                if result is not None:
+                    yield result
+
+            if self.timeout is None:
+                continue
+            for worker_id, (task_id, key, kwargs, started) in list(running.items()):
+                if time.monotonic() - started > self.timeout:
+                    running.pop(worker_id)
+                    self._restart_worker(worker_id)
+                    result = self._finish(task_id, key, kwargs, started, attempts[task_id],
+                                          None, f"Timeout after {self.timeout} seconds", queue)
+                    if result is not None:
+                        yield result
+
+        self.wall_time += time.monotonic() - start
+        self.durations.extend(duration for _, duration in sorted(self._run_durations.items()))
+
+    def utilization(self, batch_size: Union[int, None] = None) -> Dict[str, float]:
+        """
+        Reports how busy workers were. If batch_size is given, also estimates how long the same tasks
+        would take if they were run in fixed batches in the given order, each batch waiting for its slowest task
+
+        :param batch_size: size of batch to compare with
+        :return: dict with wall_time, busy_time, utilization and batch estimations
+        """
+        report = {"workers": self.n_jobs,
+                  "tasks": len(self.durations),
+                  "wall_time": self.wall_time,
+                  "busy_time": self.busy_time,
+                  "utilization": self.busy_time / (self.wall_time * self.n_jobs) if self.wall_time else 0.0}
+
+        if batch_size:
+            batches_time = sum(schedule_length(self.durations[i:i + batch_size], self.n_jobs)
+                               for i in range(0, len(self.durations), batch_size))
+            report["batches_wall_time"] = batches_time
+            report["batches_utilization"] = self.busy_time / (batches_time * self.n_jobs) if batches_time else 0.0
+        return report
+
+    def _finish(self, task_id: int, key: Any, kwargs: Dict, started: float, attempt: int,
+                value: Any, error: Union[str, None], queue: deque) -> Union[TaskResult, None]:
+        """
+        Registers finished attempt. Failed task is put back to queue if it has retries left
+
+        :return: TaskResult or None if task is retried
+        """
+        duration = time.monotonic() - started
+        self.busy_time += duration
+
+        if error is not None and attempt <= self.retries:
+            logger.warning(f"Task {key} failed on attempt {attempt}, retrying: {error.splitlines()[-1]}")
+            queue.append((task_id, key, kwargs))
+            return None
+
+        self._run_durations[task_id] = duration
+        if error is not None:
+            logger.error(f"Task {key} failed: {error}")
+        return TaskResult(key, value, error, attempt, duration)
+
+    def _poll_interval(self, running: Dict) -> Union[float, None]:
+        if self.timeout is None:
+            return None
+        deadline = min(started for _, _, _, started in running.values()) + self.timeout
+        return max(0.0, deadline - time.monotonic())
+
+    def _start_worker(self) -> int:
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker_loop,
+                                          args=(child_connection, self.initializer, self.initargs),
+                                          daemon=True)
+        process.start()
+        child_connection.close()
+
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        self._workers[worker_id] = (process, parent_connection)
+        return worker_id
+
+    def _restart_worker(self, worker_id: int) -> int:
+        process, connection = self._workers.pop(worker_id)
+        process.terminate()
+        process.join(timeout=TERMINATE_TIMEOUT)  # task cleans up its files on termination
+        if process.is_alive():
+            process.kill()
+            process.join()
+        connection.close()
+        return self._start_worker()
+
+
+def schedule_length(durations: List[float], n_workers: int) -> float:
+    """
+    Time of running tasks in the given order when each free worker takes the next task
+
+    :param durations: durations of tasks
+    :param n_workers: number of workers
+    :return: time when the last task finishes
+    """
+    finish_times = [0.0] * n_workers
+    for duration in durations:
+        worker = finish_times.index(min(finish_times))
+        finish_times[worker] += duration
+    return max(finish_times)
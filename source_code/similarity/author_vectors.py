@@ -0,0 +1,213 @@
+import logging
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix, hstack
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+MEGABYTE = 2 ** 20
+# worst case memory of one similarity in a block product: float64 value, int32 index and scipy temporaries
+BYTES_PER_SIMILARITY = 24
+
+
+class AuthorIndex(object):
+    """
+    Assigns consecutive ids to authors and tokens, so they can be used as rows and columns of sparse matrices
+    """
+
+    def __init__(self):
+        self.authors: Dict[str, int] = {}
+        self.tokens: Dict[str, int] = {}
+
+    def author_id(self, author: str) -> int:
+        return self.authors.setdefault(author, len(self.authors))
+
+    def token_id(self, token: str) -> int:
+        return self.tokens.setdefault(token, len(self.tokens))
+
+    def author_names(self) -> List[str]:
+        return list(self.authors)
+
+
+def count_author_tokens(records: Iterable[Dict], index: AuthorIndex, chunk_size: int = 1000000) -> csr_matrix:
+    """
+    Builds author×token matrix of token usages from variables_imports records.
+    Imports and variables are different tokens even if they have the same name.
+    Usages are compressed every chunk_size entries, so memory depends on the number of distinct pairs only
+
+    :param records: dicts {"author", "imports", "variables"}
+    :param index: ids of authors and tokens, filled by this function
+    :param chunk_size: number of usages kept uncompressed
+    :return: csr matrix of counts, rows are index.authors, columns are index.tokens
+    """
+    rows, columns = array("i"), array("i")
+    chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def compress() -> None:
+        if not rows:
+            return
+        chunk = coo_matrix((np.ones(len(rows)), (np.frombuffer(rows, np.int32), np.frombuffer(columns, np.int32))))
+        chunk.sum_duplicates()
+        chunks.append((chunk.row, chunk.col, chunk.data))
+        del rows[:], columns[:]
+
+    for record in records:
+        author = index.author_id(record["author"])
+        for q_type in ["imports", "variables"]:
+            for token in record.get(q_type) or []:
+                rows.append(author)
+                columns.append(index.token_id(f"{q_type}:{token}"))
+        if len(rows) >= chunk_size:
+            compress()
+    compress()
+
+    shape = (len(index.authors), len(index.tokens))
+    if not chunks:
+        return csr_matrix(shape)
+    return coo_matrix((np.concatenate([chunk[2] for chunk in chunks]),
+                       (np.concatenate([chunk[0] for chunk in chunks]),
+                        np.concatenate([chunk[1] for chunk in chunks]))), shape=shape).tocsr()
+
+
+def count_author_languages(records: Iterable[Dict], index: AuthorIndex) -> csr_matrix:
+    """
+    Builds author×language matrix of changed lines from commits_info records
+
+    :param records: dicts {"author_name", "programming_language", "added_lines_num", "deleted_lines_num"}
+    :param index: ids of authors, filled by this function
+    :return: csr matrix of changed lines, rows are index.authors, columns are ids of languages
+    """
+    languages: Dict[str, int] = {}
+    rows, columns, lines = array("i"), array("i"), array("d")
+    for record in records:
+        rows.append(index.author_id(record["author_name"]))
+        columns.append(languages.setdefault(record["programming_language"], len(languages)))
+        lines.append(record.get("added_lines_num", 0) + record.get("deleted_lines_num", 0) + 1)
+
+    return coo_matrix((np.frombuffer(lines), (np.frombuffer(rows, np.int32), np.frombuffer(columns, np.int32))),
+                      shape=(len(index.authors), len(languages))).tocsr()
+
+
+def tf_idf(counts: csr_matrix, max_df: float = 0.5) -> csr_matrix:
+    """
+    Weights token counts with sublinear TF-IDF. Tokens used by more than max_df share of authors
+    (e.g. "print") don't distinguish developers and make similarity products dense, so they are dropped
+
+    :param counts: author×token matrix of counts
+    :param max_df: maximum share of authors using token
+    :return: csr matrix of weights
+    """
+    n_authors = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + n_authors) / (1 + document_frequency)) + 1
+    idf[document_frequency > max_df * n_authors] = 0
+
+    weights = counts.copy().astype(np.float64)
+    weights.data = np.log1p(weights.data) * idf[weights.indices]
+    weights.eliminate_zeros()
+    return weights
+
+
+def normalize_rows(matrix: csr_matrix, norm: str = "l2") -> csr_matrix:
+    """
+    :param matrix: csr matrix
+    :param norm: "l1" or "l2"
+    :return: matrix with rows of unit norm, zero rows stay zero
+    """
+    matrix = matrix.tocsr(copy=True).astype(np.float64)
+    matrix.eliminate_zeros()
+    values = np.abs(matrix.data) if norm == "l1" else matrix.data ** 2
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    norms = np.bincount(rows, weights=values, minlength=matrix.shape[0])
+    if norm == "l2":
+        norms = np.sqrt(norms)
+    matrix.data /= norms[rows]
+    return matrix
+
+
+def build_author_features(variables_records: Iterable[Dict],
+                          commits_records: Iterable[Dict] = (),
+                          language_weight: float = 0.2,
+                          max_df: float = 0.5) -> Tuple[List[str], csr_matrix]:
+    """
+    Builds unit author vectors, so dot product of two vectors is weighted sum of cosine similarities
+    of their TF-IDF identifiers and of their language shares
+
+    :param variables_records: records of variables_imports dataset
+    :param commits_records: records of commits_info dataset
+    :param language_weight: weight of languages similarity, identifiers get the rest
+    :param max_df: see tf_idf
+    :return: (names of authors, csr matrix with one row per author)
+    """
+    index = AuthorIndex()
+    tokens = normalize_rows(tf_idf(count_author_tokens(variables_records, index), max_df))
+    languages = count_author_languages(commits_records, index)
+    languages = normalize_rows(normalize_rows(languages, "l1"))  # shares of languages as unit vector
+
+    n_authors = len(index.authors)
+    tokens.resize((n_authors, tokens.shape[1]))  # authors found only in commits have no identifiers
+    features = hstack([tokens * np.sqrt(1 - language_weight), languages * np.sqrt(language_weight)], format="csr")
+    logger.log(2, f"\tAuthor features: {n_authors} authors, {len(index.tokens)} tokens, {features.nnz} values")
+    return index.author_names(), normalize_rows(features)
+
+
+def get_block_size(n_authors: int, memory_budget: int) -> int:
+    """
+    :param n_authors: number of authors
+    :param memory_budget: maximum size of one block of similarities in bytes
+    :return: number of authors whose similarities with all the others fit memory budget even if they are dense
+    """
+    return max(1, memory_budget // (BYTES_PER_SIMILARITY * max(n_authors, 1)))
+
+
+def top_k_neighbours(features: csr_matrix,
+                     k: int = 10,
+                     memory_budget: int = 512 * MEGABYTE) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Finds k most similar authors for every author with exact cosine similarity. Similarities are computed
+    with sparse matrix product of a block of rows and all the rows, block size is chosen to fit memory budget
+
+    :param features: csr matrix of unit author vectors
+    :param k: number of neighbours
+    :param memory_budget: maximum size of one block of similarities in bytes
+    :return: Iterator of (author id, ids of neighbours, similarities) sorted by decreasing similarity
+    """
+    n_authors = features.shape[0]
+    block_size = get_block_size(n_authors, memory_budget)
+    transposed = features.T.tocsr()
+
+    for start in range(0, n_authors, block_size):
+        similarities = (features[start:start + block_size] @ transposed).tocsr()
+        for row in range(similarities.shape[0]):
+            begin, end = similarities.indptr[row], similarities.indptr[row + 1]
+            neighbours, scores = similarities.indices[begin:end], similarities.data[begin:end]
+
+            others = (neighbours != start + row) & (scores > 0)
+            neighbours, scores = neighbours[others], scores[others]
+            if len(scores) > k:
+                best = np.argpartition(-scores, k)[:k]
+                neighbours, scores = neighbours[best], scores[best]
+
+            order = np.argsort(-scores, kind="stable")
+            yield start + row, neighbours[order], scores[order]
+
+
+def get_similar_developers(authors: List[str],
+                           features: csr_matrix,
+                           k: int = 10,
+                           memory_budget: int = 512 * MEGABYTE) -> Iterator[Dict]:
+    """
+    :param authors: names of authors in order of features rows
+    :param features: csr matrix of unit author vectors, see build_author_features
+    :param k: number of neighbours
+    :param memory_budget: maximum size of one block of similarities in bytes
+    :return: Iterator of dicts {"author": str, "neighbours": [{"author": str, "score": float}]}
+    """
+    for author, neighbours, scores in top_k_neighbours(features, k, memory_budget):
+        yield {"author": authors[author],
+               "neighbours": [{"author": authors[neighbour], "score": round(float(score), 6)}
+                              for neighbour, score in zip(neighbours, scores)]}
@@ -0,0 +1,135 @@
+import hashlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from source_code.similarity.hnsw import grow, HNSWIndex, save_array
+
+DEFAULT_DIMENSION = 256
+
+
+@lru_cache(maxsize=2 ** 20)
+def token_hash(token: str) -> int:
+    """
+    Python hash of strings is randomized between processes, so tokens are hashed with blake2b
+    to keep embeddings of different runs comparable
+
+    :param token: token
+    :return: 64-bit unsigned hash
+    """
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def hash_counters(imports: Counter, variables: Counter, dimension: int = DEFAULT_DIMENSION) -> np.ndarray:
+    """
+    Signed feature hashing of identifiers counters, e.g. RepoParser.imports and RepoParser.variables.
+    The result is linear in counters, so counts of one author from different repositories can be summed
+
+    :param imports: Counter of imports
+    :param variables: Counter of variables
+    :param dimension: dimension of vector
+    :return: float32 vector of hashed counts
+    """
+    vector = np.zeros(dimension, np.float32)
+    for q_type, counter in [("imports", imports), ("variables", variables)]:
+        for token, count in counter.items():
+            hashed = token_hash(f"{q_type}:{token}")
+            vector[hashed % dimension] += count if hashed >> 63 else -count
+    return vector
+
+
+def embed(counts: np.ndarray) -> np.ndarray:
+    """
+    Sublinear scaling of hashed counts, so frequent identifiers don't hide the rare ones
+
+    :param counts: vectors of hashed counts, see hash_counters
+    :return: embeddings, they are normalized by the index
+    """
+    return np.sign(counts) * np.log1p(np.abs(counts))
+
+
+def collect_author_counters(records: Iterable[Dict]) -> Dict[str, Dict[str, Counter]]:
+    """
+    :param records: records of variables_imports dataset
+    :return: dict { author : {"imports": Counter, "variables": Counter} } counted like RepoParser counters
+    """
+    counters: Dict[str, Dict[str, Counter]] = {}
+    for record in records:
+        author = counters.setdefault(record["author"], {"imports": Counter(), "variables": Counter()})
+        author["imports"].update(record.get("imports") or [])
+        author["variables"].update(record.get("variables") or [])
+    return counters
+
+
+class DeveloperIndex(object):
+    """
+    Approximate nearest neighbour index of developers. Keeps hashed identifiers counts of every developer
+    near HNSW graph of their embeddings, so new repositories of a known developer update their embedding
+    instead of replacing it
+    """
+
+    def __init__(self, dimension: int = DEFAULT_DIMENSION, **hnsw_params):
+        """
+        :param dimension: dimension of embeddings
+        :param hnsw_params: parameters of HNSWIndex
+        """
+        self.hnsw = HNSWIndex(dimension, **hnsw_params)
+        self.counts = np.zeros((self.hnsw.vectors.shape[0], dimension), np.float32)
+
+    def __len__(self) -> int:
+        return len(self.hnsw)
+
+    def update(self, author: str, imports: Counter, variables: Counter) -> None:
+        """
+        Adds identifiers of author to the index
+
+        :param author: name of author
+        :param imports: Counter of imports
+        :param variables: Counter of variables
+        :return: None
+        """
+        node = self.hnsw.label_ids.get(author, len(self.hnsw))
+        self.counts = grow(self.counts, node + 1)
+        self.counts[node] += hash_counters(imports, variables, self.hnsw.dimension)
+        self.hnsw.add(author, embed(self.counts[node]))
+
+    def update_records(self, records: Iterable[Dict]) -> int:
+        """
+        :param records: records of variables_imports dataset
+        :return: number of updated authors
+        """
+        counters = collect_author_counters(records)
+        for author, author_counters in counters.items():
+            self.update(author, author_counters["imports"], author_counters["variables"])
+        return len(counters)
+
+    def similar(self, author: str, k: int = 10, ef: Union[int, None] = None) -> List[Tuple[str, float]]:
+        """
+        :param author: name of author present in the index
+        :param k: number of similar developers
+        :param ef: width of beam search, see HNSWIndex.search
+        :return: list of (author, cosine similarity) sorted by decreasing similarity, the author is excluded
+        """
+        found = self.hnsw.search(self.hnsw.vector(author), k + 1, ef)
+        return [(label, similarity) for label, similarity in found if label != author][:k]
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        save_array(path / "counts.npy", self.counts[:len(self)])
+        self.hnsw.save(path)
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode: Union[str, None] = "r") -> "DeveloperIndex":
+        """
+        :param path: path to folder written by save
+        :param mmap_mode: see HNSWIndex.load
+        :return: DeveloperIndex
+        """
+        index = cls.__new__(cls)
+        index.hnsw = HNSWIndex.load(path, mmap_mode)
+        index.counts = np.load(Path(path) / "counts.npy", mmap_mode=mmap_mode)[:len(index.hnsw)]
+        return index
@@ -0,0 +1,366 @@
+import heapq
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+META_FILE = "meta.json"
+MAX_LEVEL = 16
+
+
+def grow(array: np.ndarray, capacity: int, fill_value: Union[int, float] = 0) -> np.ndarray:
+    """
+    Gives writable in-memory array with the same content and at least capacity rows.
+    Arrays loaded with mmap are read-only, so they are copied on the first change
+
+    :param array: array, possibly memory-mapped
+    :param capacity: required number of rows
+    :param fill_value: value of new rows
+    :return: the same array if it is writable and big enough, otherwise a new one
+    """
+    if array.shape[0] >= capacity and array.flags.writeable:
+        return array
+    grown = np.full((max(capacity, 2 * array.shape[0]), *array.shape[1:]), fill_value, array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """
+    Writes npy file into temporary file and renames it, so processes that mmap the old file keep working
+    """
+    temp_path = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+
+class HNSWIndex(object):
+    """
+    Hierarchical navigable small world graph for approximate nearest neighbour search by cosine similarity
+    (Malkov and Yashunin, 2016). Every node is linked to its closest nodes on level 0 and on a random number
+    of upper levels, whose size decreases exponentially. Search descends greedily from the top level
+    and then runs beam search of width ef on level 0.
+
+    Vectors and level 0 links are fixed-width arrays, so the saved index is a folder of npy files
+    that can be memory-mapped: loading doesn't read the whole index and the page cache is shared by processes.
+    Links to nodes beyond the number of labels are ignored, they appear when index is loaded while it is saved
+    """
+
+    def __init__(self,
+                 dimension: int,
+                 max_links: int = 16,
+                 ef_construction: int = 100,
+                 ef_search: int = 50,
+                 capacity: int = 1024,
+                 seed: int = 0):
+        """
+        :param dimension: dimension of vectors
+        :param max_links: maximum number of links of node on upper levels, level 0 allows twice as many
+        :param ef_construction: width of beam search when node is inserted, higher is slower and more accurate
+        :param ef_search: default width of beam search for queries
+        :param capacity: number of nodes memory is allocated for, it grows when needed
+        :param seed: seed of random levels
+        """
+        self.dimension = dimension
+        self.max_links = max_links
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.seed = seed
+
+        self.vectors = np.zeros((capacity, dimension), np.float32)
+        self.links = np.full((capacity, 2 * max_links), -1, np.int32)
+        self.levels = np.zeros(capacity, np.int8)
+        self.upper_links: Dict[int, np.ndarray] = {}  # { node : array (level, max_links) of links on levels 1.. }
+        self.labels: List[str] = []
+        self.label_ids: Dict[str, int] = {}
+        self.entry_point = -1
+        self.max_level = -1
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.label_ids
+
+    def add(self, label: str, vector: np.ndarray) -> None:
+        """
+        Inserts vector into the graph. If the label is already present, its vector is replaced,
+        links to the node are removed and it is linked to its new neighbours
+
+        :param label: name of vector, e.g. author
+        :param vector: vector of index dimension, it is normalized
+        :return: None
+        """
+        vector = normalize(vector)
+        if label in self.label_ids:
+            node = self.label_ids[label]
+            self._reserve(len(self))
+            self._detach(node)
+            self.vectors[node] = vector
+            self._connect(node, int(self.levels[node]))
+            return
+
+        node = len(self.labels)
+        self._reserve(node + 1)
+        level = min(int(-np.log(1 - self._rng.random()) / np.log(self.max_links)), MAX_LEVEL)
+        self.vectors[node] = vector
+        self.levels[node] = level
+        if level > 0:
+            self.upper_links[node] = np.full((level, self.max_links), -1, np.int32)
+        self.labels.append(label)
+        self.label_ids[label] = node
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        self._connect(node, level)
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def search(self, vector: np.ndarray, k: int = 10, ef: Union[int, None] = None) -> List[Tuple[str, float]]:
+        """
+        :param vector: query vector
+        :param k: number of neighbours
+        :param ef: width of beam search, at least k. Default is ef_search
+        :return: list of (label, cosine similarity) sorted by decreasing similarity
+        """
+        if self.entry_point < 0:
+            return []
+        query = normalize(vector)
+        entry = self._descend(query, 0)
+        found = self._search_level(query, [entry], max(k, ef or self.ef_search), 0)
+        return [(self.labels[node], 1.0 - distance) for distance, node in found[:k]]
+
+    def vector(self, label: str) -> np.ndarray:
+        return np.array(self.vectors[self.label_ids[label]])
+
+    def save(self, path: Path) -> None:
+        """
+        Writes index into folder. Each file is replaced atomically and metadata is replaced last,
+        so arrays have at least as many rows as a reader takes from metadata. They may be newer than metadata,
+        links to nodes that are absent in it are ignored by reader
+
+        :param path: path to folder
+        :return: None
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        count = len(self)
+
+        upper_nodes = sorted(self.upper_links)
+        upper_rows = [self.upper_links[node] for node in upper_nodes]
+        save_array(path / "vectors.npy", self.vectors[:count])
+        save_array(path / "links.npy", self.links[:count])
+        save_array(path / "levels.npy", self.levels[:count])
+        save_array(path / "upper_links.npy", np.concatenate(upper_rows) if upper_rows
+                   else np.zeros((0, self.max_links), np.int32))
+
+        meta = {"dimension": self.dimension,
+                "max_links": self.max_links,
+                "ef_construction": self.ef_construction,
+                "ef_search": self.ef_search,
+                "seed": self.seed,
+                "entry_point": self.entry_point,
+                "max_level": self.max_level,
+                "labels": self.labels}
+        temp_meta = path / f".{META_FILE}.{os.getpid()}.tmp"
+        temp_meta.write_text(json.dumps(meta))
+        os.replace(temp_meta, path / META_FILE)
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode: Union[str, None] = "r") -> "HNSWIndex":
+        """
+        :param path: path to folder written by save
+        :param mmap_mode: "r" to memory-map vectors and links, None to read them into memory.
+                Memory-mapped index is copied into memory on the first insertion
+        :return: HNSWIndex
+        """
+        path = Path(path)
+        meta = json.loads((path / META_FILE).read_text())
+        count = len(meta["labels"])
+
+        index = cls(meta["dimension"], meta["max_links"], meta["ef_construction"], meta["ef_search"], 0,
+                    meta["seed"] + count)  # new nodes don't repeat levels of the first ones
+        index.vectors = np.load(path / "vectors.npy", mmap_mode=mmap_mode)[:count]
+        index.links = np.load(path / "links.npy", mmap_mode=mmap_mode)[:count]
+        index.levels = np.load(path / "levels.npy")[:count]
+        index.labels = meta["labels"]
+        index.label_ids = {label: node for node, label in enumerate(index.labels)}
+        index.entry_point = meta["entry_point"]
+        index.max_level = meta["max_level"]
+
+        upper_rows = np.load(path / "upper_links.npy")
+        offset = 0
+        for node in np.flatnonzero(index.levels > 0):
+            level = int(index.levels[node])
+            index.upper_links[int(node)] = upper_rows[offset:offset + level].copy()
+            offset += level
+        return index
+
+    def _reserve(self, capacity: int) -> None:
+        self.vectors = grow(self.vectors, capacity)
+        self.links = grow(self.links, capacity, -1)
+        self.levels = grow(self.levels, capacity)
+
+    def _neighbours(self, node: int, level: int) -> np.ndarray:
+        links = self.links[node] if level == 0 else self.upper_links[node][level - 1]
+        return links[(links >= 0) & (links < len(self.labels))]
+
+    def _distances(self, query: np.ndarray, nodes: Union[List[int], np.ndarray]) -> np.ndarray:
+        return 1.0 - self.vectors[nodes] @ query
+
+    def _descend(self, query: np.ndarray, level: int) -> int:
+        """
+        Greedy search from the entry point down to the given level
+        """
+        node = self.entry_point
+        distance = float(self._distances(query, [node])[0])
+        for upper_level in range(self.max_level, level, -1):
+            improved = True
+            while improved:
+                improved = False
+                neighbours = self._neighbours(node, upper_level)
+                if len(neighbours) == 0:
+                    break
+                distances = self._distances(query, neighbours)
+                best = int(np.argmin(distances))
+                if distances[best] < distance:
+                    node, distance, improved = int(neighbours[best]), float(distances[best]), True
+        return node
+
+    def _search_level(self, query: np.ndarray, entry_points: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+        """
+        Beam search on one level
+
+        :return: up to ef (distance, node) sorted by increasing distance
+        """
+        visited = set(entry_points)
+        distances = self._distances(query, entry_points).tolist()
+        candidates = list(zip(distances, entry_points))
+        heapq.heapify(candidates)
+        found = [(-distance, node) for distance, node in candidates]
+        heapq.heapify(found)
+        while len(found) > ef:
+            heapq.heappop(found)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -found[0][0]:
+                break
+            neighbours = [neighbour for neighbour in self._neighbours(node, level).tolist() if neighbour not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for neighbour_distance, neighbour in zip(self._distances(query, neighbours).tolist(), neighbours):
+                if len(found) < ef or neighbour_distance < -found[0][0]:
+                    heapq.heappush(candidates, (neighbour_distance, neighbour))
+                    heapq.heappush(found, (-neighbour_distance, neighbour))
+                    if len(found) > ef:
+                        heapq.heappop(found)
+
+        return sorted((-distance, node) for distance, node in found)
+
+    def _select(self, candidates: List[Tuple[float, int]], width: int) -> List[int]:
+        """
+        Neighbour selection heuristic: a candidate is kept if it is closer to the node than to any kept candidate,
+        so links point into different directions. Free links are filled with the closest skipped candidates
+
+        :param candidates: (distance, node) sorted by increasing distance
+        :param width: maximum number of links
+        :return: selected nodes
+        """
+        if len(candidates) <= width:
+            return [node for _, node in candidates]
+
+        distances = np.array([distance for distance, _ in candidates])
+        nodes = np.array([node for _, node in candidates])
+        similarities = self.vectors[nodes] @ self.vectors[nodes].T
+        closest_selected = np.full(len(nodes), -np.inf, np.float32)  # similarity to the closest kept candidate
+
+        selected: List[int] = []
+        skipped: List[int] = []
+        for position, distance in enumerate(distances.tolist()):
+            if len(selected) >= width:
+                break
+            if 1.0 - closest_selected[position] > distance:
+                selected.append(position)
+                np.maximum(closest_selected, similarities[position], out=closest_selected)
+            else:
+                skipped.append(position)
+        return nodes[selected + skipped[:width - len(selected)]].tolist()
+
+    def _set_links(self, node: int, level: int, nodes: List[int]) -> None:
+        links = self.links[node] if level == 0 else self.upper_links[node][level - 1]
+        links[:] = -1
+        links[:len(nodes)] = nodes
+
+    def _add_link(self, node: int, neighbour: int, level: int) -> None:
+        links = self._neighbours(node, level).tolist()
+        if neighbour in links:
+            return
+        links.append(neighbour)
+        width = 2 * self.max_links if level == 0 else self.max_links
+        if len(links) > width:
+            candidates = sorted(zip(self._distances(self.vectors[node], links).tolist(), links))
+            links = self._select(candidates, width)
+        self._set_links(node, level, links)
+
+    def _detach(self, node: int) -> None:
+        """
+        Removes links to node before its vector is replaced. Nodes that linked to it are linked
+        to its neighbours instead, so they stay connected to the same part of the graph
+        """
+        count = len(self)
+        for level in range(int(self.levels[node]) + 1):
+            if level == 0:
+                referrers = np.flatnonzero((self.links[:count] == node).any(axis=1)).tolist()
+            else:
+                referrers = [other for other, links in self.upper_links.items()
+                             if links.shape[0] >= level and (links[level - 1] == node).any()]
+            former = self._neighbours(node, level).tolist()
+            width = 2 * self.max_links if level == 0 else self.max_links
+            for referrer in referrers:
+                links = [link for link in self._neighbours(referrer, level).tolist() if link != node]
+                links = list(dict.fromkeys(links + [link for link in former if link != referrer]))
+                if len(links) > width:
+                    candidates = sorted(zip(self._distances(self.vectors[referrer], links).tolist(), links))
+                    links = self._select(candidates, width)
+                self._set_links(referrer, level, links)
+
+    def _connect(self, node: int, level: int) -> None:
+        """
+        Links node to its closest nodes on levels 0..level and links them back
+        """
+        query = self.vectors[node]
+        entry = self._descend(query, level) if self.max_level > level else self.entry_point
+        entry_points = [entry]
+        for current_level in range(min(level, self.max_level), -1, -1):
+            candidates = [(distance, candidate)
+                          for distance, candidate in self._search_level(query, entry_points,
+                                                                        self.ef_construction, current_level)
+                          if candidate != node]
+            width = 2 * self.max_links if current_level == 0 else self.max_links
+            selected = self._select(candidates, width)
+            self._set_links(node, current_level, selected)
+            for neighbour in selected:
+                self._add_link(neighbour, node, current_level)
+            entry_points = [candidate for _, candidate in candidates] or entry_points
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    """
+    :param vector: vector
+    :return: float32 vector of unit length, zero vector stays zero
+    """
+    vector = np.asarray(vector, np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from source_code.similarity.embeddings import token_hash
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+EMPTY_VALUE = np.uint32((1 << 32) - 1)
+
+
+def record_tokens(record: Dict) -> List[str]:
+    """
+    :param record: record of variables_imports dataset
+    :return: identifiers of record, imports and variables are different tokens even with the same name
+    """
+    return [f"{q_type}:{token}" for q_type in ["imports", "variables"] for token in record.get(q_type) or []]
+
+
+class MinHasher(object):
+    """
+    Computes MinHash signatures with universal hash functions (a * x + b) mod p. 32-bit token hashes
+    and coefficients make products fit into uint64, so all the permutations of all the tokens
+    are computed with one numpy expression
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        """
+        :param num_perm: number of hash functions, i.e. length of signature
+        :param seed: seed of hash functions, signatures are comparable only if they are computed with the same seed
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+
+    def empty(self) -> np.ndarray:
+        """
+        :return: signature of empty set, merging with it doesn't change other signatures
+        """
+        return np.full(self.num_perm, EMPTY_VALUE, np.uint32)
+
+    def signature(self, tokens: Iterable[str]) -> np.ndarray:
+        """
+        :param tokens: tokens of set, duplicates don't change signature
+        :return: uint32 signature of num_perm values
+        """
+        hashes = np.fromiter((token_hash(token) & 0xFFFFFFFF for token in tokens), np.uint64)
+        if len(hashes) == 0:
+            return self.empty()
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+def merge_signatures(*signatures: np.ndarray) -> np.ndarray:
+    """
+    Signature of union of sets is elementwise minimum of their signatures
+
+    :param signatures: signatures computed by the same MinHasher
+    :return: merged signature
+    """
+    return np.minimum.reduce(signatures)
+
+
+def estimate_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    """
+    :param first: signature
+    :param second: signature
+    :return: estimated Jaccard similarity of sets
+    """
+    if np.all(first == EMPTY_VALUE) or np.all(second == EMPTY_VALUE):
+        return 0.0
+    return float(np.mean(first == second))
+
+
+class AuthorSketches(object):
+    """
+    Fixed-size MinHash signatures of identifier sets of every author. Memory doesn't depend on number
+    of identifiers, and sketches of different files, repositories and runs are merged without the identifiers
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        self.hasher = MinHasher(num_perm, seed)
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def update(self, author: str, tokens: Iterable[str]) -> None:
+        signature = self.hasher.signature(tokens)
+        if author in self.signatures:
+            np.minimum(self.signatures[author], signature, out=self.signatures[author])
+        else:
+            self.signatures[author] = signature
+
+    def update_records(self, records: Iterable[Dict]) -> None:
+        """
+        :param records: records of variables_imports dataset
+        :return: None
+        """
+        for record in records:
+            self.update(record["author"], record_tokens(record))
+
+    def merge(self, other: "AuthorSketches") -> None:
+        """
+        Adds sketches computed elsewhere, e.g. by another worker
+
+        :param other: sketches with the same number of permutations and seed
+        :return: None
+        """
+        if (other.hasher.num_perm, other.hasher.seed) != (self.hasher.num_perm, self.hasher.seed):
+            raise ValueError("Sketches computed with different hash functions can't be merged")
+        for author, signature in other.signatures.items():
+            if author in self.signatures:
+                np.minimum(self.signatures[author], signature, out=self.signatures[author])
+            else:
+                self.signatures[author] = signature.copy()
+
+    def matrix(self) -> Tuple[List[str], np.ndarray]:
+        """
+        :return: (authors, uint32 matrix with signature of every author in a row)
+        """
+        authors = list(self.signatures)
+        if not authors:
+            return authors, np.zeros((0, self.hasher.num_perm), np.uint32)
+        return authors, np.stack([self.signatures[author] for author in authors])
+
+    def save(self, path: Path) -> None:
+        authors, signatures = self.matrix()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with Path(path).open("wb") as wf:
+            np.savez(wf, authors=np.array(authors, dtype=str), signatures=signatures,
+                     hasher=np.array([self.hasher.num_perm, self.hasher.seed]))
+
+    @classmethod
+    def load(cls, path: Path) -> "AuthorSketches":
+        with np.load(path) as data:
+            num_perm, seed = data["hasher"].tolist()
+            sketches = cls(num_perm, seed)
+            sketches.signatures = dict(zip(data["authors"].tolist(), data["signatures"]))
+        return sketches
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Pair with Jaccard similarity s becomes a candidate with probability 1 - (1 - s^rows)^bands.
+    The threshold of this S-curve is about (1 / bands)^(1 / rows), the closest one to the required is chosen
+
+    :param num_perm: length of signatures
+    :param threshold: Jaccard similarity from which pairs should become candidates
+    :return: (bands, rows)
+    """
+    options = [(bands, num_perm // bands) for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int, rows: int, max_bucket_size: int = 1000) -> Set[Tuple[int, int]]:
+    """
+    Authors whose signatures are equal in at least one band become candidate pairs. Every band
+    is bucketed with one np.unique over its rows, so the work is linear in number of authors
+    plus number of candidates
+
+    :param signatures: matrix of signatures, one row per author
+    :param bands: number of bands
+    :param rows: number of signature values in band
+    :param max_bucket_size: buckets with more authors are skipped, they consist of near-empty
+            or extremely common identifier sets and would make number of pairs quadratic
+    :return: set of pairs (i, j), i < j, of signatures rows
+    """
+    candidates: Set[Tuple[int, int]] = set()
+    not_empty = np.flatnonzero(np.any(signatures != EMPTY_VALUE, axis=1))
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[not_empty, band * rows:(band + 1) * rows])
+        _, buckets, sizes = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel(),
+                                      return_inverse=True, return_counts=True)
+        in_pairs = (sizes[buckets] > 1) & (sizes[buckets] <= max_bucket_size)
+        members = defaultdict(list)
+        for bucket, author in zip(buckets[in_pairs].tolist(), not_empty[in_pairs].tolist()):
+            members[bucket].append(author)
+        for authors in members.values():
+            candidates.update(combinations(authors, 2))
+    return candidates
+
+
+def similar_pairs(sketches: AuthorSketches, threshold: float = 0.5, max_bucket_size: int = 1000) -> Iterator[Dict]:
+    """
+    :param sketches: sketches of authors
+    :param threshold: minimum estimated Jaccard similarity of identifier sets
+    :param max_bucket_size: see lsh_candidates
+    :return: Iterator of dicts {"first": author, "second": author, "jaccard": float}
+    """
+    authors, signatures = sketches.matrix()
+    bands, rows = choose_bands(sketches.hasher.num_perm, threshold)
+    for first, second in sorted(lsh_candidates(signatures, bands, rows, max_bucket_size)):
+        jaccard = estimate_jaccard(signatures[first], signatures[second])
+        if jaccard >= threshold:
+            yield {"first": authors[first], "second": authors[second], "jaccard": round(jaccard, 4)}
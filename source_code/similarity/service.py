@@ -0,0 +1,331 @@
+import bisect
+import json
+import logging
+import queue
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from source_code.similarity.embeddings import DeveloperIndex
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
+
+# upper bounds of latency buckets in milliseconds
+LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf")]
+
+_MISSING = object()
+
+
+class LatencyHistogram(object):
+    """
+    Thread-safe histogram of latencies with fixed buckets
+    """
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        """
+        :param buckets: upper bounds of buckets in milliseconds, the last one should be infinity
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        milliseconds = seconds * 1e3
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, milliseconds)] += 1
+            self.total += milliseconds
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: quantile from 0 to 1
+        :return: upper bound of bucket which contains the quantile, in milliseconds
+        """
+        count = sum(self.counts)
+        if count == 0:
+            return 0.0
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            seen += bucket_count
+            if seen >= q * count:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        :return: json serializable statistics, quantiles in the last bucket are None
+        """
+        with self._lock:
+            count = sum(self.counts)
+            return {"count": count,
+                    "mean_ms": self.total / count if count else 0.0,
+                    **{f"p{int(q * 100)}_ms": finite_or_none(self.quantile(q)) for q in [0.5, 0.9, 0.99]},
+                    "buckets": {f"le_{bound}": bucket_count
+                                for bound, bucket_count in zip(self.buckets, self.counts)}}
+
+
+def finite_or_none(value: float) -> Union[float, None]:
+    return value if value != float("inf") else None
+
+
+class LRUCache(object):
+    """
+    Thread-safe in-memory LRU, the same policy as the memory part of PersistentCache
+    """
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            value = self._memory.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        requests = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "size": len(self._memory)}
+
+
+def collect_author_metadata(records: Iterable[Dict]) -> Dict[str, Dict[str, Set[str]]]:
+    """
+    :param records: records of commits_info dataset
+    :return: dict { author : {"languages": set, "repos": set} }
+    """
+    metadata: Dict[str, Dict[str, Set[str]]] = {}
+    for record in records:
+        author = metadata.setdefault(record["author_name"], {"languages": set(), "repos": set()})
+        author["languages"].add(record["programming_language"].lower())
+        author["repos"].add(record["repo_url"])
+    return metadata
+
+
+class SimilarityService(object):
+    """
+    Answers similar developers queries with index loaded once. Queries are put into a queue and executed
+    in batches by one worker thread: the index is never used concurrently, and equal queries that arrive
+    together are computed once. Results are kept in LRU cache
+    """
+
+    def __init__(self,
+                 index: DeveloperIndex,
+                 metadata: Union[Dict[str, Dict[str, Set[str]]], None] = None,
+                 cache_size: int = 10000,
+                 max_batch_size: int = 64,
+                 max_wait: float = 0.002):
+        """
+        :param index: index of developers
+        :param metadata: languages and repositories of developers used by filters, see collect_author_metadata
+        :param cache_size: number of results kept in memory
+        :param max_batch_size: maximum number of queries executed at once
+        :param max_wait: seconds the worker waits for more queries after the first one of batch
+        """
+        self.index = index
+        self.metadata = metadata or {}
+        self.cache = LRUCache(cache_size)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.batches = 0
+        self.batched_queries = 0
+
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def similar(self,
+                author: str,
+                k: int = 10,
+                language: Union[str, None] = None,
+                repo: Union[str, None] = None,
+                ef: Union[int, None] = None) -> Union[List[Dict], None]:
+        """
+        :param author: name of developer
+        :param k: number of similar developers
+        :param language: keep only developers who changed files of this language
+        :param repo: keep only developers who committed to this repository
+        :param ef: width of index search
+        :return: list of dicts {"author": str, "score": float} or None if author is unknown
+        """
+        start = time.perf_counter()
+        key = (author, k, language.lower() if language else None, repo, ef)
+        result = self.cache.get(key, _MISSING)
+        if result is _MISSING:
+            future = Future()
+            self._queue.put((key, future))
+            result = future.result()
+            self.cache[key] = result
+        self.latency.observe(time.perf_counter() - start)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"developers": len(self.index),
+                "cache": self.cache.stats(),
+                "latency": self.latency.snapshot(),
+                "batch_latency": self.batch_latency.snapshot(),
+                "batches": self.batches,
+                "mean_batch_size": self.batched_queries / self.batches if self.batches else 0.0}
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch: List[Tuple[Tuple, Future]]) -> None:
+        start = time.perf_counter()
+        results: Dict[Tuple, Any] = {}
+        for key, future in batch:
+            if key not in results:
+                try:
+                    results[key] = self._search(*key)
+                except Exception as e:
+                    logger.exception(f"Query {key} failed")
+                    results[key] = e
+            if isinstance(results[key], Exception):
+                future.set_exception(results[key])
+            else:
+                future.set_result(results[key])
+        self.batches += 1
+        self.batched_queries += len(batch)
+        self.batch_latency.observe(time.perf_counter() - start)
+
+    def _search(self,
+                author: str,
+                k: int,
+                language: Union[str, None],
+                repo: Union[str, None],
+                ef: Union[int, None]) -> Union[List[Dict], None]:
+        if author not in self.index.hnsw:
+            return None
+
+        fetched = k if language is None and repo is None else 4 * k
+        while True:
+            found = self.index.similar(author, fetched, ef)
+            neighbours = [(neighbour, score) for neighbour, score in found if self._matches(neighbour, language, repo)]
+            if len(neighbours) >= k or len(found) < fetched:
+                break
+            fetched *= 2
+        return [{"author": neighbour, "score": round(score, 6)} for neighbour, score in neighbours[:k]]
+
+    def _matches(self, author: str, language: Union[str, None], repo: Union[str, None]) -> bool:
+        metadata = self.metadata.get(author)
+        if language is not None and (metadata is None or language not in metadata["languages"]):
+            return False
+        if repo is not None and (metadata is None or repo not in metadata["repos"]):
+            return False
+        return True
+
+
+class SimilarityHandler(BaseHTTPRequestHandler):
+    """
+    GET /similar?author=X&k=10&language=python&repo=url&ef=50
+    GET /stats
+    """
+    service: SimilarityService = None
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/stats":
+            self.send_json(200, self.service.stats())
+        elif url.path == "/similar":
+            self.handle_similar(params)
+        else:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def handle_similar(self, params: Dict[str, str]) -> None:
+        if "author" not in params:
+            self.send_json(400, {"error": "author parameter is required"})
+            return
+        try:
+            k = int(params.get("k", 10))
+            ef = int(params["ef"]) if "ef" in params else None
+        except ValueError:
+            self.send_json(400, {"error": "k and ef should be integers"})
+            return
+
+        neighbours = self.service.similar(params["author"], k, params.get("language"), params.get("repo"), ef)
+        if neighbours is None:
+            self.send_json(404, {"error": f"{params['author']} is not in the index"})
+        else:
+            self.send_json(200, {"author": params["author"], "neighbours": neighbours})
+
+    def send_json(self, status: int, content: Dict) -> None:
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.log(1, f"{self.address_string()} {format % args}")
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def make_server(service: SimilarityService,
+                host: str = "127.0.0.1",
+                port: int = 8000,
+                socket_path: Union[Path, None] = None) -> socketserver.BaseServer:
+    """
+    :param service: service answering queries
+    :param host: host of HTTP server
+    :param port: port of HTTP server, 0 to choose a free one
+    :param socket_path: path of Unix socket, if given the server listens to it instead of host and port
+    :return: server, call serve_forever to start it
+    """
+    handler = type("BoundSimilarityHandler", (SimilarityHandler,), {"service": service})
+    if socket_path is None:
+        return ThreadingHTTPServer((host, port), handler)
+
+    socket_path = Path(socket_path)
+    if socket_path.exists():
+        socket_path.unlink()
+    return ThreadingUnixHTTPServer(str(socket_path), handler)
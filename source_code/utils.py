@@ -1,18 +1,52 @@
 import json
+import logging
 import math
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union, Dict, List, TextIO, Callable
+from typing import Any, Union, Dict, Iterator, List, TextIO, Callable
 
-from joblib import Parallel, delayed
+from source_code.columnar import ColumnarWriter, get_dataset_format, get_dataset_path, read_columnar
+from source_code.persistent_cache import get_cache
+from source_code.profiling import span
+from source_code.scheduling import WorkerPool
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.StreamHandler(sys.stdout))
 
 current_dir = Path(__file__)
 
 PROJECT_DIRECTORY = [p for p in current_dir.parents if p.parts[-1] == 'source_code'][0].parent
-CLONED_REPOS_FOLDER = PROJECT_DIRECTORY / "cloned_repos"
+DATA_DIR_VARIABLE = "SIMILAR_DEV_DATA_DIR"  # allows to run isolated from collected data, e.g. in benchmarks
+CLONED_REPOS_FOLDER = Path(os.environ.get(DATA_DIR_VARIABLE, PROJECT_DIRECTORY / "cloned_repos"))
 SELECTED_REPOS_FILE = CLONED_REPOS_FOLDER / "selected_repos.txt"
 TEMP_REPOS_FOLDER = CLONED_REPOS_FOLDER / "temp_repos"
 COMMITS_INFO_FILE = CLONED_REPOS_FOLDER / "commits_info.txt"
 VARIABLES_IMPORTS_FILE = CLONED_REPOS_FOLDER / "variables_imports.txt"
+MIRRORS_FOLDER = CLONED_REPOS_FOLDER / "mirrors"
+LANGUAGES_CACHE_FILE = CLONED_REPOS_FOLDER / "languages_cache.sqlite"
+CHECKPOINTS_FILE = CLONED_REPOS_FOLDER / "checkpoints.sqlite"
+PARSE_CACHE_FILE = CLONED_REPOS_FOLDER / "parse_cache.sqlite"
+SIMILAR_DEVELOPERS_FILE = CLONED_REPOS_FOLDER / "similar_developers.txt"
+DEVELOPER_INDEX_FOLDER = CLONED_REPOS_FOLDER / "developer_index"
+DEVELOPER_SKETCHES_FILE = CLONED_REPOS_FOLDER / "developer_sketches.npz"
+CANDIDATE_PAIRS_FILE = CLONED_REPOS_FOLDER / "candidate_pairs.txt"
+GITHUB_CACHE_FILE = CLONED_REPOS_FOLDER / "github_cache.sqlite"
+REPO_SIZES_FILE = CLONED_REPOS_FOLDER / "repo_sizes.sqlite"
+TOP_REPOS_SUMMARY_FILE = CLONED_REPOS_FOLDER / "top_repos.json"
 SOURCE_CODE_FOLDER = PROJECT_DIRECTORY / "source_code"
 ENRY_PATH = SOURCE_CODE_FOLDER / "enry" / "enry.exe"
 TREE_SITTER_QUERIES_FOLDER = SOURCE_CODE_FOLDER / "code_parsing" / "tree-sitter_queries"
@@ -44,28 +78,39 @@ def split_into_batches(array: List, batch_size: int) -> List[List]:
             range(math.ceil(len(array) / batch_size))]
 
 
-def parallel_function(function: Callable, source, n_jobs: int = -1, verbose: int = 50, **kwargs):
+def parallel_function(function: Callable, source, n_jobs: int = -1, verbose: int = 50,
+                      pool: Union[WorkerPool, None] = None, **kwargs):
     """
     Flexible way to operate certain function in parallel way
 
     :param n_jobs: number of processes
     :param function: function to run asynchronously
     :param source: what to iterate asynchronously
-    :param verbose: level of joblib parallel verbosity
+    :param verbose: number of finished elements between progress messages, 0 to disable them
+    :param pool: already started WorkerPool, so its processes are reused between calls. If None, new pool is created
     :param kwargs: arguments that should be passed to function.
             Should contain one None variable that will be used to pass source data
-    :return: result of function operation over source
+    :return: result of function operation over source in the order of source
     """
     source_argument = ""
     for key, value in kwargs.items():
         if value is None:  # finding variable for passing source elements in it
             source_argument = key
 
-    parallel = Parallel(n_jobs=n_jobs, backend="multiprocessing", verbose=verbose)
-    funcs = (delayed(function)(**update_dictionary(kwargs.copy(), source_argument, element))
-             for element in source if element)
-    result = parallel(funcs)
-    return result
+    if pool is None:
+        with WorkerPool(n_jobs) as pool:
+            return parallel_function(function, source, n_jobs, verbose, pool, **kwargs)
+
+    tasks = ((index, update_dictionary(kwargs.copy(), source_argument, element))
+             for index, element in enumerate(source) if element)
+    results = {}
+    for result in pool.run(function, tasks):
+        if result.failed:
+            raise RuntimeError(f"Element {result.key} failed:\n{result.error}")
+        results[result.key] = result.value
+        if verbose and len(results) % verbose == 0:
+            logger.log(2, f"\tparallel_function: {len(results)} elements done")
+    return [results[index] for index in sorted(results)]
 
 
 def file_writer(line: str, path: Path):
@@ -90,3 +135,385 @@ def write_down_content(content: Union[Dict, str, List], f: TextIO) -> None:
     """
     f.write(json.dumps(content))
     f.write("\n")
+
+
+def read_repos_records(path: Path, columns: Union[List[str], None] = None) -> Iterator[List[Dict]]:
+    """
+    Streams jsonl file written either by write_down_content (one json array of repository records per line)
+    or by StreamWriter (one record per line), or columnar dataset written by StreamWriter with projection
+    to the given columns. StreamWriter gets records of each repository as one part, so they are contiguous
+    and are grouped without reading the whole file. Repository written by several runs gives several lists
+
+    :param path: path to jsonl file or columnar dataset folder
+    :param columns: fields of records that are needed, None for all of them. "repo_url" is always read
+    :return: Iterator of lists with records of one repository
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys(["repo_url", *columns]))
+
+    if get_dataset_format(path) is not None:
+        records = read_columnar(path, columns)
+    else:
+        records = read_jsonl_records(path, columns)
+
+    repo_records = []
+    for record in records:
+        if isinstance(record, list):  # array written by write_down_content
+            yield record
+            continue
+        if repo_records and repo_records[-1]["repo_url"] != record["repo_url"]:
+            yield repo_records
+            repo_records = []
+        repo_records.append(record)
+
+    if repo_records:
+        yield repo_records
+
+
+def read_jsonl_records(path: Path, columns: Union[List[str], None] = None) -> Iterator[Union[Dict, List[Dict]]]:
+    """
+    :param path: path to jsonl file
+    :param columns: fields of records that are needed, None for all of them
+    :return: Iterator of records and arrays of records in order of lines
+    """
+    with path.open("r") as rf:
+        for line in rf:
+            if not line.strip():
+                continue
+            content = json.loads(line)
+            if isinstance(content, list):
+                yield [project_record(record, columns) for record in content]
+            else:
+                yield project_record(content, columns)
+
+
+def read_records(path: Path, columns: Union[List[str], None] = None) -> Iterator[Dict]:
+    """
+    Reads records one by one from file written by write_down_content, StreamWriter or columnar dataset,
+    arrays of records are flattened
+
+    :param path: path to jsonl file or columnar dataset folder
+    :param columns: fields of records that are needed, None for all of them
+    :return: Iterator of records
+    """
+    if get_dataset_format(path) is not None:
+        yield from read_columnar(path, columns)
+        return
+
+    for content in read_jsonl_records(path, columns):
+        yield from content if isinstance(content, list) else [content]
+
+
+def project_record(record: Dict, columns: Union[List[str], None] = None) -> Dict:
+    if columns is None:
+        return record
+    return {key: value for key, value in record.items() if key in columns}
+
+
+class Checkpoint(object):
+    """
+    Value that should be stored in checkpoints file only after records produced before it are written.
+    Producers put it into StreamWriter queue after their records
+    """
+
+    def __init__(self, path: Union[str, Path], key: str, value: Any, table: str = "checkpoints"):
+        """
+        :param path: path to SQLite file with checkpoints
+        :param key: key of checkpoint, e.g. url of repository
+        :param value: json serializable value, e.g. ids of processed commits
+        :param table: name of table inside of SQLite file
+        """
+        self.path = path
+        self.key = key
+        self.value = value
+        self.table = table
+
+    def save(self) -> None:
+        checkpoints = get_cache(self.path, table=self.table)
+        checkpoints[self.key] = self.value
+        checkpoints.flush()
+
+
+class StreamWriterError(Exception):
+    """
+    Raised when writer thread of StreamWriter has stopped because of error
+    """
+
+
+class StreamPart(object):
+    """
+    Part file with records of one task attempt, it is written by worker process, see StreamSink.part
+    """
+
+    def __init__(self, folder: Path):
+        """
+        :param folder: folder with part files of StreamWriter
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".jsonl", dir=str(folder))
+        self.path = Path(path)
+        self.checkpoints: List[Checkpoint] = []
+        self._file = os.fdopen(fd, "w")
+
+    def write(self, item: Union[Dict, Checkpoint, List]) -> None:
+        """
+        :param item: record, checkpoint or list of them. Checkpoints are kept until the part is committed
+        :return: None
+        """
+        for record in item if isinstance(item, list) else [item]:
+            if isinstance(record, Checkpoint):
+                self.checkpoints.append(record)
+            else:
+                write_down_content(record, self._file)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def discard(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class StreamSink(object):
+    """
+    Picklable function that puts items into StreamWriter queue from worker processes. Unlike bare queue put
+    it raises StreamWriterError instead of blocking forever when writer thread has failed and queue is full
+    """
+
+    def __init__(self, items_queue: queue.Queue, failed: threading.Event, poll_interval: float = 1.0,
+                 parts_folder: Union[Path, None] = None):
+        """
+        :param items_queue: queue of StreamWriter
+        :param failed: event that is set when writer thread fails
+        :param poll_interval: number of seconds between checks of writer state while queue is full
+        :param parts_folder: folder for part files of StreamWriter, see part
+        """
+        self.items_queue = items_queue
+        self.failed = failed
+        self.poll_interval = poll_interval
+        self.parts_folder = parts_folder
+
+    def __call__(self, item: Any) -> None:
+        while not self.failed.is_set():
+            try:
+                self.items_queue.put(item, timeout=self.poll_interval)
+                return
+            except queue.Full:
+                continue
+        raise StreamWriterError("writer thread has stopped, records can't be written")
+
+    @contextmanager
+    def part(self) -> Iterator[Callable[[Union[Dict, Checkpoint, List]], None]]:
+        """
+        Gives function that writes records of one task attempt into part file on disk, so memory of worker
+        doesn't grow with the number of records. The part is given to writer only when the block exits
+        without exception, so records of failed or cancelled attempt never reach output and retried task
+        isn't written twice. Checkpoints are put after the records of the part
+
+        :return: context manager with function that takes record, checkpoint or list of them
+        """
+        stream_part = StreamPart(self.parts_folder)
+        try:
+            yield stream_part.write
+            stream_part.close()
+            self([stream_part.path, *stream_part.checkpoints])
+        except BaseException:
+            stream_part.discard()
+            raise
+
+
+class StreamWriter(object):
+    """
+    Writes records produced by worker processes into jsonl file, one record per line, or into columnar dataset.
+    Workers put records, lists of records or paths of committed part files (see StreamSink.part) into bounded
+    queue, the only writer thread takes them from it, so memory usage doesn't depend on the number of records
+    and written records survive failures. Records of one list or part file are written together.
+    Checkpoint items are saved only after the records before them are written.
+    Workers should put items with sink, it fails if writer thread has failed
+    """
+
+    def __init__(self, path: Path, queue_size: int = 10000, flush_every: int = 1000, flush_interval: float = 5.0,
+                 output_format: str = "jsonl", schema_name: Union[str, None] = None,
+                 next_writer: Union["StreamWriter", None] = None):
+        """
+        :param path: path to jsonl file, records are appended to it.
+                For columnar formats dataset folder is named after it, see columnar.get_dataset_path
+        :param queue_size: maximum number of records, lists or part files waiting to be written,
+                workers are blocked when it is full
+        :param flush_every: number of written records after which file is flushed, it is row group size
+                for columnar formats
+        :param flush_interval: maximum number of seconds between flushes, ignored by columnar formats
+                as small row groups make reading slower
+        :param output_format: "jsonl" or one of columnar.COLUMNAR_FORMATS
+        :param schema_name: name of records schema for columnar formats, see columnar.SCHEMAS
+        :param next_writer: writer that gets checkpoints after this writer has written the records before them,
+                so checkpoint of several outputs is saved only when all of them have the records.
+                It should be entered before this writer and exited after it
+        """
+        self.output_format = output_format
+        self.schema_name = schema_name
+        self.path = Path(path) if output_format == "jsonl" else get_dataset_path(path, output_format)
+        self.queue_size = queue_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.next_writer = next_writer
+        self.written = 0
+        self.parts_folder = self.path.parent / f".{self.path.name}.parts"
+
+        self.error: Union[Exception, None] = None
+
+        self._manager = None
+        self._thread = None
+        self.queue = None
+        self.sink: Union[StreamSink, None] = None
+
+    def __enter__(self) -> "StreamWriter":
+        self._manager = multiprocessing.Manager()
+        self.queue = self._manager.Queue(self.queue_size)
+        self.sink = StreamSink(self.queue, self._manager.Event(), parts_folder=self.parts_folder)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            self.sink(None)  # end of stream
+        except StreamWriterError:
+            pass
+        self._thread.join()
+        self._manager.shutdown()
+        shutil.rmtree(self.parts_folder, ignore_errors=True)  # parts of killed workers and of not written items
+        if self.error is not None and exc_type is None:
+            raise StreamWriterError(f"writing to {self.path} failed") from self.error
+
+    def _run(self) -> None:
+        try:
+            self._write_loop()
+        except Exception as e:
+            self.error = e
+            self.sink.failed.set()
+
+    def _write_loop(self) -> None:
+        if self.output_format != "jsonl":
+            checkpoints = []  # part file can't be read before it is closed, so checkpoints wait for it
+            with ColumnarWriter(self.path, self.schema_name, self.output_format, self.flush_every) as writer:
+                for item in iter(self.queue.get, None):
+                    for record in self._records(item):
+                        if isinstance(record, Checkpoint):
+                            checkpoints.append(record)
+                            continue
+                        with span("write"):
+                            writer.write(record)
+                        self.written += 1
+            for checkpoint in checkpoints:
+                self._confirm(checkpoint)
+            return
+
+        last_flush, unflushed = time.monotonic(), 0
+        with self.path.open("a") as f:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:  # workers are busy, write down what is already received
+                    f.flush()
+                    last_flush, unflushed = time.monotonic(), 0
+                    continue
+                if item is None:
+                    break
+
+                for record in self._records(item):
+                    if isinstance(record, Checkpoint):
+                        f.flush()
+                        last_flush, unflushed = time.monotonic(), 0
+                        self._confirm(record)
+                        continue
+                    with span("write"):
+                        write_down_content(record, f)
+                    self.written += 1
+                    unflushed += 1
+
+                if unflushed >= self.flush_every or time.monotonic() - last_flush > self.flush_interval:
+                    f.flush()
+                    last_flush, unflushed = time.monotonic(), 0
+
+    @staticmethod
+    def _records(item: Union[Dict, Checkpoint, Path, List]) -> Iterator[Union[Dict, Checkpoint]]:
+        for element in item if isinstance(item, list) else [item]:
+            if isinstance(element, Path):  # part file committed by StreamSink.part
+                yield from read_jsonl_records(element)
+                element.unlink()
+            else:
+                yield element
+
+    def _confirm(self, checkpoint: Checkpoint) -> None:
+        if self.next_writer is not None:
+            self.next_writer.sink(checkpoint)
+        else:
+            checkpoint.save()
+
+
+class FileLock(object):
+    """
+    Inter-process lock based on lock file. Shared locks are available only on POSIX systems,
+    on Windows they are exclusive
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: path to lock file, will be created if doesn't exist
+        """
+        self.path = Path(path)
+        self._fd = None
+        self._locked = False  # msvcrt locks can't be converted, so they are taken only once
+        self._shared: Union[bool, None] = None  # type of held flock lock, None if it isn't held
+
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        """
+        Acquires lock or changes type of already acquired one. If non-blocking change of type fails,
+        the previously held lock is kept
+
+        :param shared: acquire shared lock instead of exclusive one
+        :param blocking: wait until lock is acquired
+        :return: True if lock was acquired
+        """
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT)
+
+        try:
+            if fcntl is not None:
+                flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+                fcntl.flock(self._fd, flags)
+                self._shared = shared
+            elif not self._locked:
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                self._locked = True
+        except OSError:
+            if blocking:
+                raise
+            if self._shared is not None:  # flock may drop the held lock while converting it, it is taken again
+                fcntl.flock(self._fd, fcntl.LOCK_SH if self._shared else fcntl.LOCK_EX)
+            elif not self._locked:
+                self.release()
+            return False
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._shared = None
+        elif self._locked:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            self._locked = False
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Union
+
+import pytest
+
+COMMITS: List[Dict[str, str]] = [
+    {"main.py": "import os\n\n\ndef main():\n    path = os.getcwd()\n    print(path)\n"},
+    {"Main.java": "import java.util.List;\n\npublic class Main {\n    int counter = 0;\n}\n"},
+    {"main.py": "import os\nimport sys\n\n\ndef main():\n    path = os.getcwd()\n    print(path, sys.argv)\n"},
+    {"index.js": "const fs = require('fs');\nlet content = fs.readFileSync('a');\n"},
+    {"main.py": "import sys\n\n\ndef main(argv):\n    print(argv)\n"},
+]
+AUTHORS = ["Alice <alice@mail.com>", "Bob <bob@mail.com>"]
+
+
+def git(*args: str, cwd: Path) -> str:
+    return subprocess.run(["git", *args], cwd=str(cwd), check=True, capture_output=True, text=True).stdout
+
+
+def run_cli(*args: str, data_dir: Path) -> str:
+    """
+    Runs command of source_code/run.py with data folder isolated from collected data
+    """
+    project_dir = Path(__file__).parent.parent
+    env = dict(os.environ, PYTHONPATH=str(project_dir), SIMILAR_DEV_DATA_DIR=str(data_dir))
+    return subprocess.run([sys.executable, "run.py", *args], cwd=str(project_dir / "source_code"), env=env,
+                          check=True, capture_output=True, text=True).stdout
+
+
+def create_repo(path: Path, commits: List[Dict[str, Union[str, None]]] = COMMITS,
+                authors: List[str] = AUTHORS) -> Path:
+    """
+    Creates git repository with one commit per dict of {file path: content}, None content removes the file,
+    so a rename is removal of the old path and content of the new one. If path is already a repository,
+    commits are added to its current branch. Commits are made by authors in turns, empty dict gives empty commit
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    if not (path / ".git").exists():
+        git("init", "-q", "-b", "master", cwd=path)
+    for index, files in enumerate(commits):
+        for file_path, content in files.items():
+            if content is None:
+                (path / file_path).unlink()
+                continue
+            (path / file_path).parent.mkdir(parents=True, exist_ok=True)
+            (path / file_path).write_text(content)
+        git("add", "-A", cwd=path)
+        git("-c", "user.name=Committer", "-c", "user.email=committer@mail.com", "commit", "-q", "--allow-empty",
+            "-m", f"commit {index}", "--author", authors[index % len(authors)], cwd=path)
+    return path
+
+
+@pytest.fixture
+def source_repo(tmp_path: Path) -> Path:
+    """
+    Path to working repository with several commits
+    """
+    return create_repo(tmp_path / "source_repo")
+
+
+@pytest.fixture
+def bare_repo_url(tmp_path: Path, source_repo: Path) -> str:
+    """
+    file:// url of bare repository that allows partial clones
+    """
+    bare_path = tmp_path / "bare_repo.git"
+    git("clone", "-q", "--bare", str(source_repo), str(bare_path), cwd=tmp_path)
+    git("config", "uploadpack.allowFilter", "true", cwd=bare_path)
+    return f"file://{bare_path}"
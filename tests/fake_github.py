@@ -0,0 +1,110 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeGitHub(object):
+    """
+    Local server imitating the GitHub REST API endpoints used by stargazer crawler:
+    pagination with Link headers, ETags with 304 answers, x-ratelimit-* headers and token check
+    """
+
+    def __init__(self, stargazers: Dict[str, List[str]], starred: Dict[str, List[str]], token: str = "token",
+                 limit: int = 5000, rate_limited_requests: int = 0):
+        """
+        :param stargazers: { repository : logins of its stargazers }
+        :param starred: { login : full names of starred repositories }
+        :param token: the only accepted token
+        :param limit: requests allowed in rate-limit window
+        :param rate_limited_requests: number of the first starred requests answered with exhausted rate limit
+        """
+        self.stargazers = stargazers
+        self.starred = starred
+        self.token = token
+        self.limit = limit
+        self.rate_limited_requests = rate_limited_requests
+        self.statuses = Counter()
+        self.paths = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.make_handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "FakeGitHub":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                with fake.lock:
+                    fake.paths[url.path] += 1
+                if self.headers.get("Authorization") != f"token {fake.token}":
+                    return self.respond(401, {"message": "Bad credentials"})
+
+                params = parse_qs(url.query)
+                page, per_page = int(params.get("page", [1])[0]), int(params.get("per_page", [30])[0])
+                if re.fullmatch(r"/repos/[^/]+/[^/]+", url.path):
+                    name = url.path[len("/repos/"):]
+                    return self.respond(200, {"id": 1, "full_name": name}) if name in fake.stargazers \
+                        else self.respond(404, {"message": "Not Found"})
+                match = re.fullmatch(r"/repos/([^/]+/[^/]+)/stargazers", url.path)
+                if match:
+                    items = [{"login": login, "id": 0} for login in fake.stargazers.get(match.group(1), [])]
+                    return self.respond_page(url.path, items, page, per_page)
+                match = re.fullmatch(r"/users/([^/]+)/starred", url.path)
+                if match:
+                    with fake.lock:
+                        limited = fake.rate_limited_requests > 0
+                        fake.rate_limited_requests -= 1
+                    if limited:
+                        return self.respond(403, {"message": "API rate limit exceeded"}, remaining=0)
+                    if match.group(1) not in fake.starred:
+                        return self.respond(404, {"message": "Not Found"})
+                    items = [{"full_name": name, "private": False} for name in fake.starred[match.group(1)]]
+                    return self.respond_page(url.path, items, page, per_page)
+                self.respond(404, {"message": "Not Found"})
+
+            def respond_page(self, path: str, items: List[Dict], page: int, per_page: int) -> None:
+                links = {}
+                if page * per_page < len(items):
+                    links["Link"] = f'<{fake.url}{path}?per_page={per_page}&page={page + 1}>; rel="next"'
+                self.respond(200, items[(page - 1) * per_page:page * per_page], links)
+
+            def respond(self, status: int, content, headers: Dict[str, str] = None, remaining: int = None) -> None:
+                body = json.dumps(content).encode()
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                with fake.lock:
+                    fake.statuses[status] += 1
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("x-ratelimit-limit", str(fake.limit))
+                self.send_header("x-ratelimit-remaining", str(fake.limit if remaining is None else remaining))
+                self.send_header("x-ratelimit-reset", str(int(time.time()) + 1))
+                self.send_header("x-ratelimit-resource", "core")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
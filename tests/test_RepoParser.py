@@ -2,8 +2,10 @@ from pathlib import Path
 from typing import List, Set
 
 import pytest
+from dulwich.repo import Repo
 
 from source_code.code_parsing.repo_parser import RepoParser
+from source_code.git_repo_extract.commits_info import get_commits_info_floored
 from source_code.git_repo_extract.repo_ops import try_find_repo
 
 
@@ -27,3 +29,58 @@ def test_RepoParser(file_languages: List[str], file_names: List[str], variables_
     assert variables_check == set(repo_parser.variables)
     assert imports_check == set(repo_parser.imports)
 
+
+
+def test_parse_cache_is_shared(tmp_path: Path, source_repo: Path):
+    parse_cache_path = tmp_path / "parse_cache.sqlite"
+    with Repo(str(source_repo)) as repo:
+        first = RepoParser(repo, ["python", "java", "javascript"], languages_cache_path=None,
+                           parse_cache_path=parse_cache_path)
+        first.parse_files()
+        parsed = first.parse_cache.stats()["misses"]
+
+        second = RepoParser(repo, ["python", "java", "javascript"], languages_cache_path=None,
+                            parse_cache_path=parse_cache_path)
+        second.parse_files()
+
+    assert parsed == 3
+    assert second.parse_cache.stats()["hits"] == parsed
+    assert first.used_files == second.used_files
+
+
+def test_author_imports_by_blob(tmp_path: Path, source_repo: Path):
+    with Repo(str(source_repo)) as repo:
+        records = [record for record in get_commits_info_floored(repo, -1, "builtin", None)
+                   if record["file_path"] == "main.py"]
+        repo_parser = RepoParser(repo, ["python"], languages_cache_path=None,
+                                 parse_cache_path=tmp_path / "parse_cache.sqlite")
+        imports = [repo_parser.handle_author_imports(record) for record in records]
+
+    assert imports == [{"sys", "print"}, {"os", "sys", "print"}, {"os", "print"}]
+    assert repo_parser.parse_cache.stats()["misses"] == 3
+    assert repo_parser.used_files == {}
+
+
+def test_diff_scoped_author_imports(tmp_path: Path, source_repo: Path):
+    with Repo(str(source_repo)) as repo:
+        records = [record for record in get_commits_info_floored(repo, -1, "builtin", None)
+                   if record["file_path"] == "main.py"]
+        repo_parser = RepoParser(repo, ["python"], languages_cache_path=None, parse_cache_path=None, diff_scoped=True)
+        imports = [repo_parser.handle_author_imports(record) for record in records]
+        variables = [repo_parser.handle_author_variables(record) for record in records]
+
+    assert imports == [{"print"}, {"sys", "print"}, {"os", "print"}]
+    assert variables == [{"main"}, set(), {"main", "path"}]
+
+
+def test_get_tree_reuses_last_tree(source_repo: Path):
+    versions = [b"import os\n\n\ndef main():\n    pass\n",
+                b"import os\nimport sys\n\n\ndef main():\n    return os.path\n",
+                b"def main(x):\n    return x\n"]
+    with Repo(str(source_repo)) as repo:
+        repo_parser = RepoParser(repo, ["python"], languages_cache_path=None, parse_cache_path=None)
+        parser = RepoParser.parsers["python"]["parser"]
+        for code in versions + versions[::-1]:
+            tree = repo_parser.get_tree("python", str(hash(code)), code, "main.py")
+            assert tree.root_node.sexp() == parser.parse(code).root_node.sexp()
+        assert list(repo_parser.last_trees) == [("python", "main.py")]
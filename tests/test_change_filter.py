@@ -0,0 +1,116 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from dulwich.diff_tree import tree_changes
+from dulwich.objects import Commit
+from dulwich.repo import Repo
+
+from source_code.git_repo_extract.change_filter import BlobSizes, ChangeFilter, DEFAULT_FILTER_CONFIG
+from source_code.git_repo_extract.commits_info import get_commits_info_floored, process_change
+from tests.conftest import create_repo, git
+
+BIG_FILE = "".join(f"value_{i} = {i}\n" for i in range(5000))
+
+
+@pytest.mark.parametrize("config, path, allowed", [
+    (DEFAULT_FILTER_CONFIG, "src/main.py", True),
+    (DEFAULT_FILTER_CONFIG, "web/package-lock.json", False),
+    (DEFAULT_FILTER_CONFIG, "poetry.lock", False),
+    (DEFAULT_FILTER_CONFIG, "static/logo.PNG", False),
+    (DEFAULT_FILTER_CONFIG, "web/node_modules/react/index.js", False),
+    ({"languages": ["python", "java"]}, "src/Main.java", True),
+    ({"languages": ["python", "java"]}, "src/index.js", False),
+    ({"languages": ["dockerfile"]}, "docker/Dockerfile", True),
+    ({"include_paths": ["src/*"], "exclude_paths": ["*/generated/*"]}, "src/generated/api.py", False),
+    ({"include_paths": ["src/*"], "exclude_paths": ["*/generated/*"]}, "docs/conf.py", False),
+    ({"include_paths": ["src/*"], "exclude_paths": ["*/generated/*"]}, "src/api.py", True),
+])
+def test_allow_path(config: Dict, path: str, allowed: bool):
+    assert ChangeFilter.from_dict(config).allow_path(path.encode()) == allowed
+
+
+@pytest.mark.parametrize("config, author, time, allowed", [
+    ({"exclude_bots": True}, "dependabot[bot] <49699333+dependabot[bot]@users.noreply.github.com>", 0, False),
+    ({"exclude_bots": True}, "Alice <alice@mail.com>", 0, True),
+    ({"authors": ["*@company.com>"]}, "Bob <bob@company.com>", 0, True),
+    ({"exclude_authors": ["bob *"]}, "Bob <bob@company.com>", 0, False),
+    ({"since": "2020-01-01", "until": "2021-01-01"}, "Alice <alice@mail.com>", 1590000000, True),
+    ({"since": "2020-01-01", "until": "2021-01-01"}, "Alice <alice@mail.com>", 1620000000, False),
+])
+def test_allow_commit(config: Dict, author: str, time: int, allowed: bool):
+    commit = Commit()
+    commit.author = author.encode()
+    commit.author_time = time
+    assert ChangeFilter.from_dict(config).allow_commit(commit) == allowed
+
+
+def test_unknown_parameter():
+    with pytest.raises(ValueError):
+        ChangeFilter.from_dict({"max_size": 10})
+
+
+def test_blob_sizes(tmp_path: Path):
+    path = create_repo(tmp_path / "repo", [{"main.py": BIG_FILE}, {"main.py": BIG_FILE + "x = 1\n"}])
+    git("gc", "-q", "--aggressive", cwd=path)  # the first version becomes delta of the second one
+    create_repo(path, [{"loose.py": "y = 2\n"}])
+
+    with Repo(str(path)) as repo:
+        sizes = BlobSizes(repo)
+        blobs = [sha for sha in git_objects(path) if repo[sha].type_name == b"blob"]
+        assert len(blobs) == 3
+        for sha in blobs:
+            assert sizes.get(sha) == len(repo[sha].as_raw_string())
+        assert sizes.get(b"0" * 40) is None
+        sizes.close()
+
+
+def test_filtered_walk(tmp_path: Path):
+    commits: List[Dict[str, str]] = [{"main.py": "x = 1\n", "big.py": BIG_FILE},
+                                     {"main.py": "x = 2\n", "yarn.lock": "lock\n"}]
+    path = create_repo(tmp_path / "repo", commits)
+    create_repo(path, [{}, {"main.py": "x = 3\n"}], authors=["renovate[bot] <bot@renovateapp.com>"])
+
+    with Repo(str(path)) as repo:
+        unfiltered = list(get_commits_info_floored(repo, -1, "builtin", None))
+        filtered = list(get_commits_info_floored(repo, -1, "builtin", None,
+                                                 change_filter=dict(DEFAULT_FILTER_CONFIG, max_blob_size=1000)))
+
+    assert sorted(record["file_path"] for record in unfiltered) == ["big.py", "main.py", "main.py", "main.py"]
+    assert sorted((record["file_path"], record["author_name"]) for record in filtered) == \
+           [("main.py", "Alice"), ("main.py", "Bob")]
+
+
+def test_filtered_renames_are_not_read(tmp_path: Path):
+    vendored = {f"vendor/lib_{i}.js": "".join(f"var value_{i}_{j} = {j};\n" for j in range(50)) for i in range(2)}
+    copies = {f"vendor/lib_{i}_copy.js": content + "var x = 1;\n" for i, content in enumerate(vendored.values())}
+    path = create_repo(tmp_path / "repo", [vendored, {**dict.fromkeys(vendored), **copies}])
+
+    with Repo(str(path)) as repo:
+        get_object, blobs_read = repo.get_object, []
+
+        def counting_get_object(sha: bytes):
+            obj = get_object(sha)
+            if obj.type_name == b"blob":
+                blobs_read.append(sha)
+            return obj
+
+        repo.get_object = counting_get_object
+        records = list(get_commits_info_floored(repo, -1, "builtin", None, rename_threshold=60,
+                                                change_filter={"exclude_vendored": True}))
+    assert records == []
+    assert blobs_read == []
+
+
+@pytest.mark.parametrize("max_line_restriction, kept", [(-1, True), (10, True), (3, False)])
+def test_max_line_restriction(tmp_path: Path, max_line_restriction: int, kept: bool):
+    path = create_repo(tmp_path / "repo", [{"main.py": "".join(f"x_{i} = {i}\n" for i in range(5))}])
+    with Repo(str(path)) as repo:
+        commit = repo[repo.head()]
+        change = next(tree_changes(repo.object_store, None, commit.tree))
+        content = process_change(change, repo, {}, max_line_restriction, "builtin")
+    assert (content is not None) == kept
+
+
+def git_objects(path: Path) -> List[bytes]:
+    return [line.split()[0].encode() for line in git("rev-list", "--objects", "--all", cwd=path).splitlines()]
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from dulwich.repo import Repo
+
+from source_code.git_repo_extract.commits_info import get_checkpoints, get_commits_info_floored
+from source_code.utils import Checkpoint
+from tests.conftest import git
+
+
+def test_incremental_commits_info(tmp_path: Path, source_repo: Path):
+    checkpoints_path = tmp_path / "checkpoints.sqlite"
+
+    with Repo(str(source_repo)) as repo:
+        first_run = list(get_commits_info_floored(repo, -1, "builtin", None, checkpoints_path))
+        second_run = list(get_commits_info_floored(repo, -1, "builtin", None, checkpoints_path))
+    assert len(first_run) == 5
+    assert second_run == []
+
+    (source_repo / "new.py").write_text("import json\n")
+    git("add", "-A", cwd=source_repo)
+    git("-c", "user.name=Alice", "-c", "user.email=alice@mail.com", "commit", "-q", "-m", "new", cwd=source_repo)
+
+    with Repo(str(source_repo)) as repo:
+        third_run = list(get_commits_info_floored(repo, -1, "builtin", None, checkpoints_path))
+        assert [entity["file_path"] for entity in third_run] == ["new.py"]
+        assert get_checkpoints(checkpoints_path).get(third_run[0]["repo_url"]) == [repo.head().decode()]
+
+
+def test_missing_checkpoint_walks_whole_history(tmp_path: Path, source_repo: Path):
+    checkpoints_path = tmp_path / "checkpoints.sqlite"
+    with Repo(str(source_repo)) as repo:
+        repo_url = next(get_commits_info_floored(repo, 1, "builtin", None, None))["repo_url"]
+        checkpoints = get_checkpoints(checkpoints_path)
+        checkpoints[repo_url] = ["0" * 40]  # commit lost after force push
+
+        assert len(list(get_commits_info_floored(repo, -1, "builtin", None, checkpoints_path))) == 5
+
+
+def test_partial_walk_is_not_checkpointed(tmp_path: Path, source_repo: Path):
+    checkpoints_path = tmp_path / "checkpoints.sqlite"
+    with Repo(str(source_repo)) as repo:
+        assert len(list(get_commits_info_floored(repo, 2, "builtin", None, checkpoints_path))) == 2
+        *records, checkpoint = get_commits_info_floored(repo, 5, "builtin", None, checkpoints_path,
+                                                        yield_checkpoint=True)
+        assert len(records) == 5
+        assert get_checkpoints(checkpoints_path).get(records[0]["repo_url"]) is None
+        assert isinstance(checkpoint, Checkpoint) and checkpoint.value == [repo.head().decode()]
+
+        checkpoint.save()
+        assert list(get_commits_info_floored(repo, -1, "builtin", None, checkpoints_path)) == []
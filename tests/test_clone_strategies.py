@@ -0,0 +1,62 @@
+from pathlib import Path
+
+import pytest
+
+from source_code.git_repo_extract.commits_info import get_commits_info_floored
+from source_code.git_repo_extract.repo_ops import get_repo_from_url, operate_temporary_repo, PartialCloneRepo
+
+
+def extract_commits(temp_path: Path, url: str, clone_strategy: str, clone_depth: int = None):
+    temp_path.mkdir(exist_ok=True)
+    return operate_temporary_repo(str(temp_path), url, get_commits_info_floored, (-1, "builtin", None),
+                                  clone_strategy=clone_strategy, clone_depth=clone_depth)
+
+
+@pytest.mark.parametrize("clone_strategy", ["single_branch", "blobless"])
+def test_clone_strategies_give_same_commits(tmp_path: Path, bare_repo_url: str, clone_strategy: str):
+    full = extract_commits(tmp_path / "temp", bare_repo_url, "full")
+    result = extract_commits(tmp_path / "temp", bare_repo_url, clone_strategy)
+
+    assert len(full) == 5
+    assert result == full
+
+
+def test_shallow_clone(tmp_path: Path, bare_repo_url: str):
+    full = extract_commits(tmp_path / "temp", bare_repo_url, "full")
+    result = extract_commits(tmp_path / "temp", bare_repo_url, "shallow", clone_depth=2)
+
+    assert {entity["commit_id"] for entity in result} == {entity["commit_id"] for entity in full[:2]}
+
+
+def test_blobless_clone_fetches_blobs_lazily(tmp_path: Path, bare_repo_url: str):
+    repo = get_repo_from_url(str(tmp_path / "blobless"), bare_repo_url, "blobless")
+    assert isinstance(repo, PartialCloneRepo)
+
+    tree = repo[repo[repo.head()].tree]
+    blob_sha = tree[b"main.py"][1]
+    assert blob_sha not in repo.object_store
+    assert repo.get_object(blob_sha).as_raw_string().startswith(b"import sys")
+    repo.close()
+
+
+def test_blobless_clone_prefetches_commit_blobs(tmp_path: Path, bare_repo_url: str):
+    repo = get_repo_from_url(str(tmp_path / "blobless"), bare_repo_url, "blobless")
+    tree = repo[repo[repo.head()].tree]
+    blob_shas = [tree[name][1] for name in (b"main.py", b"Main.java")]
+
+    repo.prefetch(blob_shas + [None])
+    assert all(sha in repo.object_store for sha in blob_shas)
+
+    def fail(sha: bytes):
+        raise AssertionError(f"{sha} was fetched lazily")
+
+    repo.fetch_missing_blob = fail
+    result = get_commits_info_floored(repo, -1, "builtin", None)
+    assert {entity["file_path"] for entity in result} == {"main.py", "Main.java", "index.js"}
+    repo.close()
+
+
+def test_shallow_clone_needs_depth(tmp_path: Path, bare_repo_url: str):
+    with pytest.raises(ValueError):
+        get_repo_from_url(str(tmp_path / "shallow"), bare_repo_url, "shallow")
+    assert not (tmp_path / "shallow").exists()
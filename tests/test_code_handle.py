@@ -0,0 +1,79 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+
+import pytest
+from dulwich.objects import Blob
+from dulwich.repo import Repo
+
+from source_code.code_parsing.code_handle import split_fused_record
+from source_code.code_parsing.grammar_build import grammar_folder
+from source_code.git_repo_extract.commits_info import get_commits_info_floored
+from source_code.utils import read_records, TREE_SITTER_GRAMMARS_FOLDER
+from tests.conftest import run_cli
+
+LANGUAGES = ["python", "java", "javascript"]
+
+
+def measure_blob(commit_info: Dict, code: bytes, old_code: Union[bytes, None], old_blob_id: Union[str, None]) -> Dict:
+    assert old_blob_id is None or Blob.from_string(old_code).id.decode() == old_blob_id
+    return {"blob_size": len(code), "old_blob_size": None if old_code is None else len(old_code)}
+
+
+def test_blob_handler_gets_walked_blob(source_repo: Path):
+    with Repo(str(source_repo)) as repo:
+        records = list(get_commits_info_floored(repo, -1, "builtin", None, blob_handler=measure_blob))
+        assert len(records) == 5
+        for record in records:
+            assert record["blob_size"] == len(repo.get_object(record["blob_id"].encode()).as_raw_string())
+        assert [record["old_blob_size"] is None for record in records] == [False, True, False, True, True]
+
+
+def test_split_fused_record():
+    commits, variables = [], []
+    record = {"author_name": "Alice", "file_path": "main.py", "imports": ["os"], "variables": ["path"]}
+    imports_only = {"author_name": "Bob", "file_path": "setup.py", "imports": ["os"], "variables": []}
+    for fused_record in [record, {"author_name": "Bob", "file_path": "README.md"}, imports_only]:
+        split_fused_record(fused_record, commits.append, variables.append)
+
+    assert commits == [{"author_name": "Alice", "file_path": "main.py"},
+                       {"author_name": "Bob", "file_path": "README.md"},
+                       {"author_name": "Bob", "file_path": "setup.py"}]
+    assert variables == [{"author": "Alice", "path": "main.py", "imports": ["os"], "variables": ["path"]}]
+
+
+def normalized_records(path: Path) -> List[str]:
+    """
+    Records as sorted json lines, identifiers are compared as sets since their order isn't defined
+    """
+    records = [{key: sorted(value) if isinstance(value, list) else value for key, value in record.items()}
+               for record in read_records(path)]
+    return sorted(json.dumps(record, sort_keys=True) for record in records)
+
+
+@pytest.mark.skipif(not all(grammar_folder(TREE_SITTER_GRAMMARS_FOLDER, language).exists() for language in LANGUAGES),
+                    reason="tree-sitter grammars are not downloaded")
+@pytest.mark.parametrize("diff_scoped, find_copies", [(False, False), (True, True)])
+def test_fused_command_matches_two_passes(tmp_path: Path, bare_repo_url: str, diff_scoped: bool, find_copies: bool):
+    (tmp_path / "repos.txt").write_text(f"{bare_repo_url}\n")
+    (tmp_path / "temp").mkdir()
+    jobs = ["--temp_repo_path", str(tmp_path / "temp"), "--n_jobs", "1"]
+    copies = ["--find_copies" if find_copies else "--no-find_copies"]
+    parsing = [*[option for language in LANGUAGES for option in ["--supported_languages", language]],
+               "--diff_scoped" if diff_scoped else "--no-diff_scoped"]
+
+    run_cli("write-repo-commits", "--repos_file_path", str(tmp_path / "repos.txt"), "--commits_info_path",
+            str(tmp_path / "commits_info.txt"), "--commits_number", "-1", *jobs, *copies, data_dir=tmp_path)
+    run_cli("write-imports-variables", "--json_path", str(tmp_path / "commits_info.txt"), "--var_imp_path",
+            str(tmp_path / "variables_imports.txt"), *jobs, *parsing, data_dir=tmp_path)
+    run_cli("write-commits-imports-variables", "--repos_file_path", str(tmp_path / "repos.txt"),
+            "--commits_info_path", str(tmp_path / "fused_commits_info.txt"), "--var_imp_path",
+            str(tmp_path / "fused_variables_imports.txt"), "--commits_number", "-1", *jobs, *parsing, *copies,
+            data_dir=tmp_path)
+
+    commits_info = normalized_records(tmp_path / "commits_info.txt")
+    variables_imports = normalized_records(tmp_path / "variables_imports.txt")
+    # files without imports or without variables are skipped, with diff_scoped only changed lines are counted
+    assert len(commits_info) == 5 and len(variables_imports) == (3 if diff_scoped else 4)
+    assert normalized_records(tmp_path / "fused_commits_info.txt") == commits_info
+    assert normalized_records(tmp_path / "fused_variables_imports.txt") == variables_imports
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+
+from source_code.columnar import ColumnarWriter, get_dataset_format, pa, read_columnar
+from source_code.utils import read_repos_records, StreamWriter
+
+pytestmark = pytest.mark.skipif(pa is None, reason="pyarrow is not installed")
+
+
+def make_record(repo: int, number: int):
+    return {"repo_url": f"repo_{repo}", "author_name": f"author_{number % 3}", "author_email": "mail",
+            "commit_id": str(number), "programming_language": "python", "file_path": f"file_{number % 5}.py",
+            "blob_id": str(number), "added_lines_num": number, "deleted_lines_num": 0}
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_columnar_writer(tmp_path: Path, output_format: str):
+    records = [make_record(number % 2, number) for number in range(25)]
+    with ColumnarWriter(tmp_path / "commits", "commits_info", output_format, row_group_size=4) as writer:
+        for record in records:
+            writer.write(record)
+
+    assert get_dataset_format(tmp_path / "commits") == output_format
+    assert list(read_columnar(tmp_path / "commits")) == records
+    assert list(read_columnar(tmp_path / "commits", ["file_path", "added_lines_num"], batch_size=3)) == \
+        [{"file_path": record["file_path"], "added_lines_num": record["added_lines_num"]} for record in records]
+
+
+def test_stream_writer_parquet(tmp_path: Path):
+    with StreamWriter(tmp_path / "commits_info.txt", flush_every=10, output_format="parquet",
+                      schema_name="commits_info") as writer:
+        for repo in range(3):
+            writer.sink([make_record(repo, number) for number in range(repo * 10, repo * 10 + 10)])
+    assert writer.path == tmp_path / "commits_info.parquet"
+
+    repos_records = list(read_repos_records(writer.path, ["author_name"]))
+    assert [len(records) for records in repos_records] == [10, 10, 10]
+    assert [records[0]["repo_url"] for records in repos_records] == ["repo_0", "repo_1", "repo_2"]
+    assert all(set(record) == {"repo_url", "author_name"} for records in repos_records for record in records)
+
+
+def test_parquet_row_groups_dictionaries(tmp_path: Path):
+    with ColumnarWriter(tmp_path / "commits", "commits_info", "parquet", row_group_size=5) as writer:
+        for number in range(20):
+            writer.write({**make_record(0, number), "file_path": f"file_{number}.py"})
+
+    part_path, = (tmp_path / "commits").iterdir()
+    parquet_file = pa.parquet.ParquetFile(str(part_path))
+    assert parquet_file.num_row_groups == 4
+    for i in range(4):
+        column = parquet_file.read_row_group(i, columns=["file_path"]).column(0)
+        assert len(column.chunk(0).dictionary) == 5
@@ -1,8 +1,15 @@
+import subprocess
 from pathlib import Path
+from typing import Dict, List
 
 import pytest
+from dulwich.repo import Repo
 
-from source_code.git_repo_extract.commits_info import define_file_language, get_diffs_num
+from source_code.git_repo_extract.commits_info import define_file_language, get_commits_info_floored, get_diffs_num
+from tests.conftest import create_repo, git
+
+AUTHOR = ["-c", "user.name=Alice", "-c", "user.email=alice@mail.com"]
+CODE = "".join(f"value_{i} = {i}\n" for i in range(20))
 
 
 def get_code(path: Path):
@@ -36,3 +43,44 @@ def test_get_diffs_num(old_text: str, new_text: str, deleted_result: int, added_
     added, deleted = get_diffs_num(old_text, new_text)
     assert added == added_result
     assert deleted == deleted_result
+
+
+def walk(repo_path: Path, **kwargs) -> List[Dict]:
+    with Repo(str(repo_path)) as repo:
+        return list(get_commits_info_floored(repo, -1, "builtin", None, **kwargs))
+
+
+@pytest.mark.parametrize("rename_threshold, records_number, added, deleted", [(60, 2, 1, 1), (-1, 2, 20, 0)])
+def test_renames(tmp_path: Path, rename_threshold: int, records_number: int, added: int, deleted: int):
+    create_repo(tmp_path, [{"old_name.py": CODE},
+                           {"old_name.py": None, "new_name.py": CODE.replace("value_3 = 3", "value_3 = 4")}])
+
+    records = walk(tmp_path, rename_threshold=rename_threshold)
+    assert len(records) == records_number
+    renamed = records[0]
+    assert renamed["file_path"] == "new_name.py"
+    assert (renamed["added_lines_num"], renamed["deleted_lines_num"]) == (added, deleted)
+
+
+@pytest.mark.parametrize("merge_policy, merge_files", [("skip", []),
+                                                       ("combined", ["resolved.py"]),
+                                                       ("first_parent", ["branch.py", "resolved.py"])])
+def test_merge_policies(tmp_path: Path, merge_policy: str, merge_files: List[str]):
+    create_repo(tmp_path, [{"resolved.py": "x = 1\n"}])
+    git("checkout", "-q", "-b", "feature", cwd=tmp_path)
+    create_repo(tmp_path, [{"branch.py": "y = 1\n", "resolved.py": "x = 2\n"}])
+    git("checkout", "-q", "master", cwd=tmp_path)
+    create_repo(tmp_path, [{"resolved.py": "x = 3\n"}])
+    subprocess.run(["git", *AUTHOR, "merge", "-q", "feature"], cwd=str(tmp_path), capture_output=True)  # conflict
+    create_repo(tmp_path, [{"resolved.py": "x = 4\n"}])
+
+    records = walk(tmp_path, merge_policy=merge_policy)
+    merge_id = git("rev-parse", "HEAD", cwd=tmp_path).strip()
+    assert sorted(record["file_path"] for record in records if record["commit_id"] == merge_id) == merge_files
+    assert len([record for record in records if record["commit_id"] != merge_id]) == 4
+
+
+def test_unknown_merge_policy(tmp_path: Path):
+    create_repo(tmp_path, [{"main.py": CODE}])
+    with pytest.raises(ValueError):
+        walk(tmp_path, merge_policy="octopus")
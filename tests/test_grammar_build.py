@@ -0,0 +1,51 @@
+import multiprocessing
+from pathlib import Path
+
+from source_code.code_parsing.grammar_build import build_grammars_library, grammar_folder
+from tests.conftest import create_repo, git
+
+
+def create_grammar(path_to_grammars: Path, language: str) -> Path:
+    return create_repo(grammar_folder(path_to_grammars, language),
+                       [{"src/parser.c": f"int tree_sitter_{language}(void) {{ return 0; }}\n"}])
+
+
+def test_library_is_reused(tmp_path: Path):
+    for language in ["first", "second"]:
+        create_grammar(tmp_path, language)
+
+    library = build_grammars_library(["first", "second"], tmp_path, tmp_path / "lang_lib.so")
+    built_at = library.stat().st_mtime_ns
+
+    assert build_grammars_library(["second", "first"], tmp_path, tmp_path / "lang_lib.so") == library
+    assert library.stat().st_mtime_ns == built_at
+    assert build_grammars_library(["first"], tmp_path, tmp_path / "lang_lib.so") != library
+    assert library.exists()  # libraries of other language sets are kept
+
+
+def test_library_is_rebuilt_for_new_commit(tmp_path: Path):
+    folder = create_grammar(tmp_path, "first")
+    library = build_grammars_library(["first"], tmp_path, tmp_path / "lang_lib.so")
+
+    (folder / "src" / "parser.c").write_text("int tree_sitter_first(void) { return 1; }\n")
+    git("-c", "user.name=Author", "-c", "user.email=author@mail.com", "commit", "-q", "-am", "update", cwd=folder)
+
+    new_library = build_grammars_library(["first"], tmp_path, tmp_path / "lang_lib.so")
+    assert new_library != library
+    assert not library.exists()
+    assert sorted(path.name for path in tmp_path.glob("lang_lib*")) == [new_library.name]
+
+
+def build_in_process(path: Path) -> Path:
+    return build_grammars_library(["first", "second"], path, path / "lang_lib.so")
+
+
+def test_concurrent_build(tmp_path: Path):
+    for language in ["first", "second"]:
+        create_grammar(tmp_path, language)
+
+    with multiprocessing.Pool(4) as pool:
+        libraries = pool.map(build_in_process, [tmp_path] * 4)
+
+    assert len(set(libraries)) == 1
+    assert sorted(path.name for path in tmp_path.glob("*lang_lib*")) == [".lang_lib.so.lock", libraries[0].name]
@@ -0,0 +1,95 @@
+import random
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from source_code.git_repo_extract.heavy_hitters import SpaceSaving
+from source_code.git_repo_extract.star_track import count_top_repos, get_top_repos
+from tests.conftest import run_cli
+
+
+def zipf_stream(length: int, seed: int) -> List[str]:
+    rnd = random.Random(seed)
+    return [f"owner/repo_{int(rnd.paretovariate(1.1))}" for _ in range(length)]
+
+
+@pytest.mark.parametrize("capacity", [50, 200])
+def test_error_bound(capacity: int):
+    stream = zipf_stream(20000, 0)
+    exact = Counter(stream)
+    summary = SpaceSaving(capacity)
+    summary.update_many(stream)
+
+    assert len(summary) <= capacity
+    for item, count in summary.counts.items():
+        assert exact[item] <= count <= exact[item] + summary.error_bound()
+        assert count - summary.errors[item] <= exact[item]
+    for item, count in exact.items():
+        if count > summary.error_bound():
+            assert item in summary.counts
+
+    guaranteed = [item for item, _ in summary.guaranteed_top(10)]
+    assert set(guaranteed) <= {item for item, _ in exact.most_common(10)}
+
+
+def test_merge():
+    first, second = zipf_stream(10000, 1), zipf_stream(10000, 2)
+    exact = Counter(first + second)
+    summaries = [SpaceSaving(100), SpaceSaving(100)]
+    summaries[0].update_many(first)
+    summaries[1].update_many(second)
+    summaries[0].merge(summaries[1])
+
+    assert summaries[0].total == 20000
+    assert [item for item, _ in summaries[0].top(5)] == [item for item, _ in exact.most_common(5)]
+    for item, count in summaries[0].counts.items():
+        assert exact[item] <= count <= exact[item] + summaries[0].error_bound()
+
+
+def test_top_repos_from_files_and_summary(tmp_path: Path):
+    streams = [zipf_stream(5000, 3), zipf_stream(5000, 4)]
+    for index, stream in enumerate(streams):
+        (tmp_path / f"crawl_{index}.txt").write_text("".join(f"{line}\n" for line in stream))
+
+    count_top_repos([tmp_path / "crawl_0.txt"], 500).save(tmp_path / "summary.json")
+    summary = count_top_repos([tmp_path / "crawl_1.txt", tmp_path / "summary.json"], 500)
+    summary.save(tmp_path / "summary.json")
+
+    exact = Counter(streams[0] + streams[1]).most_common(3)
+    assert get_top_repos(tmp_path / "summary.json", 3) == exact
+    assert get_top_repos(tmp_path / "crawl_0.txt", 3, capacity=500) == get_top_repos(tmp_path / "crawl_0.txt", 3)
+
+
+def test_merge_different_capacities():
+    first, second = zipf_stream(10000, 5), zipf_stream(10000, 6)
+    exact = Counter(first + second)
+    small, large = SpaceSaving(20), SpaceSaving(1000)
+    small.update_many(first)
+    large.update_many(second)
+    merged = SpaceSaving(1000)
+    merged.merge(small)
+    merged.merge(large)
+
+    assert merged.error_bound() >= small.error_bound()
+    for item, count in merged.counts.items():
+        assert exact[item] <= count <= exact[item] + merged.error_bound()
+    for item, count in exact.items():
+        if count > merged.error_bound():
+            assert item in merged.counts
+    guaranteed = [item for item, _ in merged.guaranteed_top(5)]
+    assert set(guaranteed) <= {item for item, _ in exact.most_common(5)}
+
+
+def test_summary_command_rebuilds(tmp_path: Path):
+    stream = zipf_stream(2000, 7)
+    (tmp_path / "crawl.txt").write_text("".join(f"{line}\n" for line in stream))
+    args = ["write-top-repos-summary", str(tmp_path / "crawl.txt"), "--summary_path", str(tmp_path / "summary.json")]
+
+    run_cli(*args, data_dir=tmp_path)
+    run_cli(*args, data_dir=tmp_path)
+    assert SpaceSaving.load(tmp_path / "summary.json").total == len(stream)
+
+    run_cli(*args, "--merge", data_dir=tmp_path)
+    assert SpaceSaving.load(tmp_path / "summary.json").total == 2 * len(stream)
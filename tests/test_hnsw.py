@@ -0,0 +1,95 @@
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from source_code.similarity.embeddings import DeveloperIndex
+from source_code.similarity.hnsw import HNSWIndex, normalize
+
+
+def random_vectors(number: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(number, dimension)).astype(np.float32)
+
+
+def recall(index: HNSWIndex, vectors: np.ndarray, k: int) -> float:
+    normalized = np.stack([normalize(vector) for vector in vectors])
+    hits = 0
+    for query in range(len(vectors)):
+        exact = set(np.argsort(-(normalized @ normalized[query]))[:k].tolist())
+        hits += len(exact & {int(label) for label, _ in index.search(vectors[query], k)})
+    return hits / (k * len(vectors))
+
+
+@pytest.mark.parametrize("max_links", [4, 16])
+def test_recall(max_links: int):
+    vectors = random_vectors(500)
+    index = HNSWIndex(16, max_links=max_links, capacity=8)
+    for label, vector in enumerate(vectors):
+        index.add(str(label), vector)
+
+    assert len(index) == 500
+    assert recall(index, vectors, 10) > 0.9
+
+
+def test_load_and_insert(tmp_path: Path):
+    vectors = random_vectors(300)
+    index = HNSWIndex(16)
+    for label, vector in enumerate(vectors[:200]):
+        index.add(str(label), vector)
+    index.save(tmp_path)
+
+    loaded = HNSWIndex.load(tmp_path)
+    assert not loaded.vectors.flags.writeable
+    assert loaded.search(vectors[7], 3) == index.search(vectors[7], 3)
+
+    for label, vector in enumerate(vectors[200:], start=200):
+        loaded.add(str(label), vector)
+    assert recall(loaded, vectors, 10) > 0.9
+
+
+def test_load_during_save(tmp_path: Path):
+    vectors = random_vectors(300)
+    index = HNSWIndex(16)
+    for label, vector in enumerate(vectors[:100]):
+        index.add(str(label), vector)
+    index.save(tmp_path / "old")
+    for label, vector in enumerate(vectors[100:], start=100):
+        index.add(str(label), vector)
+    index.save(tmp_path / "new")
+
+    for name in ("vectors.npy", "links.npy", "levels.npy", "upper_links.npy"):  # arrays are replaced before meta
+        (tmp_path / "new" / name).replace(tmp_path / "old" / name)
+    loaded = HNSWIndex.load(tmp_path / "old")
+
+    assert len(loaded) == 100
+    assert all(int(label) < 100 for vector in vectors for label, _ in loaded.search(vector, 5))
+
+
+def test_replaced_vector_is_detached():
+    vectors = random_vectors(300)
+    index = HNSWIndex(16)
+    for label, vector in enumerate(vectors):
+        index.add(str(label), vector)
+
+    index.add("0", -vectors[0])
+    node = index.label_ids["0"]
+    referrers = set(np.flatnonzero((index.links[:len(index)] == node).any(axis=1)).tolist())
+    assert referrers <= set(index._neighbours(node, 0).tolist())
+    assert index.search(-vectors[0], 1)[0][0] == "0"
+    assert recall(index, np.concatenate([-vectors[:1], vectors[1:]]), 10) > 0.9
+
+
+def test_developer_update(tmp_path: Path):
+    index = DeveloperIndex(64)
+    index.update("anna", Counter({"numpy": 3}), Counter({"matrix": 2}))
+    index.update("boris", Counter({"numpy": 1}), Counter({"matrix": 1, "vector": 1}))
+    index.update("clara", Counter({"django": 2}), Counter({"request": 4}))
+    index.save(tmp_path)
+
+    index = DeveloperIndex.load(tmp_path)
+    assert index.similar("clara", 1)[0][0] != "clara"
+    index.update("clara", Counter({"numpy": 50}), Counter({"matrix": 50, "vector": 50}))
+
+    assert len(index) == 3
+    assert index.similar("clara", 1)[0][0] == "boris"
@@ -0,0 +1,57 @@
+import pytest
+
+from source_code.git_repo_extract.commits_info import define_file_language
+from source_code.git_repo_extract.language_detection import BuiltinDetector, get_detector, LanguageDetector
+
+
+@pytest.mark.parametrize("file_path, content, language",
+                         [("src/main.py", b"import os\n", "Python"),
+                          ("src/Main.java", b"public class Main {}\n", "Java"),
+                          ("web/index.js", b"const a = 1;\n", "JavaScript"),
+                          ("notebooks/eda.ipynb", b"{\"cells\": []}\n", "Jupyter Notebook"),
+                          ("Makefile", b"all:\n\techo 1\n", "Makefile"),
+                          ("bin/run", b"#!/usr/bin/env python3\nprint(1)\n", "Python"),
+                          ("bin/build", b"#!/bin/bash\necho 1\n", "Shell"),
+                          ("include/parser.h", b"#include <vector>\nclass Parser {};\n", "C++"),
+                          ("include/parser.h", b"#import <Foundation/Foundation.h>\n@interface A\n@end\n", "Objective-C"),
+                          ("include/parser.h", b"int parse(char *s);\n", "C"),
+                          ("scripts/run.pl", b"use strict;\nmy $a = 1;\n", "Perl"),
+                          ("unknown.extension", b"text\n", "")])
+def test_builtin_detector_language(file_path: str, content: bytes, language: str):
+    entity = BuiltinDetector().detect(file_path, content)
+
+    assert entity["language"] == language
+    assert entity["type"] == "Text"
+
+
+@pytest.mark.parametrize("file_path, content, file_type, vendored",
+                         [("images/logo.png", b"\x89PNG\r\n", "Image", False),
+                          ("data/model.py", b"import os\0\0", "Binary", False),
+                          ("node_modules/react/index.js", b"const a = 1;\n", "Text", True),
+                          ("static/jquery-3.1.min.js", b"const a = 1;\n", "Text", True),
+                          ("src/vendored.py", b"import os\n", "Text", False)])
+def test_builtin_detector_type(file_path: str, content: bytes, file_type: str, vendored: bool):
+    entity = BuiltinDetector().detect(file_path, content)
+
+    assert entity["type"] == file_type
+    assert entity["vendored"] == vendored
+
+
+def test_define_file_language_skips_vendored():
+    assert define_file_language("lib/main.py", "import os\n", dict(), "builtin") == "python"
+    assert define_file_language("vendor/main.py", "import os\n", dict(), "builtin") is None
+
+
+def test_get_detector():
+    assert get_detector() is get_detector("builtin")
+    with pytest.raises(ValueError):
+        get_detector("unknown")
+
+
+def test_detector_must_implement_detect():
+    class IncompleteDetector(LanguageDetector):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteDetector()
+    assert isinstance(get_detector(), LanguageDetector)
@@ -0,0 +1,45 @@
+import pytest
+
+from source_code.git_repo_extract.commits_info import get_diffs_num
+from source_code.git_repo_extract.line_diff import changed_line_blocks, count_changed_lines, lcs_length
+
+
+@pytest.mark.parametrize("old_text, new_text, deleted_result, added_result",
+                         [("", "", 0, 0),
+                          ("line1\nline2", "line1\nline2", 0, 0),
+                          ("", "line1\nline2", 0, 2),
+                          ("line1\nline2", "", 2, 0),
+                          ("-- comment\nline2", "++i;\nline2", 1, 1),
+                          ("a\nb\nc\nd\n", "d\na\nb\nc\n", 1, 1),
+                          (b"a\nb\nc\n", b"a\nx\nc\ny\n", 1, 2),
+                          ("a\nb", "a\nb\n", 1, 1),
+                          (b"a\nb\n", b"a\nb", 1, 1),
+                          ("a\nb\n", "a\r\nb\n", 1, 1)])
+def test_count_changed_lines(old_text, new_text, deleted_result: int, added_result: int):
+    added, deleted = count_changed_lines(old_text, new_text)
+    assert added == added_result
+    assert deleted == deleted_result
+
+
+@pytest.mark.parametrize("old_text, new_text, blocks",
+                         [("a\nb", "a\nb", []),
+                          ("a\nb\nc", "a\nx\nc", [(1, 2, 1, 2)]),
+                          ("a\nb\nc", "a\nb\ny\nc", [(2, 2, 2, 3)]),
+                          ("a\nb", "a\nb\n", [(1, 2, 1, 2)]),
+                          (b"a\nb\nc\nd\ne", b"x\nb\nc\ne", [(0, 1, 0, 1), (3, 4, 3, 3)])])
+def test_changed_line_blocks(old_text, new_text, blocks):
+    assert changed_line_blocks(old_text, new_text) == blocks
+
+
+@pytest.mark.parametrize("old_lines, new_lines, result",
+                         [([1, 2, 3, 4], [1, 3, 4, 2], 3),
+                          ([1, 2, 1, 2], [2, 1, 2, 1], 3),
+                          ([1, 1, 1], [2, 2], 0)])
+def test_lcs_length(old_lines, new_lines, result: int):
+    assert lcs_length(old_lines, new_lines) == result
+
+
+def test_get_diffs_num_large_file():
+    old_text = "\n".join(f"line {i}" for i in range(20000))
+    new_text = old_text.replace("line 100\n", "").replace("line 15000\n", "line 15000\nnew line\n")
+    assert get_diffs_num(old_text, new_text) == (1, 1)
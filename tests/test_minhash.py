@@ -0,0 +1,62 @@
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from source_code.similarity.minhash import AuthorSketches, choose_bands, estimate_jaccard, lsh_candidates, \
+    merge_signatures, MinHasher, similar_pairs
+
+
+@pytest.mark.parametrize("first,second", [(range(0, 100), range(50, 150)),
+                                          (range(0, 100), range(0, 90)),
+                                          (range(0, 100), range(100, 200))])
+def test_jaccard_estimate(first: range, second: range):
+    hasher = MinHasher(512)
+    first, second = {f"token_{i}" for i in first}, {f"token_{i}" for i in second}
+
+    estimate = estimate_jaccard(hasher.signature(first), hasher.signature(second))
+    assert abs(estimate - len(first & second) / len(first | second)) < 0.07
+
+
+def test_merge_is_union():
+    hasher = MinHasher()
+    tokens = [f"token_{i}" for i in range(100)]
+
+    merged = merge_signatures(hasher.signature(tokens[:10]), hasher.signature(tokens[10:]), hasher.empty())
+    assert np.array_equal(merged, hasher.signature(tokens))
+
+
+def test_sketches_merge_and_save(tmp_path: Path):
+    records = [{"author": "anna", "imports": ["numpy"], "variables": ["matrix"]},
+               {"author": "boris", "imports": ["django"], "variables": []},
+               {"author": "anna", "imports": ["scipy"], "variables": ["vector"]}]
+    whole, first, second = AuthorSketches(), AuthorSketches(), AuthorSketches()
+    whole.update_records(records)
+    first.update_records(records[:1])
+    second.update_records(records[1:])
+    first.merge(second)
+
+    first.save(tmp_path / "sketches.npz")
+    loaded = AuthorSketches.load(tmp_path / "sketches.npz")
+    for author in ["anna", "boris"]:
+        assert np.array_equal(loaded.signatures[author], whole.signatures[author])
+
+
+def test_lsh_finds_similar_pairs():
+    rng = np.random.default_rng(0)
+    sketches = AuthorSketches()
+    for group in range(30):
+        base = {f"group_{group}_{i}" for i in range(50)}
+        for member in range(3):
+            noise = {f"noise_{value}" for value in rng.integers(0, 10 ** 6, 5)}
+            sketches.update(f"author_{group}_{member}", base | noise)
+
+    authors, signatures = sketches.matrix()
+    expected = {(first, second) for first, second in combinations(range(len(authors)), 2)
+                if estimate_jaccard(signatures[first], signatures[second]) >= 0.5}
+    assert expected <= lsh_candidates(signatures, *choose_bands(128, 0.5))
+
+    pairs = list(similar_pairs(sketches, 0.5))
+    assert len(pairs) == 90
+    assert all(pair["first"].rsplit("_", 1)[0] == pair["second"].rsplit("_", 1)[0] for pair in pairs)
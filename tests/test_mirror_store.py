@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+from git.exc import GitCommandError
+
+from source_code.git_repo_extract.commits_info import get_commits_info_floored
+from source_code.git_repo_extract import mirror_store
+from source_code.git_repo_extract.mirror_store import get_repo_size_estimator, MirrorStore, operate_mirrored_repo
+from source_code.git_repo_extract.repo_ops import operate_temporary_repo
+from tests.conftest import create_repo, git
+
+
+def test_mirror_is_fetched_on_reuse(tmp_path: Path, source_repo: Path, bare_repo_url: str):
+    store = MirrorStore(tmp_path / "mirrors", refresh_interval=0)
+    with store.open(bare_repo_url) as repo:
+        first_head = repo.head()
+
+    (source_repo / "new.py").write_text("import json\n")
+    git("add", "-A", cwd=source_repo)
+    git("-c", "user.name=Alice", "-c", "user.email=alice@mail.com", "commit", "-q", "-m", "new", cwd=source_repo)
+    git("push", "-q", bare_repo_url, "master", cwd=source_repo)
+
+    with store.open(bare_repo_url) as repo:
+        assert repo.head() != first_head
+        assert repo[repo.head()].parents == [first_head]
+
+    mirrors = [entry.name for entry in (tmp_path / "mirrors").iterdir() if entry.is_dir()]
+    assert mirrors == [MirrorStore.mirror_name(bare_repo_url)]
+
+
+def test_mirrors_are_evicted(tmp_path: Path, bare_repo_url: str):
+    other_url = f"file://{create_repo(tmp_path / 'other' / 'repo')}"
+    store = MirrorStore(tmp_path / "mirrors", disk_budget=0)
+
+    with store.open(bare_repo_url):
+        pass
+    assert store.evict() == []  # budget check is done on exit, nothing left
+
+    store.disk_budget = 10 ** 9
+    with store.open(bare_repo_url):
+        pass
+    with store.open(other_url):
+        pass
+    store.disk_budget = 1
+    assert store.evict() == [MirrorStore.mirror_name(bare_repo_url), "other_repo"]
+
+
+def test_evict_uses_recorded_sizes(tmp_path: Path, bare_repo_url: str, monkeypatch: pytest.MonkeyPatch):
+    store = MirrorStore(tmp_path / "mirrors")
+    with store.open(bare_repo_url):
+        pass
+    name = MirrorStore.mirror_name(bare_repo_url)
+    assert store.sizes()[name] == mirror_store.folder_size(tmp_path / "mirrors" / name) > 0
+
+    def walk_store(path: Path) -> int:
+        raise AssertionError(f"{path} is walked")
+
+    monkeypatch.setattr(mirror_store, "folder_size", walk_store)
+    with store.open(bare_repo_url):  # mirror is up to date, so it isn't measured again
+        pass
+    store.disk_budget = 1
+    assert store.evict() == [name]
+    assert store.sizes() == {}
+
+
+def test_operate_mirrored_repo(tmp_path: Path, bare_repo_url: str):
+    result = operate_mirrored_repo(str(tmp_path / "mirrors"), bare_repo_url,
+                                   get_commits_info_floored, (-1, "builtin", None))
+    assert len(result) == 5
+    assert all(entity["repo_url"] == bare_repo_url for entity in result)
+
+
+def test_failed_clone_is_not_taken_for_mirror(tmp_path: Path, bare_repo_url: str):
+    store = MirrorStore(tmp_path / "mirrors")
+    missing_url = f"file://{tmp_path / 'missing.git'}"
+    with pytest.raises(GitCommandError):
+        with store.open(missing_url):
+            pass
+    assert not (tmp_path / "mirrors" / MirrorStore.mirror_name(missing_url)).exists()
+
+    name = MirrorStore.mirror_name(bare_repo_url)
+    (tmp_path / "mirrors" / name).mkdir()  # left by clone that was killed
+    with store.open(bare_repo_url) as repo:
+        assert repo.path == str(tmp_path / "mirrors" / name)
+        assert len(list(repo.get_walker())) == 5
+
+
+def test_sizes_of_temporary_clones_are_recorded(tmp_path: Path, bare_repo_url: str):
+    sizes_path = tmp_path / "repo_sizes.sqlite"
+    estimate = get_repo_size_estimator(None, sizes_path)
+    assert estimate(bare_repo_url) == 0
+
+    (tmp_path / "temp").mkdir()
+    result = operate_temporary_repo(str(tmp_path / "temp"), bare_repo_url, get_commits_info_floored,
+                                    (-1, "builtin", None), sizes_path=sizes_path)
+    assert len(result) == 5
+    assert estimate(bare_repo_url) > 0
+    assert get_repo_size_estimator(tmp_path / "mirrors", sizes_path)(bare_repo_url) == 0  # mirror isn't cloned yet
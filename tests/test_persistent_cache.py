@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from source_code.git_repo_extract.commits_info import define_file_language
+from source_code.persistent_cache import PersistentCache
+
+
+def test_persistent_cache(tmp_path: Path):
+    cache = PersistentCache(tmp_path / "cache.sqlite", memory_size=2)
+    cache["a"] = "python"
+    cache["b"] = ""
+    cache["c"] = ["java"]
+    cache.close()
+
+    reopened = PersistentCache(tmp_path / "cache.sqlite", memory_size=2)
+    assert reopened.get("a") == "python"
+    assert reopened.get("b") == ""
+    assert reopened.get("c") == ["java"]
+    assert reopened.get("d") is None
+    assert "c" in reopened and "d" not in reopened
+    assert reopened.stats()["hits"] == 3
+    assert reopened.stats()["misses"] == 1
+
+
+def test_define_file_language_uses_cache(tmp_path: Path):
+    cache = PersistentCache(tmp_path / "cache.sqlite")
+    blob_id = "0" * 40
+
+    assert define_file_language("src/main.py", "import os\n", cache, blob_id=blob_id) == "python"
+    assert define_file_language("other/copy.py", "import os\n", cache, blob_id=blob_id) == "python"
+    assert define_file_language("images/logo.png", b"\x89PNG", cache, blob_id=blob_id) is None
+    assert define_file_language("images/logo.png", b"\x89PNG", cache, blob_id=blob_id) is None
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_language_key_depends_on_path(tmp_path: Path):
+    cache = PersistentCache(tmp_path / "cache.sqlite")
+    blob_id = "0" * 40
+
+    assert define_file_language("vendor/lib.js", "let x = 1;\n", cache, "builtin", blob_id=blob_id) is None
+    assert define_file_language("src/lib.js", "let x = 1;\n", cache, "builtin", blob_id=blob_id) == "javascript"
+    assert define_file_language("Makefile", "all:\n", cache, "builtin", blob_id=blob_id) == "makefile"
+    assert define_file_language("Dockerfile", "all:\n", cache, "builtin", blob_id=blob_id) == "dockerfile"
+    assert define_file_language("src/lib.js", "let x = 1;\n", cache, blob_id=blob_id) == "javascript"
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,70 @@
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from source_code import profiling
+from source_code.profiling import disable_profiling, enable_profiling, get_profiler, profiled, repo_context, span, \
+    timed_iterator, write_report
+
+
+@pytest.fixture
+def profile_dir(tmp_path: Path):
+    enable_profiling(tmp_path, trace=True)
+    yield tmp_path
+    disable_profiling()
+
+
+@profiled("parse")
+def slow_parse() -> int:
+    time.sleep(0.002)
+    return 1
+
+
+def test_spans_per_repo(profile_dir: Path):
+    for repo, commits in [("user/first", 3), ("user/second", 1)]:
+        with repo_context(repo):
+            for _ in timed_iterator(range(commits), "walk"):
+                with span("blob_load"):
+                    pass
+                assert slow_parse() == 1
+
+    report = write_report(profile_dir)
+    repos = {(row["key"], row["span"]): row for row in report["repos"]}
+    assert repos[("user/first", "parse")]["count"] == 3
+    assert repos[("user/second", "parse")]["count"] == 1
+    assert repos[("user/first", "walk")]["count"] == 4  # the last call finds iterator exhausted
+    assert repos[("user/first", "repo")]["total_s"] >= repos[("user/first", "parse")]["total_s"] > 0
+
+    workers = {(row["key"], row["span"]): row for row in report["workers"]}
+    assert workers[(os.getpid(), "blob_load")]["count"] == 4
+
+    with (profile_dir / "report.csv").open() as f:
+        assert len(list(csv.DictReader(f))) == len(report["repos"]) + len(report["workers"])
+    trace = json.loads((profile_dir / "trace.json").read_text())["traceEvents"]
+    assert {event["name"] for event in trace} == {"repo", "walk", "blob_load", "parse"}
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in trace)
+
+
+def test_trace_events_are_capped(profile_dir: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(profiling, "MAX_TRACE_EVENTS", 3)
+    for repo in ["user/first", "user/second"]:  # spans are flushed after each repository
+        with repo_context(repo):
+            for _ in range(2):
+                with span("parse"):
+                    pass
+
+    report = write_report(profile_dir)
+    assert sum(row["count"] for row in report["repos"] if row["span"] == "parse") == 4
+    assert len(json.loads((profile_dir / "trace.json").read_text())["traceEvents"]) == 3
+
+
+def test_disabled(tmp_path: Path):
+    disable_profiling()
+    with repo_context("user/repo"), span("parse"):
+        assert slow_parse() == 1
+    assert get_profiler() is None
+    assert list(tmp_path.iterdir()) == []
@@ -4,6 +4,7 @@ import dulwich.repo
 import pytest
 
 from source_code.git_repo_extract.repo_ops import try_find_repo
+from tests.conftest import git
 
 
 @pytest.mark.parametrize("path, repo_name",
@@ -13,3 +14,23 @@ def test_try_find_repo(path: pathlib.Path, repo_name: str):
     assert_repo = dulwich.repo.Repo(str(path / "tested_repo"))
 
     assert test_repo.path == assert_repo.path
+
+
+def test_try_find_repo_checks_remote(tmp_path: pathlib.Path):
+    for folder, url in [("user_repo_fork_x1y2", "https://github.com/user/repo_fork"),
+                        ("user_repo_a1b2", "https://github.com/user/repo")]:
+        (tmp_path / folder).mkdir()
+        git("init", "-q", cwd=tmp_path / folder)
+        git("remote", "add", "origin", url, cwd=tmp_path / folder)
+
+    assert try_find_repo(str(tmp_path), "user/repo").path == str(tmp_path / "user_repo_a1b2")
+    assert try_find_repo(str(tmp_path), "user/repo_fork").path == str(tmp_path / "user_repo_fork_x1y2")
+    assert try_find_repo(str(tmp_path), "user/rep") is None
+
+
+def test_try_find_repo_removes_stale_folders(tmp_path: pathlib.Path):
+    (tmp_path / "user_repo_k3j2").mkdir()  # left by clone whose worker was killed
+    (tmp_path / "user_repo").mkdir()
+    assert try_find_repo(str(tmp_path), "user/repo") is None
+    assert not (tmp_path / "user_repo_k3j2").exists()
+    assert (tmp_path / "user_repo").exists()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from source_code.scheduling import effective_n_jobs, schedule_length, WorkerPool
+
+
+def sleep_and_return(value: int, seconds: float = 0.0):
+    time.sleep(seconds)
+    return value
+
+
+def fail_once(marker: str):
+    if not os.path.exists(marker):
+        Path(marker).touch()
+        raise RuntimeError("first attempt fails")
+    return "ok"
+
+
+def test_worker_pool_results():
+    with WorkerPool(3) as pool:
+        results = list(pool.run(sleep_and_return, ((i, {"value": i * i}) for i in range(20))))
+
+    assert sorted((result.key, result.value) for result in results) == [(i, i * i) for i in range(20)]
+    assert not any(result.failed for result in results)
+    assert pool.utilization()["tasks"] == 20
+
+
+def test_worker_pool_takes_tasks_lazily():
+    taken = []
+
+    def tasks():
+        for i in range(1000):
+            taken.append(i)
+            yield i, {"value": i}
+
+    with WorkerPool(2) as pool:
+        results = pool.run(sleep_and_return, tasks())
+        next(results)
+        assert len(taken) <= 3  # one task per worker and the one taken after the first result
+        assert len(list(results)) == 999
+
+
+def test_worker_pool_does_not_wait_for_slow_task():
+    tasks = [(0, {"value": 0, "seconds": 1.0})] + [(i, {"value": i, "seconds": 0.1}) for i in range(1, 10)]
+    with WorkerPool(2) as pool:
+        start = time.monotonic()
+        list(pool.run(sleep_and_return, tasks))
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 1.5  # batches of 2 would take 1.0 + 4 * 0.1 seconds at least
+    report = pool.utilization(batch_size=2)
+    assert report["batches_wall_time"] > report["wall_time"]
+
+
+def sleep_in_folder(parent: str, seconds: float):
+    with tempfile.TemporaryDirectory(dir=parent):
+        time.sleep(seconds)
+
+
+def test_worker_pool_timeout_cleans_up(tmp_path: Path):
+    with WorkerPool(1, timeout=0.5) as pool:
+        result, = pool.run(sleep_in_folder, [("slow", {"parent": str(tmp_path), "seconds": 10})])
+
+    assert result.failed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_worker_pool_retries(tmp_path: Path):
+    with WorkerPool(1, retries=1) as pool:
+        result, = pool.run(fail_once, [("task", {"marker": str(tmp_path / "marker")})])
+
+    assert result.value == "ok"
+    assert result.attempts == 2
+
+
+def test_worker_pool_timeout():
+    with WorkerPool(2, timeout=0.5, retries=1) as pool:
+        results = {result.key: result for result in pool.run(sleep_and_return, [("slow", {"value": 1, "seconds": 10}),
+                                                                              ("fast", {"value": 2})])}
+        assert results["slow"].failed
+        assert results["slow"].attempts == 2
+        assert results["fast"].value == 2
+
+        result, = pool.run(sleep_and_return, [("after_restart", {"value": 3})])  # workers were restarted
+        assert result.value == 3
+
+
+@pytest.mark.parametrize("durations, n_workers, result",
+                         [([1.0, 1.0, 1.0], 3, 1.0),
+                          ([3.0, 1.0, 1.0, 1.0], 2, 3.0),
+                          ([1.0, 1.0, 1.0], 1, 3.0)])
+def test_schedule_length(durations, n_workers: int, result: float):
+    assert schedule_length(durations, n_workers) == result
+
+
+def test_effective_n_jobs():
+    assert effective_n_jobs(0) == 1
+    assert effective_n_jobs(2) == 2
+    assert effective_n_jobs(-1) == os.cpu_count()
@@ -0,0 +1,81 @@
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from source_code.similarity.embeddings import DeveloperIndex
+from source_code.similarity.service import collect_author_metadata, LatencyHistogram, make_server, SimilarityService
+
+COMMITS_RECORDS = [
+    {"author_name": "anna", "programming_language": "Python", "repo_url": "numeric"},
+    {"author_name": "boris", "programming_language": "Python", "repo_url": "numeric"},
+    {"author_name": "clara", "programming_language": "Java", "repo_url": "web"},
+    {"author_name": "dmitry", "programming_language": "Java", "repo_url": "numeric"},
+]
+
+
+@pytest.fixture
+def server_url():
+    index = DeveloperIndex(64)
+    index.update("anna", Counter({"numpy": 3}), Counter({"matrix": 2}))
+    index.update("boris", Counter({"numpy": 2}), Counter({"matrix": 1, "vector": 1}))
+    index.update("clara", Counter({"numpy": 1}), Counter({"vector": 2}))
+    index.update("dmitry", Counter({"spring": 2}), Counter({"request": 4}))
+    service = SimilarityService(index, collect_author_metadata(COMMITS_RECORDS), max_wait=0.01)
+
+    with make_server(service, port=0) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.server_port}"
+        server.shutdown()
+
+
+def get(url: str) -> Tuple[int, Dict]:
+    try:
+        with urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("query,expected", [("author=anna&k=1", ["boris"]),
+                                            ("author=anna&k=3&language=java", ["clara", "dmitry"]),
+                                            ("author=anna&k=3&repo=web", ["clara"])])
+def test_similar(server_url: str, query: str, expected: list):
+    status, content = get(f"{server_url}/similar?{query}")
+
+    assert status == 200
+    assert sorted(neighbour["author"] for neighbour in content["neighbours"]) == expected
+
+
+def test_errors(server_url: str):
+    assert get(f"{server_url}/similar?author=unknown")[0] == 404
+    assert get(f"{server_url}/similar?k=2")[0] == 400
+    assert get(f"{server_url}/unknown")[0] == 404
+
+
+def test_batching_and_stats(server_url: str):
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda _: get(f"{server_url}/similar?author=boris&k=2"), range(16)))
+    assert len({json.dumps(content) for _, content in results}) == 1
+
+    _, stats = get(f"{server_url}/stats")
+    assert stats["latency"]["count"] == 16
+    assert stats["cache"]["hits"] + stats["batches"] <= 16
+    assert stats["batches"] < 16
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram([1, 10, float("inf")])
+    for seconds in [0.0005, 0.0005, 0.005, 2]:
+        histogram.observe(seconds)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["p50_ms"] == 1
+    assert snapshot["p90_ms"] is None
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from source_code.similarity.author_vectors import build_author_features, get_similar_developers, top_k_neighbours
+
+VARIABLES_RECORDS = [
+    {"author": "anna", "imports": ["numpy", "scipy"], "variables": ["matrix", "vector"]},
+    {"author": "boris", "imports": ["numpy", "scipy.sparse"], "variables": ["matrix"]},
+    {"author": "clara", "imports": ["django"], "variables": ["request", "response"]},
+    {"author": "dmitry", "imports": ["flask", "django"], "variables": ["request"]},
+    {"author": "eva", "imports": ["numpy"], "variables": ["vector", "request"]},
+    {"author": "anna", "imports": ["scipy.sparse"], "variables": []},
+]
+COMMITS_RECORDS = [
+    {"author_name": "anna", "programming_language": "Python", "added_lines_num": 10, "deleted_lines_num": 2},
+    {"author_name": "clara", "programming_language": "Python", "added_lines_num": 5, "deleted_lines_num": 0},
+    {"author_name": "fedor", "programming_language": "Java", "added_lines_num": 7, "deleted_lines_num": 1},
+]
+
+
+def brute_force_scores(features, k):
+    similarities = (features @ features.T).toarray()
+    np.fill_diagonal(similarities, 0)
+    return [[score for score in sorted(row, reverse=True)[:k] if score > 0] for row in similarities]
+
+
+def test_features_are_unit():
+    authors, features = build_author_features(VARIABLES_RECORDS, COMMITS_RECORDS, max_df=1.0)
+
+    assert authors == ["anna", "boris", "clara", "dmitry", "eva", "fedor"]
+    assert np.allclose(np.sqrt(features.multiply(features).sum(axis=1)).A1, 1)
+
+
+@pytest.mark.parametrize("memory_budget", [1, 200, 10 ** 9])
+def test_top_k_doesnt_depend_on_block_size(memory_budget: int):
+    _, features = build_author_features(VARIABLES_RECORDS, COMMITS_RECORDS, max_df=1.0)
+
+    found = {row: scores for row, _, scores in top_k_neighbours(features, 2, memory_budget)}
+    for row, expected in enumerate(brute_force_scores(features, 2)):
+        assert np.allclose(found[row], expected)
+
+
+def test_similar_developers():
+    authors, features = build_author_features(VARIABLES_RECORDS, COMMITS_RECORDS, language_weight=0.0, max_df=1.0)
+    similar = {record["author"]: [neighbour["author"] for neighbour in record["neighbours"]]
+               for record in get_similar_developers(authors, features, k=1)}
+
+    assert similar["anna"] == ["boris"]
+    assert similar["clara"] == ["dmitry"]
+    assert similar["fedor"] == []
+
+
+def test_frequent_tokens_are_ignored():
+    authors, features = build_author_features(VARIABLES_RECORDS, max_df=0.5, language_weight=0.0)
+    similar = {record["author"]: [neighbour["author"] for neighbour in record["neighbours"]]
+               for record in get_similar_developers(authors, features, k=5)}
+
+    # "numpy" is used by 3 of 5 authors, so it doesn't make eva similar to boris
+    assert "boris" not in similar["eva"]
@@ -0,0 +1,113 @@
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+import requests
+
+from source_code.git_repo_extract.star_track import get_stargazer_info
+from source_code.git_repo_extract.stargazer_crawler import GitHubClient, TokenBucket
+from tests.fake_github import FakeGitHub
+
+STARGAZERS = {"owner/repo": [f"user_{i}" for i in range(25)]}
+STARRED = {f"user_{i}": [f"owner_{j}/starred_{j}" for j in range(i % 7)] for i in range(25)}
+del STARRED["user_3"]  # account deleted after starring
+
+
+def expected_lines(max_user_stars: int = 300, limit_stargazers: int = 1000) -> Counter:
+    lines = Counter()
+    for login in STARGAZERS["owner/repo"][:limit_stargazers]:
+        lines.update(STARRED.get(login, [])[:max_user_stars])
+    return lines
+
+
+def read_lines(path: Path) -> Counter:
+    return Counter(path.read_text().splitlines())
+
+
+@pytest.mark.parametrize("max_user_stars,limit_stargazers", [(300, 1000), (3, 10)])
+def test_crawl(tmp_path: Path, max_user_stars: int, limit_stargazers: int):
+    with FakeGitHub(STARGAZERS, STARRED) as github:
+        stats = get_stargazer_info("owner/repo", "token", tmp_path / "repos.txt", max_user_stars, per_page=2,
+                                   limit_stargazers=limit_stargazers, n_workers=4, api_url=github.url)
+
+    assert read_lines(tmp_path / "repos.txt") == expected_lines(max_user_stars, limit_stargazers)
+    assert stats["crawled"] == min(limit_stargazers, 25)
+
+
+def test_resume_and_etags(tmp_path: Path):
+    arguments = dict(per_page=3, n_workers=4, checkpoints_path=tmp_path / "checkpoints.sqlite",
+                     etag_cache_path=tmp_path / "etags.sqlite")
+    with FakeGitHub(STARGAZERS, STARRED) as github:
+        first = get_stargazer_info("owner/repo", "token", tmp_path / "repos.txt", limit_stargazers=10,
+                                   api_url=github.url, **arguments)
+        second = get_stargazer_info("owner/repo", "token", tmp_path / "repos.txt", api_url=github.url, **arguments)
+
+    assert read_lines(tmp_path / "repos.txt") == expected_lines()
+    assert (first["crawled"], second["crawled"], second["skipped"]) == (10, 15, 10)
+    assert second["not_modified"] > 0
+    assert github.paths["/users/user_0/starred"] == 1
+
+
+def test_etags_without_checkpoints(tmp_path: Path):
+    arguments = dict(per_page=3, n_workers=2, etag_cache_path=tmp_path / "etags.sqlite")
+    with FakeGitHub(STARGAZERS, STARRED) as github:
+        first = get_stargazer_info("owner/repo", "token", tmp_path / "first.txt", api_url=github.url, **arguments)
+        second = get_stargazer_info("owner/repo", "token", tmp_path / "second.txt", api_url=github.url, **arguments)
+
+    assert read_lines(tmp_path / "first.txt") == read_lines(tmp_path / "second.txt")
+    assert first["not_modified"] == 0
+    assert second["not_modified"] == second["requests"] - 1  # all but the deleted account
+
+
+def test_rate_limit_waits_for_reset(tmp_path: Path):
+    with FakeGitHub(STARGAZERS, STARRED, rate_limited_requests=3) as github:
+        start = time.time()
+        get_stargazer_info("owner/repo", "token", tmp_path / "repos.txt", n_workers=4, api_url=github.url)
+
+    assert github.statuses[403] == 3
+    assert time.time() - start >= 0.5
+    assert read_lines(tmp_path / "repos.txt") == expected_lines()
+
+
+def test_other_resource_rate_limit_blocks_bucket():
+    client = GitHubClient("token")
+    response = requests.Response()
+    response.status_code = 403
+    reset = time.time() + 100
+    response.headers.update({"x-ratelimit-resource": "search", "x-ratelimit-remaining": "0",
+                             "x-ratelimit-reset": str(reset)})
+
+    client._update_bucket(response)
+    assert client.bucket.blocked_until == 0.0
+    assert client._is_rate_limited(response)
+    assert client.bucket.blocked_until == reset
+
+
+def test_resume_into_other_path(tmp_path: Path):
+    arguments = dict(per_page=3, n_workers=4, checkpoints_path=tmp_path / "checkpoints.sqlite")
+    with FakeGitHub(STARGAZERS, STARRED) as github:
+        get_stargazer_info("owner/repo", "token", tmp_path / "first.txt", api_url=github.url, **arguments)
+        second = get_stargazer_info("owner/repo", "token", tmp_path / "second.txt", api_url=github.url, **arguments)
+
+    assert second["skipped"] == 0
+    assert read_lines(tmp_path / "first.txt") == read_lines(tmp_path / "second.txt") == expected_lines()
+
+
+def test_bad_token(tmp_path: Path):
+    with FakeGitHub(STARGAZERS, STARRED) as github:
+        with pytest.raises(ValueError):
+            get_stargazer_info("owner/repo", "wrong", tmp_path / "repos.txt", api_url=github.url)
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    start = time.time()
+    for _ in range(11):
+        bucket.acquire()
+    assert 0.09 <= time.time() - start < 1
+
+    bucket.update(limit=5000, remaining=0, reset=time.time() + 0.3)
+    start = time.time()
+    bucket.acquire()
+    assert time.time() - start >= 0.25
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+import pytest
+from dulwich.object_store import iter_tree_contents
+from dulwich.repo import Repo
+
+from benchmarks.synthetic_repos import create_synthetic_repo, parse_language_mix
+
+
+@pytest.mark.parametrize("commits_number,files_number", [(10, 5), (30, 12)])
+def test_synthetic_repo(tmp_path: Path, commits_number: int, files_number: int):
+    languages = parse_language_mix(["python=2", "java=1", "text"])
+    paths = [create_synthetic_repo(tmp_path / name, commits_number, files_number, file_lines=20,
+                                   languages=languages, authors_number=3, seed=7) for name in ["first", "second"]]
+    repos = [Repo(str(path)) for path in paths]
+    assert repos[0].head() == repos[1].head()  # generation is reproducible
+
+    walk = list(repos[0].get_walker())
+    assert len(walk) == commits_number
+    assert len({entry.commit.author for entry in walk}) == 3
+
+    tree = repos[0][repos[0][repos[0].head()].tree]
+    files = [entry.path for entry in iter_tree_contents(repos[0].object_store, tree.id)]
+    assert len(files) == files_number
+    assert {path.rsplit(b".", 1)[1] for path in files} <= {b"py", b"java", b"md"}
+
+
+def test_unknown_language():
+    with pytest.raises(ValueError):
+        parse_language_mix(["cobol=1"])
@@ -1,9 +1,15 @@
+import os
 import pathlib
 from typing import List
 
 import pytest
+from dulwich.repo import Repo
 
-from source_code.utils import parallel_function, split_into_batches
+from source_code.git_repo_extract.repo_ops import operate_existing_repo
+from source_code.scheduling import WorkerPool
+from source_code.persistent_cache import get_cache
+from source_code.utils import Checkpoint, FileLock, parallel_function, read_records, read_repos_records, \
+    split_into_batches, StreamWriter, StreamWriterError
 
 
 def sum_args(A, B, C):
@@ -18,9 +24,124 @@ def test_parallel_functions():
     assert [sum_args(1, 2, i) for i in iterator] == results
 
 
+def get_pid(element: int) -> int:
+    return os.getpid()
+
+
+def test_parallel_function_reuses_pool():
+    with WorkerPool(2) as pool:
+        first = parallel_function(get_pid, range(1, 10), pool=pool, element=None)
+        second = parallel_function(get_pid, range(1, 10), pool=pool, element=None)
+    assert len(set(first + second)) <= 2
+
+
 @pytest.mark.parametrize("arr, splitted_arr",
                          [([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]),
                           ([1, 2, 3, 4, 5, 6, 7, 8, 9], [[1, 2, 3], [4, 5, 6], [7, 8, 9]])])
 def test_split_into_batches(arr: List[str], splitted_arr: List[List[str]]):
     result = split_into_batches(arr, 3)
     assert result == splitted_arr
+
+
+def test_file_lock(tmp_path: pathlib.Path):
+    first = FileLock(tmp_path / "file.lock")
+    second = FileLock(tmp_path / "file.lock")
+
+    with first:
+        assert not second.acquire(blocking=False)
+    assert second.acquire(shared=True, blocking=False)
+    assert first.acquire(shared=True, blocking=False)
+    first.release()
+    second.release()
+
+
+def test_failed_lock_conversion_keeps_lock(tmp_path: pathlib.Path):
+    first, second, third = (FileLock(tmp_path / "file.lock") for _ in range(3))
+
+    assert first.acquire(shared=True) and second.acquire(shared=True)
+    assert not first.acquire(shared=False, blocking=False)
+    second.release()
+    assert not third.acquire(shared=False, blocking=False)  # first still holds shared lock
+    first.release()
+    assert third.acquire(shared=False, blocking=False)
+    third.release()
+
+
+def put_numbers(start: int, sink):
+    sink([{"repo_url": f"repo_{start}", "number": i} for i in range(start, start + 100)])
+    return []
+
+
+def test_stream_writer(tmp_path: pathlib.Path):
+    path = tmp_path / "records.txt"
+    with StreamWriter(path, queue_size=10, flush_every=7) as writer:
+        parallel_function(put_numbers, [100, 200, 300], 2, sink=writer.sink, start=None)
+    assert writer.written == 300
+
+    repos_records = list(read_repos_records(path))
+    assert sorted(len(records) for records in repos_records) == [100, 100, 100]
+    assert all(len({record["repo_url"] for record in records}) == 1 for records in repos_records)
+
+
+def test_stream_writer_failure(tmp_path: pathlib.Path):
+    with pytest.raises(StreamWriterError):
+        with StreamWriter(tmp_path / "records.txt", queue_size=1) as writer:
+            writer.sink({"repo_url": "repo", "number": {1}})  # set isn't json serializable
+            for i in range(10):
+                writer.sink({"repo_url": "repo", "number": i})
+    assert isinstance(writer.error, TypeError)
+
+
+def test_stream_sink_part(tmp_path: pathlib.Path):
+    path = tmp_path / "records.txt"
+    with StreamWriter(path) as writer:
+        with writer.sink.part() as write:
+            write({"repo_url": "repo", "number": 1})
+            assert len(list(writer.parts_folder.iterdir())) == 1  # records go to disk, not to memory of worker
+        with pytest.raises(ValueError):
+            with writer.sink.part() as write:
+                write({"repo_url": "other", "number": 2})
+                raise ValueError("attempt failed")
+    assert [record["number"] for record in read_records(path)] == [1]
+    assert not writer.parts_folder.exists()
+
+
+def test_stream_writer_checkpoints(tmp_path: pathlib.Path):
+    checkpoints_path = tmp_path / "checkpoints.sqlite"
+    commits_path, variables_path = tmp_path / "commits.txt", tmp_path / "variables.txt"
+    checkpoints = get_cache(checkpoints_path, table="checkpoints")
+
+    with StreamWriter(commits_path) as commits_writer, \
+            StreamWriter(variables_path, next_writer=commits_writer) as variables_writer:
+        commits_writer.queue.put({"repo_url": "repo", "number": 1})
+        variables_writer.queue.put({"repo_url": "repo", "number": 2})
+        variables_writer.queue.put(Checkpoint(checkpoints_path, "repo", ["commit"]))
+        variables_writer.queue.put({"repo_url": "other", "number": 3})
+
+    assert checkpoints.get("repo") == ["commit"]
+    assert [record["number"] for record in read_records(commits_path)] == [1]
+    assert [record["number"] for record in read_records(variables_path)] == [2, 3]
+
+
+def yield_then_fail_once(repo: Repo, marker: str):
+    yield {"repo_url": "repo", "number": 1}
+    if not os.path.exists(marker):
+        pathlib.Path(marker).touch()
+        raise RuntimeError("first attempt fails")
+    yield {"repo_url": "repo", "number": 2}
+
+
+def operate_local_repo(repo_path: str, marker: str, sink):
+    return operate_existing_repo(Repo(repo_path), "repo", yield_then_fail_once, (marker,), sink)
+
+
+def test_retried_repo_is_written_once(tmp_path: pathlib.Path):
+    Repo.init(str(tmp_path / "repo"), mkdir=True).close()
+    path = tmp_path / "records.txt"
+    with StreamWriter(path) as writer, WorkerPool(1, retries=1) as pool:
+        result, = pool.run(operate_local_repo, [("repo", {"repo_path": str(tmp_path / "repo"),
+                                                          "marker": str(tmp_path / "marker"),
+                                                          "sink": writer.sink})])
+
+    assert result.attempts == 2
+    assert [record["number"] for record in read_records(path)] == [1, 2]